@@ -35,6 +35,8 @@ for app in LOCAL_APPS:
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "core.middleware.RequestMetricsMiddleware",
+    "core.middleware.DataVersionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -84,6 +86,36 @@ else:
         }
     }
 
+# Cache: local memory per process by default; set CACHE_DIR to share one
+# file-based cache between several worker processes. Data versions live in the
+# database (core.datacache), so either way no process serves stale fragments.
+if os.environ.get("CACHE_DIR"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.environ.get("CACHE_DIR"),
+            "OPTIONS": {"MAX_ENTRIES": 5000},
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "bms",
+            "OPTIONS": {"MAX_ENTRIES": 5000},
+        }
+    }
+# Seconds a cached page fragment may live (it is also dropped as soon as its data version moves).
+FRAGMENT_CACHE_TIMEOUT = int(os.environ.get("FRAGMENT_CACHE_TIMEOUT", str(60 * 60)))
+
+# Rendered documents (profile PDFs), stored on disk under a hash of everything
+# they are drawn from; least recently used files go once the directory passes the cap.
+FILE_CACHE_DIR = Path(os.environ.get("FILE_CACHE_DIR", BASE_DIR / "var" / "filecache"))
+FILE_CACHE_MAX_BYTES = int(os.environ.get("FILE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Worker processes drawing PDFs for the bulk profile export, one pool shared by all
+# requests of a server process (empty: one per CPU core, at most 4).
+PROFILE_EXPORT_WORKERS = int(os.environ.get("PROFILE_EXPORT_WORKERS") or 0) or min(os.cpu_count() or 1, 4)
+
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
     {"NAME": "django.contrib.auth.password_validation.MinimumLengthValidator"},
@@ -107,6 +139,15 @@ DATA_UPLOAD_MAX_MEMORY_SIZE = int(os.environ.get("DATA_UPLOAD_MAX_MEMORY_SIZE",
 FILE_UPLOAD_MAX_MEMORY_SIZE = int(os.environ.get("FILE_UPLOAD_MAX_MEMORY_SIZE", str(2_500_000)))
 FILE_UPLOAD_PERMISSIONS = 0o644
 
+# core.media: "" serves files from Django; "nginx" (X-Accel-Redirect) or "sendfile"
+# (X-Sendfile) hands them to the front server. nginx needs an `internal` location
+# per root, aliased to MEDIA_ROOT / FILE_CACHE_DIR.
+MEDIA_ACCEL = os.environ.get("MEDIA_ACCEL", "")
+MEDIA_ACCEL_LOCATIONS = {
+    "media": os.environ.get("MEDIA_ACCEL_MEDIA_LOCATION", "/_protected/media/"),
+    "filecache": os.environ.get("MEDIA_ACCEL_FILECACHE_LOCATION", "/_protected/filecache/"),
+}
+
 LOGIN_URL = "login"
 LOGIN_REDIRECT_URL = "dashboard"
 LOGOUT_REDIRECT_URL = "login"
@@ -145,6 +186,11 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
 DJANGO_LOG_LEVEL = os.environ.get("DJANGO_LOG_LEVEL", "WARNING")
+# core.middleware.RequestMetricsMiddleware: Server-Timing header and slow-request log
+REQUEST_SERVER_TIMING = os.environ.get("REQUEST_SERVER_TIMING", "1") == "1"
+REQUEST_SLOW_MS = int(os.environ.get("REQUEST_SLOW_MS", "500"))
+REQUEST_SLOW_TOP_SQL = int(os.environ.get("REQUEST_SLOW_TOP_SQL", "5"))
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
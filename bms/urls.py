@@ -2,9 +2,11 @@
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
 
-from core.views import DashboardView, BulkOwnersView, SyncStatusView, OverviewBoardView
+from core.views import (
+    DashboardView, BulkOwnersView, BulkLesseesView, SyncStatusView, OverviewBoardView, CacheStatsView,
+    DuplicatesView, MediaView, SearchView,
+)
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -17,7 +19,17 @@ urlpatterns = [
 
     # Tools
     path("tools/bulk-owners/", BulkOwnersView.as_view(), name="bulk_owners"),
+    path("tools/bulk-lessees/", BulkLesseesView.as_view(), name="bulk_lessees"),
     path("tools/sync-status/", SyncStatusView.as_view(), name="sync_status"),
+    path("tools/cache-stats/", CacheStatsView.as_view(), name="cache_stats"),
+    path("tools/duplicates/", DuplicatesView.as_view(), name="duplicates"),
+
+    # Uploads and their derivatives (core.media; ranges, conditional GET, optional X-Accel/X-Sendfile)
+    path(f"{settings.MEDIA_URL.lstrip('/')}<path:name>", MediaView.as_view(), name="media"),
+
+    # Search (core.search)
+    path("search/", SearchView.as_view(), name="search"),
+    path("search/api", SearchView.as_view(as_json=True), name="search_api"),
 
     # Overview (at-a-glance)
     path("overview/", OverviewBoardView.as_view(), name="overview"),
@@ -29,6 +41,3 @@ urlpatterns = [
     path("elections/", include(("elections.urls", "elections"), namespace="elections")),
     path("providers/", include(("providers.urls", "providers"), namespace="providers")),  # ← added
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,115 @@
+"""
+Helpers for the `bench` command and core.querybudgets: discover the
+GET-able URLs of the project and time them through the test client.
+"""
+import time
+import tracemalloc
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+
+from flats.models import Flat
+from people.models import Owner, Lessee
+from parking.models import ParkingSpot, Vehicle
+
+try:
+    from providers.models import ServiceProvider
+except Exception:
+    ServiceProvider = None
+
+# Namespaces/names that aren't app pages (admin, auth) or only make sense with a POST.
+SKIP_NAMESPACES = {"admin"}
+SKIP_NAMES = {"login", "logout", "password_change", "password_change_done", "password_reset",
+              "password_reset_done", "password_reset_confirm", "password_reset_complete"}
+
+# For <pk> routes whose view has no `model`: pick the model from the route name, then the namespace.
+_NAME_MODELS = [("owner", Owner), ("lessee", Lessee), ("vehicle", Vehicle), ("spot", ParkingSpot)]
+_NAMESPACE_MODELS = {"flats": Flat, "providers": ServiceProvider}
+
+
+def _model_for(namespace, name, callback):
+    model = getattr(getattr(callback, "view_class", None), "model", None)
+    if model is not None:
+        return model
+    for word, candidate in _NAME_MODELS:
+        if word in name:
+            return candidate
+    return _NAMESPACE_MODELS.get(namespace)
+
+
+def _walk(resolver, namespace=""):
+    for p in resolver.url_patterns:
+        if isinstance(p, URLResolver):
+            if p.namespace in SKIP_NAMESPACES:
+                continue
+            yield from _walk(p, ":".join(x for x in (namespace, p.namespace) if x))
+        elif isinstance(p, URLPattern) and p.name and p.name not in SKIP_NAMES:
+            view_class = getattr(p.callback, "view_class", None)
+            if view_class is not None and not hasattr(view_class, "get"):
+                continue  # POST-only action
+            yield namespace, p
+
+
+def iter_urls():
+    """
+    Yield (url name, path) for every named GET route, filling <pk> with the
+    first row of the matching model. Routes that can't be filled are skipped.
+    """
+    for namespace, p in _walk(get_resolver()):
+        name = f"{namespace}:{p.name}" if namespace else p.name
+        params = list(p.pattern.converters)
+        kwargs = {}
+        if params:
+            model = _model_for(namespace, p.name, p.callback)
+            if params != ["pk"] or model is None:
+                continue
+            pk = model.objects.order_by("pk").values_list("pk", flat=True).first()
+            if pk is None:
+                continue
+            kwargs["pk"] = pk
+        yield name, reverse(name, kwargs=kwargs)
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, round(pct / 100 * (len(values) - 1)))]
+
+
+def measure(client, path, repeat=10, warm=False):
+    """
+    GET `path` `repeat` times after one untimed request. Unless `warm`, the cache is cleared before every
+    request so each one pays the full price. Memory is sampled on one extra
+    request under tracemalloc (which would otherwise skew the timings).
+    Returns {"status", "p50_ms", "p95_ms", "queries", "peak_kb"}.
+    """
+    client.get(path)  # untimed: template loading, lazy imports
+    timings, queries, status = [], 0, None
+    for _ in range(repeat):
+        if not warm:
+            cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            resp = client.get(path)
+            b"".join(resp) if resp.streaming else resp.content
+            timings.append((time.perf_counter() - start) * 1000)
+        status, queries = resp.status_code, max(queries, len(ctx.captured_queries))
+
+    if not warm:
+        cache.clear()
+    tracemalloc.start()
+    try:
+        resp = client.get(path)
+        b"".join(resp) if resp.streaming else resp.content
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "status": status,
+        "p50_ms": round(_percentile(timings, 50), 2),
+        "p95_ms": round(_percentile(timings, 95), 2),
+        "queries": queries,
+        "peak_kb": round(peak / 1024, 1),
+    }
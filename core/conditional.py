@@ -0,0 +1,62 @@
+"""
+Conditional GET for read-only pages and JSON endpoints.
+
+@conditional_on("flats", "people") wraps a view in django's condition()
+decorator with validators taken from core.datacache data versions, so an
+unchanged page is answered 304 before the view (or any of its querysets)
+runs. The versions are clock values (ns), which doubles as Last-Modified.
+
+The ETag also covers the URL, the user and the CSRF cookie because pages
+render those; requests with pending flash messages are never answered 304,
+otherwise the message would be swallowed by the browser's copy.
+"""
+import hashlib
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+
+from django.conf import settings
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+from .datacache import versions
+
+
+def _has_pending_messages(request):
+    storage = getattr(request, "_messages", None)
+    return bool(storage is not None and len(storage))
+
+
+def _etag(groups):
+    def etag(request, *args, **kwargs):
+        if _has_pending_messages(request):
+            return None
+        ver = versions(*groups)
+        user = getattr(request, "user", None)
+        parts = [
+            request.get_full_path(),
+            *(f"{g}={ver[g]}" for g in sorted(ver)),
+            str(user.pk if user is not None and user.is_authenticated else ""),
+            request.COOKIES.get(settings.CSRF_COOKIE_NAME, ""),
+        ]
+        return hashlib.md5("|".join(parts).encode()).hexdigest()
+    return etag
+
+
+def _last_modified(groups):
+    def last_modified(request, *args, **kwargs):
+        if _has_pending_messages(request):
+            return None
+        newest = max(versions(*groups).values())
+        return datetime.fromtimestamp(newest / 1e9, tz=dt_timezone.utc)
+    return last_modified
+
+
+def conditional_on(*groups):
+    """
+    View decorator: ETag/Last-Modified from the data versions of `groups`, 304 on a
+    match, and Cache-Control so browsers revalidate instead of guessing freshness.
+    """
+    def decorator(view):
+        conditional = condition(etag_func=_etag(groups), last_modified_func=_last_modified(groups))(view)
+        return wraps(view)(cache_control(private=True, no_cache=True)(conditional))
+    return decorator
@@ -0,0 +1,130 @@
+"""
+Versioned fragment cache.
+
+Models are grouped (flats / people / parking / providers) and each group has a
+data version, a clock value (ns) kept in the DataVersion table so a bump from
+any process - another worker, a management command, an import - is seen by
+all of them. core.signals bumps a group's version after any save or delete
+commits; bulk writers call bump() themselves. Fragments are keyed by the
+versions of the groups they read, so a bump simply makes old entries
+unreachable.
+
+Versions are read in one query, once per request (DataVersionMiddleware); a
+cache hit needs no other query. Outside a request every call reads them anew.
+
+    ctx.update(cached("dashboard", GROUPS, self.build))
+    {% versioned_cache "overview" "flats" "people" %} ... {% endversioned_cache %}
+"""
+import hashlib
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+
+GROUPS = ("flats", "people", "parking", "providers")
+
+_PREFIX = "bms"
+_MISSING = object()
+# fragments used by the pages; stats() also reports any other name used by this process
+FRAGMENTS = ("dashboard", "overview", "flats:counts", "flats:total", "parking:spots", "people:directory",
+             "people:profile")
+_seen = set()
+_stats = Counter()  # (name, "hits"/"misses") -> n, for this process
+_request_versions = ContextVar("data_versions", default=None)
+
+
+@contextmanager
+def request_scope():
+    """Read the versions at most once inside the block (one request); bumps in it are still seen."""
+    token = _request_versions.set({})
+    try:
+        yield
+    finally:
+        _request_versions.reset(token)
+
+
+def _read(groups):
+    from .models import DataVersion
+
+    found = dict(DataVersion.objects.values_list("group", "version"))
+    missing = [g for g in groups if g not in found]
+    if missing:
+        # first use: start from the clock so an old version is never reused
+        now = time.time_ns()
+        DataVersion.objects.bulk_create([DataVersion(group=g, version=now) for g in missing], ignore_conflicts=True)
+        found.update(DataVersion.objects.filter(group__in=missing).values_list("group", "version"))
+    return found
+
+
+def versions(*groups):
+    """{group: version} for the given groups (all groups if none)."""
+    groups = groups or GROUPS
+    memo = _request_versions.get()
+    if memo is None or any(g not in memo for g in groups):
+        found = _read(groups)
+        if memo is None:
+            return {g: found[g] for g in groups}
+        memo.update(found)
+    return {g: memo[g] for g in groups}
+
+
+def _bump_now(groups):
+    from .models import DataVersion
+
+    # the clock (it doubles as Last-Modified), but always forward
+    now = time.time_ns()
+    if DataVersion.objects.filter(group__in=groups).update(version=Greatest(F("version") + 1, Value(now))) < len(groups):
+        _read(groups)
+    memo = _request_versions.get()
+    if memo is not None:
+        for g in groups:
+            memo.pop(g, None)
+
+
+def bump(*groups):
+    """Move the data version of the given groups once the current transaction commits."""
+    groups = tuple(groups)
+    transaction.on_commit(lambda: _bump_now(groups))
+
+
+def fragment_key(name, groups, *parts):
+    ver = versions(*groups)
+    tag = ".".join(str(ver[g]) for g in sorted(ver))
+    if parts:
+        tag += ":" + hashlib.md5(repr(parts).encode()).hexdigest()
+    return f"{_PREFIX}:frag:{name}:{tag}"
+
+
+def cached(name, groups, build, *parts, timeout=None):
+    """
+    Return the cached value of `name` for the current data versions of `groups`
+    (and any extra key `parts`, e.g. filters), calling build() on a miss.
+    """
+    _seen.add(name)
+    key = fragment_key(name, groups, *parts)
+    value = cache.get(key, _MISSING)
+    if value is _MISSING:
+        _stats[name, "misses"] += 1
+        value = build()
+        cache.set(key, value, settings.FRAGMENT_CACHE_TIMEOUT if timeout is None else timeout)
+    else:
+        _stats[name, "hits"] += 1
+    return value
+
+
+def stats(names=None):
+    """{name: {"hits": n, "misses": n}} of this process for the given fragment names (default: all known)."""
+    names = sorted(names or set(FRAGMENTS) | _seen)
+    return {n: {o: _stats[n, o] for o in ("hits", "misses")} for n in names}
+
+
+def reset_stats(names=None):
+    for n in names or set(FRAGMENTS) | _seen:
+        _stats.pop((n, "hits"), None)
+        _stats.pop((n, "misses"), None)
@@ -0,0 +1,195 @@
+"""
+Duplicate owners/lessees: find likely duplicates and merge them.
+
+Candidates are never compared all-against-all. Every person is filed under a
+few blocking keys (normalised phone, canonical name, consonant skeleton of the
+name); pairs are scored only within a block, so the work is about linear in
+the number of people. Pairs scoring MIN_SCORE or more are joined into clusters.
+
+merge() folds a cluster into one record: every foreign key pointing at the
+merged people (Ownership/Tenancy, Vehicle, ...) is repointed with one UPDATE
+per relation, blank fields are filled from the merged records, and those are
+then deleted.
+"""
+from difflib import SequenceMatcher
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from people.search_index import tokens
+from .snapshot import refresh_flats
+from .datacache import bump
+
+MIN_SCORE = 0.7
+BLOCK_LIMIT = 50     # larger blocks (a shared office number, "Md. Hasan") are too loose to score pairwise
+MIN_PHONE_DIGITS = 7
+
+# Titles and name prefixes that say nothing about who someone is.
+HONORIFICS = {
+    "md", "mohd", "mohammad", "mohammed", "muhammad", "muhammed", "mohamad", "mohammod",
+    "mr", "mrs", "ms", "miss", "dr", "engr", "late", "alhaj", "haji",
+}
+FILL_FIELDS = ("phone", "email", "address", "photo", "nid_image")
+
+
+def name_tokens(name):
+    return [t for t in tokens(name) if t not in HONORIFICS] or tokens(name)
+
+
+def skeleton(token):
+    """First letter plus the remaining consonants, repeats collapsed: rahim/raheem -> 'rm'."""
+    out = token[:1]
+    for ch in token[1:]:
+        if ch not in "aeiouyh" and ch != out[-1]:
+            out += ch
+    return out
+
+
+def _profile(pk, name, phone_norm):
+    toks = name_tokens(name)
+    return {
+        "id": pk,
+        "name": name,
+        "phone": phone_norm,
+        "canon": " ".join(toks),
+        "key": " ".join(sorted(toks)),
+        "skeleton": " ".join(sorted(skeleton(t) for t in toks)),
+    }
+
+
+def _blocking_keys(p):
+    if len(p["phone"]) >= MIN_PHONE_DIGITS:
+        yield "phone:" + p["phone"]
+    if p["key"]:
+        yield "name:" + p["key"]
+        yield "skel:" + p["skeleton"]
+
+
+def score(a, b):
+    """(score 0..1, [reasons]) for two profiles."""
+    reasons = []
+    name_sim = SequenceMatcher(None, a["canon"], b["canon"]).ratio()
+    if a["key"] == b["key"]:
+        name_sim = 1.0
+        reasons.append("same name")
+    elif a["skeleton"] == b["skeleton"]:
+        name_sim = max(name_sim, 0.9)
+        reasons.append("similar spelling")
+    if a["phone"] and a["phone"] == b["phone"]:
+        reasons.append("same phone")
+        return 0.5 + 0.5 * name_sim, reasons
+    if a["phone"] and b["phone"]:
+        return 0.6 * name_sim, reasons  # different numbers: most likely namesakes
+    return 0.85 * name_sim, reasons
+
+
+def find_clusters(kind, min_score=MIN_SCORE):
+    """
+    [{"score", "reasons", "members": [{"id", "name", "phone", "holdings", "vehicles"}, ...]}, ...]
+    best first, for the person model of an importer kind (core.importers.OWNERS/LESSEES).
+    """
+    Person = kind["person"]
+    profiles = {}
+    blocks = {}
+    for pk, name, phone in Person.objects.values_list("pk", "name", "phone_norm").iterator(chunk_size=5000):
+        p = profiles[pk] = _profile(pk, name, phone)
+        for key in _blocking_keys(p):
+            blocks.setdefault(key, []).append(pk)
+
+    parent = {}
+
+    def find(x):
+        while parent.get(x, x) != x:
+            parent[x] = parent.get(parent[x], parent[x])
+            x = parent[x]
+        return x
+
+    best, why, scored = {}, {}, set()
+    for members in blocks.values():
+        if len(members) < 2 or len(members) > BLOCK_LIMIT:
+            continue
+        for i, a in enumerate(members):
+            for b in members[i + 1:]:
+                a, b = min(a, b), max(a, b)
+                if (a, b) in scored:
+                    continue
+                scored.add((a, b))
+                s, reasons = score(profiles[a], profiles[b])
+                if s < min_score:
+                    continue
+                ra, rb = find(a), find(b)
+                if ra != rb:
+                    parent[rb] = ra
+                best[(a, b)] = s
+                why[(a, b)] = reasons
+
+    clusters = {}
+    for (a, b), s in best.items():
+        c = clusters.setdefault(find(a), {"score": 0, "reasons": set(), "ids": set()})
+        c["score"] = max(c["score"], s)
+        c["reasons"].update(why[(a, b)])
+        c["ids"].update((a, b))
+    if not clusters:
+        return []
+
+    ids = sorted(set().union(*(c["ids"] for c in clusters.values())))
+    holdings = kind["holding"]._meta.get_field(kind["person_field"]).related_query_name()
+    counts = {}
+    for i in range(0, len(ids), 500):
+        rows = (
+            Person.objects.filter(pk__in=ids[i:i + 500])
+            .annotate(holdings=Count(holdings, distinct=True), cars=Count("vehicles", distinct=True))
+            .values("pk", "holdings", "cars")
+        )
+        counts.update((row["pk"], row) for row in rows)
+    out = []
+    for c in clusters.values():
+        members = [
+            {**{k: profiles[pk][k] for k in ("id", "name", "phone")},
+             "holdings": counts[pk]["holdings"], "vehicles": counts[pk]["cars"]}
+            for pk in sorted(c["ids"])
+        ]
+        out.append({"score": round(c["score"], 2), "reasons": sorted(c["reasons"]), "members": members})
+    out.sort(key=lambda c: (-c["score"], c["members"][0]["name"].lower()))
+    return out
+
+
+def merge(kind, keep_id, merge_ids):
+    """
+    Fold the people in merge_ids into keep_id. Returns {"merged": n, "repointed": {relation: rows}}.
+    """
+    Person, Holding, person_field = kind["person"], kind["holding"], kind["person_field"]
+    merge_ids = {int(pk) for pk in merge_ids} - {int(keep_id)}
+    with transaction.atomic():
+        keep = Person.objects.select_for_update().get(pk=keep_id)
+        others = list(Person.objects.filter(pk__in=merge_ids).order_by("pk"))
+        if not others:
+            return {"merged": 0, "repointed": {}}
+        flat_ids = set(
+            Holding.objects.filter(**{f"{person_field}_id__in": merge_ids}).values_list("flat_id", flat=True)
+        )
+
+        repointed = {}
+        for rel in Person._meta.related_objects:
+            if rel.many_to_many or not rel.field.concrete:
+                continue
+            values = {rel.field.name: keep}
+            if any(f.name == "updated_at" for f in rel.related_model._meta.concrete_fields):
+                values["updated_at"] = timezone.now()  # update() doesn't fill auto_now
+            n = rel.related_model._base_manager.filter(**{f"{rel.field.name}__in": others}).update(**values)
+            if n:
+                repointed[rel.related_model._meta.verbose_name_plural] = n
+
+        for field in FILL_FIELDS:
+            if not getattr(keep, field):
+                value = next((getattr(o, field) for o in others if getattr(o, field)), None)
+                if value:
+                    setattr(keep, field, value)
+        keep.save()
+        Person.objects.filter(pk__in=[o.pk for o in others]).delete()
+
+        # the UPDATEs above bypass the model signals
+        refresh_flats(flat_ids)
+        bump("people", "parking")
+    return {"merged": len(others), "repointed": repointed}
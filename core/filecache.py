@@ -0,0 +1,169 @@
+"""
+Content-addressed on-disk cache for rendered documents (profile PDFs, ...).
+
+A document is stored under a key hashed from everything it is drawn from
+(see key()), so there is nothing to invalidate: any relevant change yields a
+new key, and the old file simply stops being asked for. Files are sharded as
+<FILE_CACHE_DIR>/<namespace>/<k[:2]>/<k>; every hit refreshes the file's mtime
+and, when a write takes the directory over FILE_CACHE_MAX_BYTES, the least
+recently used files are removed until it is back under 90% of the cap.
+
+Each process keeps a running total of the directory's size rather than
+walking it on every write: the total is taken by one walk on the first write,
+grows by what each write adds, and is reset by the walk eviction makes. Other
+workers' writes are not in it, so the directory is walked again once this
+process alone has written RESCAN_FRACTION of the cap since the last walk.
+
+Writes go to a temporary file and are renamed into place, so concurrent
+workers never see a half-written document.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+
+_evict_lock = threading.Lock()
+_size_lock = threading.Lock()
+_size = None      # running total of the cache's bytes; None until the first walk
+_unscanned = 0    # bytes this process has written since that total was walked
+
+RESCAN_FRACTION = 0.1
+
+
+def key(*parts) -> str:
+    """Stable hash of `parts` (strings, numbers, dates, nested lists/tuples)."""
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+
+def file_digest(path) -> str:
+    """
+    sha256 of a file's content. The digest is memoised in the Django cache per
+    (path, size, mtime), so a large image is read once, not on every request.
+    """
+    if not path:
+        return ""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return ""
+    memo = f"bms:filedigest:{hashlib.md5(str(path).encode()).hexdigest()}:{st.st_size}:{st.st_mtime_ns}"
+    digest = cache.get(memo)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, "rb") as fh:
+            for block in iter(lambda: fh.read(1024 * 1024), b""):
+                h.update(block)
+        digest = h.hexdigest()
+        cache.set(memo, digest, None)
+    return digest
+
+
+def _root() -> Path:
+    return Path(settings.FILE_CACHE_DIR)
+
+
+def _path(namespace, k) -> Path:
+    return _root() / namespace / k[:2] / k
+
+
+def get(namespace, k):
+    """Path of the cached file, or None. A hit counts as a use for LRU eviction."""
+    path = _path(namespace, k)
+    try:
+        os.utime(path)
+    except OSError:
+        return None
+    return path
+
+
+def put(namespace, k, data: bytes) -> Path:
+    path = _path(namespace, k)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        replaced = path.stat().st_size
+    except OSError:
+        replaced = 0
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    if _grew(len(data) - replaced):
+        evict()
+    return path
+
+
+def delete(namespace, k):
+    """Remove a cached file that won't be asked for again (a missing one is fine)."""
+    path = _path(namespace, k)
+    try:
+        size = path.stat().st_size
+        path.unlink()
+    except OSError:
+        return
+    _grew(-size)
+
+
+def _grew(delta) -> bool:
+    """Add a write to the running total; True when the directory should be walked (and maybe trimmed)."""
+    global _size, _unscanned
+    cap = settings.FILE_CACHE_MAX_BYTES
+    with _size_lock:
+        if _size is None:
+            return True
+        _size += delta
+        _unscanned += max(delta, 0)
+        return _size > cap or _unscanned > cap * RESCAN_FRACTION
+
+
+def usage():
+    """[(mtime, size, path), ...] for every cached file."""
+    out = []
+    for dirpath, _, names in os.walk(_root()):
+        for name in names:
+            if name.startswith(".tmp-"):
+                continue
+            p = os.path.join(dirpath, name)
+            try:
+                st = os.stat(p)
+            except OSError:
+                continue  # evicted by another worker meanwhile
+            out.append((st.st_mtime, st.st_size, p))
+    return out
+
+
+def evict(max_bytes=None):
+    """Drop least recently used files until the cache fits; returns bytes freed."""
+    global _size, _unscanned
+    max_bytes = settings.FILE_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    if not _evict_lock.acquire(blocking=False):
+        return 0  # another thread of this process is already at it
+    try:
+        files = usage()
+        total = sum(size for _, size, _ in files)
+        freed = 0
+        if total > max_bytes:
+            target = int(max_bytes * 0.9)
+            for _, size, p in sorted(files):
+                if total - freed <= target:
+                    break
+                try:
+                    os.unlink(p)
+                    freed += size
+                except OSError:
+                    pass
+        with _size_lock:
+            _size, _unscanned = total - freed, 0
+        return freed
+    finally:
+        _evict_lock.release()
@@ -23,3 +23,20 @@ class BulkOwnersForm(forms.Form):
         required=False,
         initial=True
     )
+
+
+class BulkLesseesForm(forms.Form):
+    file = forms.FileField(
+        label="CSV / TSV file",
+        help_text="Columns: Flat no, Lessee, Cell, Start date (optional). Header row is optional."
+    )
+    start_date = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={"type": "date"}),
+        help_text="Used for rows without a start date. If empty, today will be used."
+    )
+    dry_run = forms.BooleanField(
+        label="Preview only (no changes)",
+        required=False,
+        initial=True
+    )
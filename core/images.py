@@ -0,0 +1,246 @@
+"""
+Uploaded images (person photos, NID scans) and their fixed-size derivatives.
+
+An upload keeps its format, resolution and pixels, but not its metadata:
+before it is stored, core.signals has strip_metadata() cut the EXIF, XMP,
+IPTC and comment blocks out of JPEG, PNG and WebP files without re-encoding
+them (a JPEG keeps just its EXIF orientation, so it still displays upright).
+Next to each stored image, once, we store:
+  thumb  - 160px WebP for list pages,
+  print  - 800px JPEG for the profile PDFs (ReportLab embeds a JPEG as is,
+           without decoding and rescaling a phone-camera original).
+Derivatives are EXIF-rotated and carry no metadata (GPS, camera, ...).
+
+A derivative's name follows from the original's ("docs/owner/a.jpg" ->
+"docs/owner/a.thumb.webp"), so no extra columns are needed; a replaced upload
+gets a new name from the storage and therefore new derivatives. Missing
+derivatives fall back to the original everywhere.
+"""
+import posixpath
+import struct
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+VARIANTS = {
+    "thumb": {"size": 160, "format": "WEBP", "ext": "webp", "options": {"quality": 80, "method": 4}},
+    "print": {"size": 800, "format": "JPEG", "ext": "jpg", "options": {"quality": 85, "optimize": True, "progressive": True}},
+}
+
+# (app_label.Model, field names) holding images that get derivatives
+IMAGE_FIELDS = {
+    "people.Owner": ("photo", "nid_image"),
+    "people.Lessee": ("photo", "nid_image"),
+    "providers.ServiceProvider": ("photo",),
+}
+
+
+def derivative_name(name, variant):
+    stem, _ = posixpath.splitext(name)
+    return f"{stem}.{variant}.{VARIANTS[variant]['ext']}"
+
+
+def _render(fh, variant):
+    from PIL import Image, ImageOps
+
+    spec = VARIANTS[variant]
+    with Image.open(fh) as im:
+        im.draft("RGB", (spec["size"], spec["size"]))  # JPEG: decode at reduced scale straight away
+        im = ImageOps.exif_transpose(im)
+        if im.mode not in ("RGB", "L"):
+            im = im.convert("RGBA")
+            bg = Image.new("RGB", im.size, (255, 255, 255))
+            bg.paste(im, mask=im.getchannel("A"))
+            im = bg
+        im.thumbnail((spec["size"], spec["size"]), Image.LANCZOS)
+        out = BytesIO()
+        im.save(out, spec["format"], **spec["options"])  # no exif=/icc_profile=: metadata is dropped
+    return out.getvalue()
+
+
+
+# ── metadata stripping: block by block, the image data is copied untouched ──
+_JPEG_KEEP = {0xE0, 0xE2, 0xEE}  # APP0 JFIF, APP2 ICC profile, APP14 Adobe (colour transform)
+_PNG_DROP = {b"tEXt", b"zTXt", b"iTXt", b"eXIf", b"tIME"}
+_WEBP_DROP = {b"EXIF", b"XMP "}
+
+
+def _jpeg_orientation(data):
+    from PIL import Image
+
+    try:
+        with Image.open(BytesIO(data)) as im:
+            return im.getexif().get(0x0112) or 1
+    except Exception:
+        return 1
+
+
+def _strip_jpeg(data):
+    out = [data[:2]]  # SOI
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            raise ValueError("not a JPEG marker")
+        marker = data[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if marker == 0xD9:  # EOI; anything after it (MPF secondary images) goes too
+            break
+        if 0xD0 <= marker <= 0xD7 or marker == 0x01:
+            out.append(data[pos:pos + 2])
+            pos += 2
+            continue
+        end = pos + 2 + struct.unpack(">H", data[pos + 2:pos + 4])[0]
+        segment = data[pos:end]
+        if marker == 0xDA:  # start of scan: entropy-coded data runs to the next real marker
+            while True:
+                end = data.find(b"\xff", end)
+                if end < 0 or end + 1 >= len(data):
+                    raise ValueError("truncated JPEG")
+                if data[end + 1] not in (0x00, 0xFF) and not 0xD0 <= data[end + 1] <= 0xD7:
+                    break
+                end += 2 if data[end + 1] != 0xFF else 1
+            segment = data[pos:end]
+        elif marker not in _JPEG_KEEP and 0xE0 <= marker <= 0xEF or marker == 0xFE:
+            segment = b""
+        elif marker == 0xE2 and segment[4:8] == b"MPF\0":
+            segment = b""  # points at the secondary images dropped above
+        out.append(segment)
+        pos = end
+    out.append(b"\xff\xd9")
+    orientation = _jpeg_orientation(data)
+    if orientation != 1:
+        from PIL import Image
+
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        payload = exif.tobytes()
+        at = 2 if out[1][1:2] == b"\xe0" else 1  # after JFIF, which has to come first
+        out.insert(at, b"\xff\xe1" + struct.pack(">H", len(payload) + 2) + payload)
+    return b"".join(out)
+
+
+def _strip_png(data):
+    out = [data[:8]]
+    pos = 8
+    while pos + 12 <= len(data):
+        length, kind = struct.unpack(">I4s", data[pos:pos + 8])
+        end = pos + 12 + length
+        if kind not in _PNG_DROP:
+            out.append(data[pos:end])
+        pos = end
+        if kind == b"IEND":
+            break
+    return b"".join(out)
+
+
+def _strip_webp(data):
+    out = []
+    pos = 12
+    while pos + 8 <= len(data):
+        kind, length = struct.unpack("<4sI", data[pos:pos + 8])
+        end = pos + 8 + length + (length & 1)
+        chunk = data[pos:end]
+        if kind == b"VP8X":  # clear the "has EXIF" and "has XMP" flags
+            chunk = chunk[:8] + bytes([chunk[8] & ~0x0C]) + chunk[9:]
+        if kind not in _WEBP_DROP:
+            out.append(chunk)
+        pos = end
+    body = b"WEBP" + b"".join(out)
+    return b"RIFF" + struct.pack("<I", len(body)) + body
+
+
+def strip_metadata(data):
+    """
+    `data` (a JPEG, PNG or WebP file) without its metadata blocks, the image
+    data copied byte for byte; None for other formats or files that can't be
+    parsed, which are kept as they are.
+    """
+    try:
+        if data[:3] == b"\xff\xd8\xff":
+            return _strip_jpeg(data)
+        if data[:8] == b"\x89PNG\r\n\x1a\n":
+            return _strip_png(data)
+        if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+            return _strip_webp(data)
+    except (ValueError, IndexError, struct.error):
+        pass
+    return None
+
+
+def stripped_upload(upload):
+    """A new upload (a File) as a ContentFile without metadata, or None if there is nothing to strip."""
+    upload.seek(0)
+    data = upload.read()
+    upload.seek(0)
+    stripped = strip_metadata(data)
+    if stripped is None or stripped == data:
+        return None
+    return ContentFile(stripped, name=upload.name)
+
+def ensure_derivatives(name, force=False, storage=default_storage):
+    """
+    Create the missing derivatives of the stored image `name`; returns
+    {variant: bytes written}. Unreadable or non-image files are skipped.
+    """
+    from PIL import UnidentifiedImageError
+
+    written = {}
+    if not name or not storage.exists(name):
+        return written
+    for variant in VARIANTS:
+        target = derivative_name(name, variant)
+        if storage.exists(target):
+            if not force:
+                continue
+            storage.delete(target)
+        try:
+            with storage.open(name, "rb") as fh:
+                data = _render(fh, variant)
+        except (UnidentifiedImageError, OSError, ValueError):
+            return written
+        storage.save(target, ContentFile(data))
+        written[variant] = len(data)
+    return written
+
+
+def delete_derivatives(name, storage=default_storage):
+    for variant in VARIANTS:
+        target = derivative_name(name, variant)
+        if storage.exists(target):
+            storage.delete(target)
+
+
+def ensure_all(names, force=False):
+    """ensure_derivatives() for several names; the unit of work of the backfill pool."""
+    return {name: ensure_derivatives(name, force=force) for name in names}
+
+
+def derivative(fieldfile, variant, storage=default_storage):
+    """Name of the derivative of an Image/FileField value, or None if it hasn't been made."""
+    name = getattr(fieldfile, "name", None)
+    if not name:
+        return None
+    target = derivative_name(name, variant)
+    return target if storage.exists(target) else None
+
+
+def derivative_url(fieldfile, variant):
+    """URL of the derivative, else of the original, else ''."""
+    target = derivative(fieldfile, variant)
+    if target:
+        return default_storage.url(target)
+    return fieldfile.url if getattr(fieldfile, "name", None) else ""
+
+
+def derivative_path(fieldfile, variant):
+    """Local path of the derivative, else of the original, else None."""
+    target = derivative(fieldfile, variant)
+    try:
+        if target:
+            return default_storage.path(target)
+        return fieldfile.path if getattr(fieldfile, "name", None) else None
+    except (NotImplementedError, ValueError):
+        return None
@@ -0,0 +1,487 @@
+"""
+Bulk importers used by the Tools pages.
+
+Owners paste (BulkOwnersView) and the lessees/tenancies file upload
+(BulkLesseesView) share one batched pipeline:
+  1. parse the rows,
+  2. preload flats, active holdings (Ownership/Tenancy) and candidate people (a few queries),
+  3. replay the rows against that snapshot into a change-set (no writes),
+  4. apply the change-set with bulk_create / bulk_update / UPDATE ... WHERE pk IN (...), each
+     batch as large as the database takes bound parameters for (_max_params()).
+
+The upload is read as a stream and pushed through the pipeline one chunk of
+rows at a time, each chunk in its own transaction.
+"""
+import codecs
+import csv
+import re
+import sqlite3
+from datetime import date, datetime
+
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from flats.models import Flat
+from people.models import Owner, Ownership, Lessee, Tenancy
+from . import search
+from .phones import normalise_phone
+from .snapshot import refresh_flats
+from .datacache import bump
+
+CHUNK_SIZE = 1000  # rows of an uploaded file per transaction
+MAX_PARAMS = 65535  # when the backend declares no limit (PostgreSQL's wire protocol has this one)
+
+
+# ───────────────────────── parsing helpers ─────────────────────────
+
+def clean_flat_code(s: str):
+    """'A-01' / 'a01' / 'A 1' -> ('A', 1); None if not a valid flat code."""
+    if not s:
+        return None
+    s = str(s).strip().upper().replace(" ", "")
+    m = re.match(r"^([A-H])[-_]?0?(\d{1,2})$", s)
+    if not m:
+        return None
+    unit, fl = m.group(1), int(m.group(2))
+    if 1 <= fl <= 14:
+        return unit, fl
+    return None
+
+
+def parse_owner_rows(raw: str):
+    """Pasted text -> [(flat_no, name, phone), ...]; comma or tab separated, header optional."""
+    lines = [ln for ln in (raw or "").splitlines() if ln.strip()]
+
+    # remove header if present
+    if lines and ("flat" in lines[0].lower() and "owner" in lines[0].lower()):
+        lines = lines[1:]
+
+    rows = []
+    for ln in lines:
+        parts = [p.strip() for p in re.split(r"[,\t]", ln) if p.strip()]
+        if len(parts) < 2:
+            continue
+        flat_no, name = parts[0], parts[1]
+        phone = parts[2] if len(parts) > 2 else ""
+        rows.append((flat_no, name, phone))
+    return rows
+
+
+def _chunks(seq, size):
+    seq = list(seq)
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+
+def _max_params():
+    """
+    Bound parameters one statement may carry. Django declares 999 for SQLite,
+    its old compile-time default; the library in use usually allows far more,
+    so ask it. Django's bulk_create/bulk_update still cap themselves at 999 there.
+    """
+    limit = connection.features.max_query_params
+    if connection.vendor == "sqlite":
+        connection.ensure_connection()
+        getlimit = getattr(connection.connection, "getlimit", None)  # Python 3.11+
+        if getlimit is not None:
+            limit = getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+    return limit or MAX_PARAMS
+
+
+def _batch_size(model, fields=None):
+    """Rows per bulk_create (all concrete fields) or bulk_update (`fields`, plus pk twice) statement."""
+    if fields is None:
+        per_row = sum(1 for f in model._meta.concrete_fields if not f.primary_key)
+    else:
+        per_row = len(fields) + 2  # CASE WHEN pk = %s THEN %s per field, and the pk in the IN list
+    return max(1, _max_params() // per_row)
+
+
+# ───────────────────────── change-set engine ─────────────────────────
+#
+# Each import is split in three so a preview costs only reads:
+#   load_snapshot()  -> flats, candidate people and active holdings (plain dicts)
+#   plan_changes()   -> pure function: rows + snapshot -> row-level change-set
+#   apply_changes()  -> executes exactly that change-set in one transaction
+#
+# A change-set is a list of JSON-serialisable dicts, so it can be kept on disk
+# (core.filecache) between "Preview" and "Apply". Existing rows are referenced by integer pk, rows
+# created by the change-set itself by string refs ("p1" people, "h1" holdings).
+#
+# A "kind" says which person/holding models an import works on.
+
+OWNERS = {
+    "person": Owner,
+    "holding": Ownership,
+    "person_field": "owner",
+    "status": Flat.OWNER_OCCUPIED,
+    "counters": {
+        "create_person": "owners_created",
+        "update_phone": "owners_updated",
+        "create_holding": "owns_created",
+        "end_holding": "owns_ended",
+        "status_change": "status_changed",
+        "skip": "skipped",
+    },
+}
+
+LESSEES = {
+    "person": Lessee,
+    "holding": Tenancy,
+    "person_field": "lessee",
+    "status": Flat.RENTED,
+    "counters": {
+        "create_person": "lessees_created",
+        "update_phone": "lessees_updated",
+        "create_holding": "tenancies_created",
+        "end_holding": "tenancies_ended",
+        "status_change": "status_changed",
+        "skip": "skipped",
+    },
+}
+
+
+class StaleChangeSet(Exception):
+    """The database changed after the change-set was planned; preview again."""
+
+
+def load_snapshot(kind, rows, all_flats=False):
+    """
+    Read everything plan_changes() needs for these rows (no write transaction).
+    Active holdings are loaded for the flats named in `rows`, or for every flat with all_flats.
+    """
+    flats = {
+        (unit.upper(), int(floor)): (pk, status)
+        for pk, unit, floor, status in Flat.objects.values_list("id", "unit", "floor", "status_hint")
+    }
+
+    person = kind["person_field"]
+    qs = kind["holding"].objects.filter(end_date__isnull=True)
+    if not all_flats:
+        wanted = {clean_flat_code(r[0]) for r in rows}
+        qs = qs.filter(flat_id__in=[flats[k][0] for k in wanted if k in flats])
+    active = {}
+    qs = qs.order_by("flat_id", "-start_date").values_list("id", "flat_id", f"{person}_id", f"{person}__name")
+    for pk, flat_id, person_id, person_name in qs:
+        active.setdefault(flat_id, {"ref": pk, "person": person_id, "person_name": person_name})
+
+    people = {}
+    names = {r[1] for r in rows if r[1]}
+    for chunk in _chunks(names, _max_params() // 2):  # two IN lists per query
+        lowered = {n.lower() for n in chunk}
+        qs = (
+            kind["person"].objects.annotate(lname=Lower("name"))
+            .filter(Q(lname__in=lowered) | Q(name__in=chunk))
+            .order_by("id")
+            .values_list("id", "name", "phone_norm")
+        )
+        for pk, name, phone in qs:
+            people.setdefault(name.lower(), []).append({"ref": pk, "name": name, "phone": phone})
+
+    return {"flats": flats, "active": active, "people": people}
+
+
+def _match_person(candidates, phone_norm):
+    """Same name (case-insensitive), preferring the same phone, then one the given digits begin."""
+    if phone_norm:
+        for p in candidates:
+            if p["phone"] == phone_norm:
+                return p
+        for p in candidates:
+            if p["phone"] and p["phone"].startswith(phone_norm):
+                return p
+    return candidates[0] if candidates else None
+
+
+def plan_changes(kind, rows, snapshot, start_date, vacate_missing=False, first_row=1):
+    """
+    Replay parsed rows against a snapshot and return the change-set.
+    Rows are (flat_no, name, phone) or (flat_no, name, phone, start_date); a row's own
+    start_date (if not None) wins over `start_date`. Pure: touches neither the
+    database nor the snapshot.
+    """
+    labels = dict(Flat.STATUS_CHOICES)
+    occupied = kind["status"]
+    changes = []
+    flats = snapshot["flats"]
+    status = {pk: st for pk, st in flats.values()}
+    active = dict(snapshot["active"])
+    people = {k: [dict(p) for p in v] for k, v in snapshot["people"].items()}
+    touched = set()
+    seq = {"p": 0, "h": 0}
+
+    def new_ref(prefix):
+        seq[prefix] += 1
+        return f"{prefix}{seq[prefix]}"
+
+    def set_status(row, flat_id, code, new):
+        if status[flat_id] != new:
+            changes.append({
+                "action": "status_change", "row": row, "flat_id": flat_id, "flat": code, "new": new,
+                "detail": f"{labels[status[flat_id]]} → {labels[new]}",
+            })
+            status[flat_id] = new
+
+    def end_current(row, flat_id, code, on):
+        current = active.pop(flat_id, None)
+        if current:
+            changes.append({
+                "action": "end_holding", "row": row, "holding": current["ref"], "flat_id": flat_id, "flat": code,
+                "date": on.isoformat(), "detail": current["person_name"],
+            })
+
+    for row, (flat_no, name, phone, *rest) in enumerate(rows, first_row):
+        on = (rest[0] if rest else None) or start_date
+        parsed = clean_flat_code(flat_no)
+        if not parsed or not name:
+            changes.append({
+                "action": "skip", "row": row, "flat": flat_no,
+                "detail": "missing name" if parsed else "invalid flat code",
+            })
+            continue
+
+        touched.add(parsed)
+        code = f"{parsed[0]}-{parsed[1]:02d}"
+        if parsed not in flats:
+            changes.append({"action": "skip", "row": row, "flat": code, "detail": "no such flat"})
+            continue
+        flat_id = flats[parsed][0]
+
+        phone_norm = normalise_phone(phone)
+
+        # upsert person
+        candidates = people.setdefault(name.lower(), [])
+        person = _match_person(candidates, phone_norm)
+        if person is None:
+            person = {"ref": new_ref("p"), "name": name, "phone": phone_norm}
+            candidates.append(person)
+            changes.append({
+                "action": "create_person", "row": row, "ref": person["ref"], "name": name,
+                "phone": phone_norm, "flat": code, "detail": f"{name} ({phone_norm or 'no phone'})",
+            })
+        elif phone_norm and not (person["phone"] or "").startswith(phone_norm):
+            changes.append({
+                "action": "update_phone", "row": row, "person": person["ref"], "phone": phone_norm, "flat": code,
+                "detail": f"{person['name']}: {person['phone'] or '—'} → {phone_norm}",
+            })
+            person["phone"] = phone_norm
+
+        # end existing active holding if the person differs
+        current = active.get(flat_id)
+        if current and current["person"] != person["ref"]:
+            end_current(row, flat_id, code, on)
+            current = None
+
+        if current is None:
+            ref = new_ref("h")
+            active[flat_id] = {"ref": ref, "person": person["ref"], "person_name": person["name"]}
+            changes.append({
+                "action": "create_holding", "row": row, "ref": ref, "flat_id": flat_id,
+                "person": person["ref"], "flat": code, "date": on.isoformat(), "detail": person["name"],
+            })
+
+        set_status(row, flat_id, code, occupied)
+
+    # optionally vacate non-touched
+    if vacate_missing:
+        for key, (flat_id, _) in flats.items():
+            if key in touched:
+                continue
+            code = f"{key[0]}-{key[1]:02d}"
+            end_current(None, flat_id, code, start_date)
+            set_status(None, flat_id, code, Flat.VACANT)
+
+    return changes
+
+
+def summarize_changes(kind, changes):
+    counters = {name: 0 for name in kind["counters"].values()}
+    for ch in changes:
+        counters[kind["counters"][ch["action"]]] += 1
+    return counters
+
+
+def apply_changes(kind, changes):
+    """
+    Execute a change-set from plan_changes() in one transaction, using bulk writes.
+    Raises StaleChangeSet (and writes nothing) if the data it was planned against has moved.
+    """
+    Person, Holding, person_field = kind["person"], kind["holding"], kind["person_field"]
+    new_people, phone_updates = {}, {}
+    new_holdings, end_existing = {}, {}  # end_existing: end date -> [pk, ...]
+    status_to = {}
+
+    for ch in changes:
+        action = ch["action"]
+        if action == "create_person":
+            new_people[ch["ref"]] = Person(name=ch["name"], phone=ch["phone"], phone_norm=ch["phone"])
+        elif action == "update_phone":
+            if ch["person"] in new_people:
+                new_people[ch["person"]].phone = new_people[ch["person"]].phone_norm = ch["phone"]
+            else:
+                phone_updates[ch["person"]] = ch["phone"]
+        elif action == "end_holding":
+            on = date.fromisoformat(ch["date"])
+            if ch["holding"] in new_holdings:
+                new_holdings[ch["holding"]].end_date = on
+            else:
+                end_existing.setdefault(on, []).append(ch["holding"])
+        elif action == "create_holding":
+            h = Holding(flat_id=ch["flat_id"], start_date=date.fromisoformat(ch["date"]))
+            if ch["person"] in new_people:
+                setattr(h, person_field, new_people[ch["person"]])
+            else:
+                setattr(h, f"{person_field}_id", ch["person"])
+            new_holdings[ch["ref"]] = h
+        elif action == "status_change":
+            status_to[ch["flat_id"]] = ch["new"]
+
+    now = timezone.now()  # bulk_update() and update() don't fill auto_now fields
+    try:
+        with transaction.atomic():
+            Person.objects.bulk_create(list(new_people.values()), batch_size=_batch_size(Person))
+            phone_fields = ["phone", "phone_norm", "updated_at"]
+            Person.objects.bulk_update(
+                [Person(pk=pk, phone=phone, phone_norm=phone, updated_at=now) for pk, phone in phone_updates.items()],
+                phone_fields, batch_size=_batch_size(Person, phone_fields),
+            )
+            ids_per_update = _max_params() - 2  # the SET values take two
+            # end before create: only one active holding per flat is allowed
+            for on, pks in end_existing.items():
+                ended = 0
+                for ids in _chunks(pks, ids_per_update):
+                    pending = Holding.objects.filter(pk__in=ids, end_date__isnull=True)
+                    ended += pending.update(end_date=on, updated_at=now)
+                if ended != len(pks):
+                    raise StaleChangeSet(f"Some {Holding._meta.verbose_name_plural} were already ended.")
+            Holding.objects.bulk_create(list(new_holdings.values()), batch_size=_batch_size(Holding))
+            for status in {s for s in status_to.values()}:
+                for ids in _chunks((pk for pk, s in status_to.items() if s == status), ids_per_update):
+                    Flat.objects.filter(pk__in=ids).update(status_hint=status, updated_at=now)
+            # bulk writes skip model signals, so refresh the occupancy snapshot and search documents here
+            flat_ids = {ch["flat_id"] for ch in changes if ch.get("flat_id")}
+            refresh_flats(flat_ids)
+            bump("flats", "people")
+            people = {p.pk for p in new_people.values()} | set(phone_updates)
+            for ids in _chunks(flat_ids, _max_params()):
+                people.update(Holding.objects.filter(flat_id__in=ids).values_list(f"{person_field}_id", flat=True))
+            documents = {search.KIND_OF_MODEL[Person]: people, "flat": flat_ids}
+            transaction.on_commit(lambda: search.refresh(documents))
+    except IntegrityError as e:
+        raise StaleChangeSet(f"A flat already has another active {person_field}.") from e
+
+    return summarize_changes(kind, changes)
+
+
+# ───────────────────────── streaming file upload ─────────────────────────
+
+def _iter_lines(upload, chunk_size):
+    """Decode an UploadedFile/File lazily, chunk by chunk, yielding text lines."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    tail = ""
+    for chunk in upload.chunks(chunk_size):
+        *lines, tail = (tail + decoder.decode(chunk)).split("\n")
+        for ln in lines:
+            yield ln + "\n"
+    tail += decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+_DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y")
+
+
+def _parse_date(s):
+    s = (s or "").strip()
+    if not s:
+        return None
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(s, fmt).date()
+        except ValueError:
+            pass
+    raise ValueError(s)
+
+
+def iter_tenancy_rows(upload, chunk_size=64 * 1024):
+    """
+    Stream a CSV/TSV upload as (line_no, (flat_no, name, phone, start_date)) or
+    (line_no, "error message") for rows that can't be read. Columns:
+        Flat no, Lessee, Cell, Start date (optional: YYYY-MM-DD or DD/MM/YYYY)
+    A header row (mentioning "flat") is skipped; the delimiter is sniffed from the first line.
+    """
+    lines = _iter_lines(upload, chunk_size)
+    first = next(lines, None)
+    if first is None:
+        return
+    delimiter = "\t" if "\t" in first else ","
+
+    def all_lines():
+        yield first
+        yield from lines
+
+    for line_no, parts in enumerate(csv.reader(all_lines(), delimiter=delimiter), 1):
+        parts = [p.strip() for p in parts]
+        if not any(parts):
+            continue
+        if line_no == 1 and "flat" in parts[0].lower():
+            continue
+        if len(parts) < 2:
+            yield line_no, "expected at least: flat no, name"
+            continue
+        try:
+            start = _parse_date(parts[3] if len(parts) > 3 else "")
+        except ValueError:
+            yield line_no, f"invalid start date '{parts[3]}'"
+            continue
+        yield line_no, (parts[0], parts[1], parts[2] if len(parts) > 2 else "", start)
+
+
+def import_tenancies(upload, start_date, chunk_rows=CHUNK_SIZE, dry_run=False):
+    """
+    Import lessees/tenancies from a CSV/TSV upload without holding the file in memory.
+    Rows are planned and applied chunk_rows at a time, each chunk in its own transaction.
+    Yields a progress dict after every chunk:
+        {"rows": rows read so far, "counters": running totals, "errors": [(line_no, flat, reason), ...] for the chunk}
+    With dry_run each chunk is only planned, against the current data (earlier chunks aren't applied).
+    """
+    totals = summarize_changes(LESSEES, [])
+    totals["errors"] = 0
+    rows_read = 0
+
+    def run(batch, errors):
+        rows = [r for _, r in batch]
+        line_nos = [n for n, _ in batch]
+        changes = plan_changes(LESSEES, rows, load_snapshot(LESSEES, rows), start_date, first_row=0)
+        for ch in changes:
+            ch["row"] = line_nos[ch["row"]]
+        if dry_run:
+            counted = summarize_changes(LESSEES, changes)
+        else:
+            try:
+                counted = apply_changes(LESSEES, changes)
+            except StaleChangeSet as e:
+                errors.append((line_nos[0], "", f"chunk not applied: {e}"))
+                counted = {}
+        for ch in changes:
+            if ch["action"] == "skip":
+                errors.append((ch["row"], ch["flat"], ch["detail"]))
+        for k, v in counted.items():
+            totals[k] += v
+        totals["errors"] += len(errors)
+        return {"rows": rows_read, "counters": dict(totals), "errors": sorted(errors)}
+
+    batch, errors = [], []
+    for line_no, row in iter_tenancy_rows(upload):
+        rows_read += 1
+        if isinstance(row, str):
+            errors.append((line_no, "", row))
+        else:
+            batch.append((line_no, row))
+        if len(batch) >= chunk_rows:
+            yield run(batch, errors)
+            batch, errors = [], []
+    if batch or errors:
+        yield run(batch, errors)
@@ -0,0 +1,114 @@
+import json
+import platform
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import (
+    override_settings, setup_test_environment, teardown_test_environment, setup_databases, teardown_databases,
+)
+
+from core.benchmark import iter_urls, measure
+from core.synthetic import generate
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a synthetic building in a throwaway test database, GET every named URL "
+        "through the test client and report p50/p95 latency, queries and peak memory per view as JSON. "
+        "With --baseline, fail if any view regressed against a saved report."
+    )
+
+    def add_arguments(self, parser):
+        g = parser.add_argument_group("dataset")
+        g.add_argument("--floors", type=int, default=14)
+        g.add_argument("--units", type=int, default=8, help="Units per floor (A, B, ...; max 26).")
+        g.add_argument("--buildings", type=int, default=1)
+        g.add_argument("--rent-ratio", type=float, default=0.5)
+        g.add_argument("--churn", type=int, default=2, help="Ended tenancies per flat.")
+        g.add_argument("--vehicles", type=int, default=1, help="Vehicles per flat.")
+        g.add_argument("--assignment-history", type=int, default=2, help="Ended parking assignments per spot.")
+        g.add_argument("--providers", type=int, default=50)
+        g.add_argument("--seed", type=int, default=1)
+
+        g = parser.add_argument_group("run")
+        g.add_argument("--repeat", type=int, default=10, help="Requests per URL.")
+        g.add_argument("--warm", action="store_true", help="Keep the cache between requests (default: cold).")
+        g.add_argument("--only", default="", help="Only URL names containing this text.")
+        g.add_argument("--output", help="Write the JSON report here (default: stdout).")
+        g.add_argument("--baseline", help="Compare with this saved report and fail on regressions.")
+        g.add_argument("--tolerance", type=float, default=0.25, help="Allowed p95/memory growth (0.25 = 25%%).")
+
+    def handle(self, *args, **opts):
+        if not 1 <= opts["units"] <= 26:
+            raise CommandError("--units must be between 1 and 26.")
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={"default"})
+        try:
+            with override_settings(REQUEST_SLOW_MS=10 ** 9, REQUEST_SERVER_TIMING=False):
+                report = self._run(opts)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        text = json.dumps(report, indent=2)
+        if opts["output"]:
+            with open(opts["output"], "w", encoding="utf-8") as fh:
+                fh.write(text + "\n")
+            self.stdout.write(f"Report written to {opts['output']}.")
+        else:
+            self.stdout.write(text)
+
+        if opts["baseline"]:
+            with open(opts["baseline"], encoding="utf-8") as fh:
+                baseline = json.load(fh)
+            regressions = compare(baseline, report, opts["tolerance"])
+            for line in regressions:
+                self.stderr.write(self.style.ERROR(line))
+            if regressions:
+                raise CommandError(f"{len(regressions)} regression(s) against {opts['baseline']}.")
+            self.stdout.write(self.style.SUCCESS("No regressions against baseline."))
+
+    def _run(self, opts):
+        dataset = {k: opts[k] for k in (
+            "floors", "units", "buildings", "rent_ratio", "churn", "vehicles", "assignment_history", "providers", "seed",
+        )}
+        rows = generate(**dataset)
+
+        client = Client()
+        user = get_user_model().objects.create_superuser("bench", "bench@example.com", "bench")
+        client.force_login(user)
+
+        views = {}
+        for name, path in iter_urls():
+            if opts["only"] and opts["only"] not in name:
+                continue
+            views[name] = {"url": path, **measure(client, path, repeat=opts["repeat"], warm=opts["warm"])}
+            self.stderr.write(f"{name:32} {views[name]['p50_ms']:8.1f} ms  {views[name]['queries']:4} q")
+
+        return {
+            "meta": {
+                "python": platform.python_version(), "django": django.get_version(),
+                "repeat": opts["repeat"], "warm": opts["warm"], "dataset": dataset, "rows": rows,
+            },
+            "views": views,
+        }
+
+
+def compare(baseline, report, tolerance):
+    """Regression messages for views present in both reports with the same status."""
+    out = []
+    for name, now in report["views"].items():
+        was = baseline.get("views", {}).get(name)
+        if not was or was["status"] != now["status"]:
+            continue
+        if now["queries"] > was["queries"]:
+            out.append(f"{name}: {now['queries']} queries (baseline {was['queries']})")
+        # small absolute slack so sub-millisecond views don't fail on noise
+        if now["p95_ms"] > was["p95_ms"] * (1 + tolerance) + 2:
+            out.append(f"{name}: p95 {now['p95_ms']} ms (baseline {was['p95_ms']} ms)")
+        if now["peak_kb"] > was["peak_kb"] * (1 + tolerance) + 64:
+            out.append(f"{name}: peak {now['peak_kb']} KiB (baseline {was['peak_kb']} KiB)")
+    return out
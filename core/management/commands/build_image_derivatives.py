@@ -0,0 +1,40 @@
+from concurrent.futures import as_completed
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from core.images import IMAGE_FIELDS, ensure_all
+from core.procpool import django_pool
+
+
+class Command(BaseCommand):
+    help = "Create the thumbnail/print derivatives (core.images) of every stored photo and NID scan."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per core).")
+        parser.add_argument("--batch-size", type=int, default=20, help="Images per task.")
+        parser.add_argument("--force", action="store_true", help="Rebuild derivatives that already exist.")
+
+    def handle(self, *args, **opts):
+        names = []
+        for label, fields in IMAGE_FIELDS.items():
+            model = apps.get_model(label)
+            for field in fields:
+                names += model.objects.exclude(**{field: ""}).exclude(**{f"{field}__isnull": True}).values_list(field, flat=True)
+        names = sorted(set(names))
+        size = opts["batch_size"]
+        batches = [names[i:i + size] for i in range(0, len(names), size)]
+
+        made = written = done = 0
+        with django_pool(opts["workers"]) as pool:
+            futures = [pool.submit(ensure_all, batch, opts["force"]) for batch in batches]
+            for future in as_completed(futures):
+                for variants in future.result().values():
+                    made += len(variants)
+                    written += sum(variants.values())
+                done += 1
+                self.stdout.write(f"\r{done}/{len(batches)} batches", ending="")
+        self.stdout.write("")
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(names)} images checked, {made} derivatives written ({written / 1024 / 1024:.1f} MB)."
+        ))
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (
+    override_settings, setup_test_environment, teardown_test_environment, setup_databases, teardown_databases,
+)
+
+from core.querybudgets import KNOWN_N_PLUS_ONE, measure, verdict
+
+
+class Command(BaseCommand):
+    help = (
+        "Request every registered view against a synthetic building at 1× and 10× its current size "
+        "(in a throwaway test database) and fail if a query runs more often as the data grows or a "
+        "view exceeds its budget. The offending SQL fingerprints are printed for each failure. "
+        "core.tests runs the same check under `manage.py test`."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--only", default="", help="Only URL names containing this text.")
+
+    def handle(self, *args, **opts):
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={"default"})
+        try:
+            with override_settings(REQUEST_SLOW_MS=10 ** 9):
+                try:
+                    runs, hits = measure(opts["only"])
+                except AssertionError as e:
+                    raise CommandError(str(e))
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        failures = []
+        for name, (small, large) in runs.items():
+            ok, line, shown = verdict(name, small, large, hits.get(name, ()))
+            if ok:
+                self.stdout.write(line)
+                continue
+            if name in KNOWN_N_PLUS_ONE:
+                self.stdout.write(self.style.WARNING(line + " [known]"))
+            else:
+                self.stdout.write(self.style.ERROR(line))
+                failures.append(name)
+            for fp, before, after in shown:
+                self.stdout.write(f"    {before} → {after}×  {fp[:200]}")
+
+        if failures:
+            raise CommandError("Query budget exceeded: " + ", ".join(failures))
+        self.stdout.write(self.style.SUCCESS("All pages within query budget."))
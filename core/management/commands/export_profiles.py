@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from people import export
+from people.profile_pdf import KINDS
+
+
+class Command(BaseCommand):
+    help = "Write every owner and/or lessee profile PDF into one ZIP, rendered across CPU cores."
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="Path of the ZIP to write.")
+        parser.add_argument("--kind", choices=[*KINDS, "all"], default="all")
+        parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per core).")
+
+    def handle(self, *args, **opts):
+        kinds = list(KINDS) if opts["kind"] == "all" else [opts["kind"]]
+        started = time.perf_counter()
+        size = 0
+        with open(opts["output"], "wb") as fh:
+            for chunk in export.stream_zip(kinds, workers=opts["workers"]):
+                fh.write(chunk)
+                size += len(chunk)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {opts['output']} ({size / 1024 / 1024:.1f} MB) in {time.perf_counter() - started:.1f}s."
+        ))
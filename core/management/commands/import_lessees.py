@@ -0,0 +1,42 @@
+from datetime import date
+
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.importers import import_tenancies
+
+
+class Command(BaseCommand):
+    help = (
+        "Import lessees/tenancies from a CSV/TSV file (Flat no, Lessee, Cell, Start date), "
+        "streaming it in chunks of rows, one transaction per chunk."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--start-date", help="Default start date (YYYY-MM-DD); today if omitted.")
+        parser.add_argument("--chunk-rows", type=int, default=1000)
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **opts):
+        try:
+            start = date.fromisoformat(opts["start_date"]) if opts["start_date"] else timezone.localdate()
+        except ValueError:
+            raise CommandError("--start-date must be YYYY-MM-DD")
+
+        last = None
+        with open(opts["path"], "rb") as fh:
+            for step in import_tenancies(File(fh), start, opts["chunk_rows"], dry_run=opts["dry_run"]):
+                for line_no, flat, reason in step["errors"]:
+                    self.stderr.write(f"line {line_no}: {flat or '—'}: {reason}")
+                c = step["counters"]
+                self.stdout.write(
+                    f"{step['rows']} rows: lessees +{c['lessees_created']} ~{c['lessees_updated']}, "
+                    f"tenancies +{c['tenancies_created']} -{c['tenancies_ended']}, "
+                    f"status {c['status_changed']}, errors {c['errors']}"
+                )
+                last = step
+
+        rows = last["rows"] if last else 0
+        self.stdout.write(self.style.SUCCESS(f"Done: {rows} rows, dry_run={opts['dry_run']}"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.snapshot import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the occupancy snapshot (dashboard/overview) for every flat from scratch."
+
+    def handle(self, *args, **kwargs):
+        count = rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Occupancy snapshot rebuilt for {count} flats."))
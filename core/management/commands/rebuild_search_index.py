@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core.search import KINDS, rebuild
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search documents (core.search) from scratch."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--kind", action="append", choices=sorted(KINDS), help="Only these kinds (repeatable).")
+
+    def handle(self, *args, **opts):
+        counts = rebuild(opts["kind"])
+        summary = ", ".join(f"{kind}: {n}" for kind, n in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Search index rebuilt ({summary})."))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from core.storage import adopt, recount, collect_garbage
+
+
+class Command(BaseCommand):
+    help = (
+        "Bring the content-addressed document store (core.storage) in line with the tables: adopt files "
+        "stored under their upload names, recount references and remove unreferenced blobs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--grace-hours", type=float, default=24,
+                            help="Keep unreferenced blobs younger than this (uploads in flight).")
+        parser.add_argument("--dry-run", action="store_true", help="Report only; change nothing.")
+
+    def handle(self, *args, **opts):
+        dry_run = opts["dry_run"]
+        files, rows = adopt(dry_run=dry_run)
+        self.stdout.write(f"Adopted {files} files ({rows} rows repointed).")
+        if not dry_run:
+            self.stdout.write(f"Corrected {recount()} reference counts.")
+        removed, freed = collect_garbage(opts["grace_hours"] * 3600, dry_run=dry_run)
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Would remove' if dry_run else 'Removed'} {removed} unreferenced files ({freed / 1024 / 1024:.1f} MB)."
+        ))
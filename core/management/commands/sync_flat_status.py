@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from flats.models import Flat
+from core.sync import sync_flat_status
+
+
+class Command(BaseCommand):
+    help = "Align every Flat status with its active Ownership/Tenancy using set-based UPDATEs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="List the changes without writing them.")
+        parser.add_argument(
+            "--batch-size", type=int, default=5000,
+            help="Flats (by id range) per UPDATE batch/transaction; 0 = single batch.",
+        )
+
+    def handle(self, *args, **opts):
+        dry = opts["dry_run"]
+        changes, diff = sync_flat_status(dry_run=dry, batch_size=opts["batch_size"])
+
+        labels = dict(Flat.STATUS_CHOICES)
+        for _pk, code, old, new in diff:
+            self.stdout.write(f"{code}: {labels.get(old, old)} → {labels.get(new, new)}")
+
+        summary = ", ".join(f"{labels[s]}: {n}" for s, n in changes.items())
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Would update' if dry else 'Updated'} {sum(changes.values())} flats ({summary}), dry_run={dry}"
+        ))
@@ -0,0 +1,148 @@
+"""
+Serving stored files: uploads under MEDIA_ROOT, their derivatives and the
+rendered documents in core.filecache.
+
+serve() answers conditional requests first (If-None-Match/If-Modified-Since
+-> 304, If-Match/If-Unmodified-Since -> 412). A single byte range (Range,
+honoured only while If-Range still matches) is answered 206 with just those
+bytes; anything else streams the whole file through FileResponse, which WSGI
+servers hand to sendfile().
+
+With MEDIA_ACCEL set, the file itself is left to the front server once the
+headers are decided, so a large agreement PDF never ties up a Python worker:
+  "nginx"    - X-Accel-Redirect to the file's internal location
+               (MEDIA_ACCEL_LOCATIONS, per root); nginx then does ranges,
+  "sendfile" - X-Sendfile with the absolute path (Apache mod_xsendfile,
+               lighttpd).
+Files outside the configured roots are always served by Django.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 256 * 1024
+
+
+def roots():
+    """{name: directory} of the trees serve() may offload, keyed like MEDIA_ACCEL_LOCATIONS."""
+    return {"media": settings.MEDIA_ROOT, "filecache": settings.FILE_CACHE_DIR}
+
+
+def _byte_range(header, size):
+    """
+    (first, last) of a single-range header, None to ignore it (absent, multiple
+    ranges or malformed: the whole file is sent), False if it can't be satisfied.
+    """
+    m = _RANGE.match((header or "").strip())
+    if not m or m.groups() == ("", ""):
+        return None
+    first, last = m.groups()
+    if first == "":
+        n = int(last)  # suffix: the last n bytes
+        return (max(size - n, 0), size - 1) if n and size else False
+    first = int(first)
+    if last and int(last) < first:
+        return None
+    if first >= size:
+        return False
+    return first, min(int(last), size - 1) if last else size - 1
+
+
+def _if_range_matches(request, etag, last_modified):
+    value = request.META.get("HTTP_IF_RANGE")
+    if not value:
+        return True
+    if value.startswith(('"', "W/")):
+        return not value.startswith("W/") and value == etag  # strong comparison only
+    return parse_http_date_safe(value) == last_modified
+
+
+def _accel_headers(path):
+    mode = settings.MEDIA_ACCEL
+    if mode == "sendfile":
+        return {"X-Sendfile": str(path)}
+    if mode == "nginx":
+        for name, root in roots().items():
+            rel = os.path.relpath(path, root)
+            location = settings.MEDIA_ACCEL_LOCATIONS.get(name)
+            if location and not rel.startswith(os.pardir + os.sep) and rel != os.pardir:
+                return {"X-Accel-Redirect": location.rstrip("/") + "/" + quote(rel.replace(os.sep, "/"))}
+    return {}
+
+
+def _set(response, *headers):
+    for group in headers:
+        for header, value in group.items():
+            response[header] = value
+
+
+def _chunks(fh, first, last):
+    try:
+        fh.seek(first)
+        remaining = last - first + 1
+        while remaining > 0:
+            block = fh.read(min(CHUNK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+    finally:
+        fh.close()
+
+
+def serve(request, path, *, etag=None, cache_control="private, no-cache", content_type=None,
+          filename=None, as_attachment=False):
+    """
+    Response for the file at `path` (FileNotFoundError if there is none). `etag`
+    defaults to one from size and mtime; pass a content hash when there is one.
+    """
+    st = os.stat(path)
+    last_modified = int(st.st_mtime)
+    etag = etag or f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(last_modified),
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+    }
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:  # 304 or 412
+        _set(response, headers)
+        return response
+
+    content_type = content_type or mimetypes.guess_type(str(path))[0] or "application/octet-stream"
+    if filename or as_attachment:
+        name = filename or os.path.basename(path)
+        headers["Content-Disposition"] = f"{'attachment' if as_attachment else 'inline'}; filename*=UTF-8''{quote(name)}"
+
+    accel = _accel_headers(path)
+    if accel:
+        response = HttpResponse(content_type=content_type)
+        _set(response, accel, headers)
+        return response
+
+    wanted = _byte_range(request.META.get("HTTP_RANGE"), st.st_size)
+    if wanted is not None and _if_range_matches(request, etag, last_modified):
+        if wanted is False:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{st.st_size}"
+            _set(response, headers)
+            return response
+        first, last = wanted
+        response = StreamingHttpResponse(_chunks(open(path, "rb"), first, last), status=206, content_type=content_type)
+        response["Content-Length"] = str(last - first + 1)
+        response["Content-Range"] = f"bytes {first}-{last}/{st.st_size}"
+        _set(response, headers)
+        return response
+
+    response = FileResponse(open(path, "rb"), content_type=content_type)
+    _set(response, headers)
+    return response
@@ -0,0 +1,143 @@
+"""
+Per-request SQL and timing instrumentation.
+
+RequestMetricsMiddleware wraps every database execute (connection.execute_wrapper,
+so it works with DEBUG off) and records query count, SQL time, duplicates,
+TemplateResponse render time and total time. They are sent back as a
+Server-Timing header, and requests slower than REQUEST_SLOW_MS are logged as
+one JSON line on the "bms.requests" logger with the most repeated SQL
+fingerprints. Per query it only does a clock read and a dict increment, and
+duplicates in the header are counted on the SQL text as executed (Django
+passes parameters separately, so an N+1 loop repeats one string); only a slow
+request pays for fingerprinting. It is meant to stay on in production.
+
+DataVersionMiddleware scopes core.datacache's version read to the request.
+"""
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import datacache
+
+logger = logging.getLogger("bms.requests")
+
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_VALUE_LIST = re.compile(r"\((?:\s*(?:\?|%s|NULL)\s*,)*\s*(?:\?|%s|NULL)\s*\)")
+_ROW_LIST = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+_CASE_WHEN = re.compile(r"(?:WHEN \(.+?\) THEN \S+\s*){2,}")
+
+
+def fingerprint(sql):
+    """
+    SQL with literals, IN-lists, multi-row VALUES and bulk_update CASE arms
+    collapsed, so N+1 variants and differently sized batches share one key.
+    """
+    sql = _VALUE_LIST.sub("(...)", _LITERAL.sub("?", sql))
+    return _CASE_WHEN.sub("WHEN ... ", _ROW_LIST.sub("(...)", sql))
+
+
+def bulk_rows(sql):
+    """
+    Rows written by a bulk statement: the VALUES rows of an INSERT, the ids a
+    bulk_update CASE statement updates. 0 for anything else.
+    """
+    sql = _LITERAL.sub("?", sql)
+    if sql.startswith("INSERT"):
+        return len(_VALUE_LIST.findall(sql))
+    if sql.startswith("UPDATE") and " CASE WHEN " in sql:
+        ids = _VALUE_LIST.findall(sql.rpartition(" IN ")[2])
+        return ids[0].count("?") if ids else 0
+    return 0
+
+
+class _QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+            self.statements[sql] += 1
+
+    def fingerprints(self):
+        fps = Counter()
+        for sql, n in self.statements.items():
+            fps[fingerprint(sql)] += n
+        return fps
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, "REQUEST_SLOW_MS", 500)
+        self.server_timing = getattr(settings, "REQUEST_SERVER_TIMING", True)
+        self.top_n = getattr(settings, "REQUEST_SLOW_TOP_SQL", 5)
+
+    def __call__(self, request):
+        recorder = _QueryRecorder()
+        request._metrics_template = 0.0
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(recorder))
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - start) * 1000
+
+        duplicates = sum(n - 1 for n in recorder.statements.values() if n > 1)
+        sql_ms = recorder.seconds * 1000
+        tpl_ms = request._metrics_template * 1000
+
+        if self.server_timing:
+            response["Server-Timing"] = ", ".join([
+                f'sql;dur={sql_ms:.1f};desc="{recorder.count} queries, {duplicates} dup"',
+                f"tpl;dur={tpl_ms:.1f}",
+                f"total;dur={total_ms:.1f}",
+            ])
+
+        if total_ms >= self.slow_ms:
+            fps = recorder.fingerprints()
+            logger.warning("slow_request %s", json.dumps({
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                "total_ms": round(total_ms, 1),
+                "sql_ms": round(sql_ms, 1),
+                "template_ms": round(tpl_ms, 1),
+                "queries": recorder.count,
+                "duplicates": duplicates,
+                "top_sql": [{"count": n, "sql": fp[:300]} for fp, n in fps.most_common(self.top_n) if n > 1],
+            }))
+        return response
+
+    def process_template_response(self, request, response):
+        # TemplateResponse renders right after this hook; time it with a post-render callback
+        started = time.perf_counter()
+
+        def done(rendered):
+            request._metrics_template += time.perf_counter() - started
+
+        response.add_post_render_callback(done)
+        return response
+
+
+class DataVersionMiddleware:
+    """Read the core.datacache data versions at most once per request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with datacache.request_scope():
+            return self.get_response(request)
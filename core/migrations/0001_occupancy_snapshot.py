@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-17 01:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('flats', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OccupancySnapshot',
+            fields=[
+                ('flat', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='occupancy_snapshot', serialize=False, to='flats.flat')),
+                ('floor', models.PositiveSmallIntegerField()),
+                ('unit', models.CharField(max_length=1)),
+                ('status', models.CharField(choices=[('vacant', 'Vacant'), ('owner', 'Owner-occupied'), ('rented', 'Rented')], default='vacant', max_length=10)),
+                ('owner_name', models.CharField(blank=True, max_length=120)),
+                ('lessee_name', models.CharField(blank=True, max_length=120)),
+                ('spot_pk', models.BigIntegerField(blank=True, null=True)),
+                ('spot_code', models.CharField(blank=True, max_length=10)),
+                ('vehicle_plate', models.CharField(blank=True, max_length=20)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['floor', 'unit'],
+                'indexes': [models.Index(fields=['floor', 'unit'], name='occ_floor_unit_idx')],
+            },
+        ),
+    ]
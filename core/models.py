@@ -0,0 +1,81 @@
+from django.db import models
+
+from flats.models import Flat
+
+
+class OccupancySnapshot(models.Model):
+    """
+    Denormalised per-flat occupancy row (status, occupant names, parking) read by
+    the dashboard and overview in one scan. Kept current by core.signals; rebuild
+    with `manage.py rebuild_occupancy_snapshot`.
+    """
+    flat = models.OneToOneField(Flat, on_delete=models.CASCADE, primary_key=True, related_name="occupancy_snapshot")
+    floor = models.PositiveSmallIntegerField()
+    unit = models.CharField(max_length=1)
+    status = models.CharField(max_length=10, choices=Flat.STATUS_CHOICES, default=Flat.VACANT)
+    owner_name = models.CharField(max_length=120, blank=True)
+    lessee_name = models.CharField(max_length=120, blank=True)
+    spot_pk = models.BigIntegerField(null=True, blank=True)
+    spot_code = models.CharField(max_length=10, blank=True)
+    vehicle_plate = models.CharField(max_length=20, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["floor", "unit"]
+        indexes = [
+            models.Index(fields=["floor", "unit"], name="occ_floor_unit_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.unit}-{self.floor:02d}: {self.status}"
+
+    @property
+    def code(self):
+        return f"{self.unit}-{self.floor:02d}"
+
+
+class Blob(models.Model):
+    """
+    A file kept once by core.storage.DocumentStorage, under the hash of its
+    content, and how many rows reference it.
+    """
+    name = models.CharField(max_length=100, primary_key=True)
+    size = models.BigIntegerField()
+    refs = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.refs} refs)"
+
+
+class SearchDocument(models.Model):
+    """
+    The searchable text of one owner/lessee/vehicle/provider/flat (core.search).
+    The full-text index over these rows is created by migration, per database.
+    """
+    kind = models.CharField(max_length=10)
+    object_id = models.BigIntegerField()
+    title = models.CharField(max_length=200)
+    subtitle = models.CharField(max_length=200, blank=True)
+    body = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["kind", "object_id"], name="search_doc_kind_object_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.object_id}: {self.title}"
+
+
+class DataVersion(models.Model):
+    """
+    The data version of one model group (core.datacache). Kept in the database
+    so a bump from any process (another worker, a management command) is seen
+    by all of them.
+    """
+    group = models.CharField(max_length=20, primary_key=True)
+    version = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.group}: {self.version}"
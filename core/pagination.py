@@ -0,0 +1,148 @@
+"""
+Keyset (cursor) pagination for the list views.
+
+KeysetPaginationMixin replaces ListView's OFFSET paginator: a page is "the
+next page_size rows after (or before) this row's sort key", so page 500 costs
+the same as page 1 and no COUNT(*) runs per page. Cursors are signed, so
+they're opaque and can't be tampered with; a bad one falls back to page 1.
+
+The total shown in the pager comes from estimate_count(), cached per data
+version (core.datacache), so it refreshes after writes instead of per page.
+"""
+from urllib.parse import urlencode
+
+from django.core import signing
+from django.db import connections
+from django.db.models import Q
+
+from .datacache import cached
+
+_SALT = "core.pagination"
+
+
+def _value(obj, field):
+    for part in field.split("__"):
+        obj = getattr(obj, part)
+    return obj
+
+
+def _after(keys, values, forward):
+    """Q for rows strictly after (forward) or before the given key values, in key order."""
+    op = "gt" if forward else "lt"
+    q = Q()
+    for i, field in enumerate(keys):
+        step = Q(**{f"{field}__{op}": values[i]})
+        for prev, val in zip(keys[:i], values[:i]):
+            step &= Q(**{prev: val})
+        q |= step
+    return q
+
+
+def estimate_count(qs):
+    """
+    Row count for the pager. On PostgreSQL an unfiltered table uses the planner's
+    estimate (pg_class.reltuples) instead of scanning; otherwise an exact COUNT.
+    Returns (count, is_estimate).
+    """
+    conn = connections[qs.db]
+    if conn.vendor == "postgresql" and not qs.query.where:
+        with conn.cursor() as cur:
+            cur.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [qs.model._meta.db_table])
+            row = cur.fetchone()
+        if row and row[0] >= 0:
+            return row[0], True
+    return qs.count(), False
+
+
+class KeysetPage:
+    """The page_obj handed to templates (pager.html) by KeysetPaginationMixin."""
+
+    def __init__(self, object_list, count, is_estimate, next_cursor, prev_cursor):
+        self.object_list = object_list
+        self.count = count
+        self.is_estimate = is_estimate
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.prev_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginationMixin:
+    """
+    ListView mixin. Subclasses declare:
+      keyset      -- ordering fields, ascending, unique together with pk (pk is appended)
+      count_groups -- datacache groups whose writes change the total
+    get_queryset() should return the filtered queryset; the mixin orders it.
+    """
+    keyset = ()
+    count_groups = ()
+    cursor_param = "cursor"
+
+    def get_ordering(self):
+        return [*self.keyset, "pk"]
+
+    def paginate_queryset(self, queryset, page_size):
+        keys = self.get_ordering()
+        qs = queryset.order_by(*keys)
+        forward, values = True, None
+        token = self.request.GET.get(self.cursor_param)
+        if token:
+            try:
+                direction, values = signing.loads(token, salt=_SALT)
+                forward = direction == "n"
+            except (signing.BadSignature, ValueError, TypeError):
+                values = None
+        if values is not None and len(values) == len(keys):
+            qs = qs.filter(_after(keys, values, forward))
+        else:
+            values = None
+        if not forward:
+            qs = qs.reverse()
+
+        rows = list(qs[:page_size + 1])
+        more = len(rows) > page_size
+        rows = rows[:page_size]
+        if not forward:
+            rows.reverse()
+            if not more:  # walked back to the start: show a full first page
+                rows = list(queryset.order_by(*keys)[:page_size + 1])
+                forward, values, more = True, None, len(rows) > page_size
+                rows = rows[:page_size]
+
+        def cursor(direction, obj):
+            return signing.dumps([direction, [_value(obj, k) for k in keys]], salt=_SALT, compress=True)
+
+        has_next = more if forward else values is not None
+        has_prev = values is not None if forward else more
+        next_cursor = cursor("n", rows[-1]) if rows and has_next else None
+        prev_cursor = cursor("p", rows[0]) if rows and has_prev else None
+
+        count, is_estimate = cached(
+            f"count:{queryset.model._meta.label_lower}", self.count_groups,
+            lambda: estimate_count(queryset.order_by()), self._filter_key(),
+        )
+        page = KeysetPage(rows, count, is_estimate, next_cursor, prev_cursor)
+        return page, page, rows, page.has_other_pages()
+
+    def _filter_key(self):
+        return sorted((k, v) for k, v in self.request.GET.items() if k not in (self.cursor_param, "page", "per_page"))
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        base_qs = urlencode(self._filter_key())
+        ctx["base_qs"] = ("&" + base_qs) if base_qs else ""
+        ctx.setdefault("per_page", (self.request.GET.get("per_page") or str(self.paginate_by or "all")).lower())
+        return ctx
@@ -0,0 +1,54 @@
+"""
+Phone numbers in one comparable form.
+
+Numbers are stored as typed ("017-11 22 33 44", "+880 1711..."); every model
+with a `phone` also keeps `phone_norm`, the digits in national format, indexed,
+so lookups are exact or prefix matches on an index instead of LIKE '%...%'.
+"""
+import re
+
+from django.db.models import Q
+
+COUNTRY_CODE = "880"   # Bangladesh
+NATIONAL_DIGITS = 11   # 01XXXXXXXXX
+
+
+def normalise_phone(value) -> str:
+    """
+    Digits only, in national format: '+880 1711-223344', '008801711223344',
+    '8801711223344' and '1711223344' all become '01711223344'. Anything that
+    doesn't look like a local number keeps its digits as they are.
+    """
+    digits = re.sub(r"\D", "", str(value or ""))
+    if digits.startswith("00"):
+        digits = digits[2:]
+    if digits.startswith(COUNTRY_CODE) and len(digits) == len(COUNTRY_CODE) + NATIONAL_DIGITS - 1:
+        digits = "0" + digits[len(COUNTRY_CODE):]
+    elif len(digits) == NATIONAL_DIGITS - 1 and digits.startswith("1"):
+        digits = "0" + digits
+    return digits
+
+
+def normalise_phone_prefix(value) -> str:
+    """normalise_phone() for the start of a number, as typed into a search box ('+8801', '017-1')."""
+    digits = normalise_phone(value)
+    if digits.startswith(COUNTRY_CODE + "1"):
+        digits = "0" + digits[len(COUNTRY_CODE):]
+    return digits
+
+
+def phone_q(text, field="phone_norm", min_digits=3):
+    """
+    Q() matching `field` by normalised prefix of `text`, as a range so a plain
+    b-tree index serves it on every backend. A national number typed without
+    its trunk 0 ('1711...') matches too. Matches nothing when `text` has too
+    few digits to be a phone search.
+    """
+    digits = normalise_phone_prefix(text)
+    if len(digits) < min_digits:
+        return Q(pk__in=[])
+    q = Q(**{f"{field}__gte": digits, f"{field}__lt": digits + ":"})  # ':' sorts right after '9'
+    if digits.startswith("1"):
+        q |= Q(**{f"{field}__gte": "0" + digits, f"{field}__lt": "0" + digits + ":"})
+    return q
+
@@ -0,0 +1,52 @@
+"""
+Process pools whose workers run Django code.
+
+Workers are spawned, not forked, so they start clean: no database connections,
+locks or server threads inherited from the parent. Each one sets Django up
+before its first task. This module must not import models itself: it is what
+a new worker unpickles before Django is ready.
+
+django_pool() makes a pool for one job (a management command) to shut down
+when it is done. Request handlers use shared_pool(): one pool per name for the
+whole server process, started on first use, so concurrent requests share a
+bounded set of workers instead of each spawning its own.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _setup(settings_module):
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+    import django
+    django.setup()
+
+
+def django_pool(workers=None):
+    return ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count() or 1,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_setup,
+        initargs=(os.environ.get("DJANGO_SETTINGS_MODULE", "bms.settings"),),
+    )
+
+
+def shared_pool(name, workers=None):
+    """The process-wide pool called `name`; the first caller's `workers` sets its size."""
+    with _pools_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            pool = _pools[name] = django_pool(workers)
+        return pool
+
+
+def discard(name, pool):
+    """Forget a broken shared pool, so the next shared_pool(name) starts a fresh one."""
+    with _pools_lock:
+        if _pools.get(name) is pool:
+            del _pools[name]
+    pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,153 @@
+"""
+Query budgets: request every registered view against a synthetic building at
+1× and 10× its current size and check that no query runs more often as the
+data grows and that each view stays within its budget.
+
+core.tests runs this under `manage.py test`; `manage.py check_query_budgets`
+runs it on its own and prints what each page spends. Both need an empty test
+database: measure() seeds it.
+"""
+import math
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from people import search_index
+from .benchmark import iter_urls
+from .middleware import bulk_rows, fingerprint
+from .synthetic import generate
+
+# Declared budgets: queries allowed per page, counting the one read of the data
+# versions (core.datacache) where a page uses them. A declared page must also run
+# exactly as many queries at 10N as at N. Every other route gets DEFAULT_BUDGET.
+BUDGETS = {
+    "dashboard": 2,
+    "overview": 2,
+    "flats:list": 6,
+    "flats:occupancy": 21,  # 13 for the page, 8 to load the typeahead indexes behind the directory bundle
+    "parking:spot_list": 3,
+    "parking:spot_seed_all": 7,
+    "parking:vehicle_list": 1,
+    # people.profile: versions, person, history, other parties, vehicles, their assignments
+    "people:owner_profile": 6,
+    "people:owner_profile_json": 6,
+    "people:lessee_profile": 6,
+    "people:lessee_profile_json": 6,
+    # one ranked full-text query; the documents carry everything a result shows
+    "search": 1,
+    "search_api": 1,
+}
+DEFAULT_BUDGET = 10
+
+# On other routes no query may run more often at 10N than at N either, except
+# chunked bulk writes (multi-row INSERT, bulk_update's CASE UPDATE): SQLite caps a
+# statement at 999 parameters, so those may run as often as their rows need at
+# the largest chunk seen (see _grown).
+
+# Query strings that make a route show every row, so per-row queries can't hide behind a page size.
+PARAMS = {
+    "parking:vehicle_list": "?per_page=all",
+    "parking:spot_list": "?per_page=all",
+    # without ?q= search answers before querying anything; "owner" matches every owner
+    "search": "?q=owner&limit=100",
+    "search_api": "?q=owner&limit=100",
+}
+
+# POST-only routes that are safe to replay against synthetic data.
+POSTS = ("parking:spot_seed_all",)
+
+# Pages served from core.datacache: a repeat visit may only read the data versions.
+CACHED = (
+    "dashboard", "overview", "parking:spot_list",
+    "people:owner_profile", "people:owner_profile_json", "people:lessee_profile", "people:lessee_profile_json",
+)
+
+# Known per-row lookups still being fixed: reported, but don't fail the run.
+KNOWN_N_PLUS_ONE = set()
+
+_VERSIONS = '"core_dataversion"'
+
+FLOORS_PER_BUILDING = 14  # current building: 14 floors × 8 units
+
+
+def _request(client, name, path):
+    cache.clear()  # measure the uncached page, with cold typeahead indexes
+    search_index.owners.reset()
+    search_index.lessees.reset()
+    with CaptureQueriesContext(connection) as ctx:
+        resp = client.post(path) if name in POSTS else client.get(path + PARAMS.get(name, ""))
+    if resp.status_code not in (200, 302):
+        raise AssertionError(f"{name}: HTTP {resp.status_code}")
+    return [q["sql"] for q in ctx.captured_queries]
+
+
+def measure(only=""):
+    """
+    Seed the building at 1× then 10× and request every route (URL names
+    containing `only`) at each size. Returns (runs, hits): {name: [sql @1×,
+    sql @10×]} and, for CACHED pages, {name: [queries of a repeat visit
+    besides the version read, per size]}.
+    """
+    client = Client()
+    runs, hits = {}, {}
+    seeded = 0
+    for scale in (1, 10):
+        target = FLOORS_PER_BUILDING * scale
+        generate(
+            floors=target - seeded, first_floor=seeded + 1, churn=1, assignment_history=1, providers=10, seed=scale,
+        )
+        seeded = target
+        routes = list(iter_urls()) + [(name, reverse(name)) for name in POSTS]
+        for name, path in routes:
+            if only and only not in name:
+                continue
+            runs.setdefault(name, []).append(_request(client, name, path))
+            if name in CACHED:
+                with CaptureQueriesContext(connection) as ctx:
+                    client.get(path + PARAMS.get(name, ""))
+                others = [q for q in ctx.captured_queries if _VERSIONS not in q["sql"]]
+                hits.setdefault(name, []).append(len(others))
+    return runs, hits
+
+
+def verdict(name, small, large, hits=()):
+    """
+    (ok, summary line, [(fingerprint, runs @1×, runs @10×)]) for one route:
+    what grew with the data, else what the page spends its budget on.
+    """
+    budget = BUDGETS.get(name, DEFAULT_BUDGET)
+    grown = _grown(small, large, chunked=name not in BUDGETS)
+    ok = max(len(small), len(large)) <= budget and not grown and not any(hits)
+    line = f"{name}: {len(small)} queries @1×, {len(large)} @10× (budget {budget})"
+    if hits:
+        line += f", cached: {max(hits)}"
+    shown = grown or [(fp, n, n) for fp, n in Counter(map(fingerprint, small)).most_common(3)]
+    return ok, line, shown[:5]
+
+
+def _grown(small, large, chunked=True):
+    """
+    [(fingerprint, runs @1×, runs @10×)] for queries that run more often at 10×.
+    With `chunked`, a bulk write may run ceil(rows / largest chunk) times: as
+    many statements as its rows need, never one per row.
+    """
+    before, after = Counter(map(fingerprint, small)), Counter()
+    rows, chunk = Counter(), Counter()
+    for sql in large:
+        fp = fingerprint(sql)
+        after[fp] += 1
+        n = bulk_rows(sql)
+        rows[fp] += n
+        chunk[fp] = max(chunk[fp], n)
+    grown = []
+    for fp, n in after.most_common():
+        allowed = before.get(fp, 0)
+        if chunked and chunk[fp] > 1:
+            allowed = max(allowed, math.ceil(rows[fp] / chunk[fp]))
+        if n > allowed:
+            grown.append((fp, before.get(fp, 0), n))
+    return grown
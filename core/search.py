@@ -0,0 +1,288 @@
+"""
+Full-text search across owners, lessees, vehicles, service providers and flats.
+
+Every searchable record has one SearchDocument row (kind, object id, the title
+and subtitle shown in results, and a body of everything else it should be
+found by: phone numbers, e-mail, plates, flat codes, notes, ...). The text
+index over those rows depends on the database:
+  SQLite     - an FTS5 table using the rows as external content, kept in step
+               by triggers (migration core 0003),
+  PostgreSQL - a GIN index on their tsvector ('simple' configuration).
+Queries are token-prefix matches ANDed together ("kar udd" finds "Karim
+Uddin"), ranked by relevance with the title weighted above the body, so a
+lookup costs an index probe rather than a scan of every row and column.
+
+core.signals refreshes the documents a save or delete touches once the
+transaction commits (an owner's rename also refreshes their vehicles and
+flats). Bulk writers call refresh() themselves; `manage.py
+rebuild_search_index` rebuilds everything.
+"""
+import re
+import unicodedata
+
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+from django.urls import reverse
+
+from flats.models import Flat
+from people.models import Owner, Lessee, Ownership, Tenancy
+from .phones import normalise_phone, normalise_phone_prefix, phone_q
+
+try:
+    from parking.models import Vehicle
+except Exception:
+    Vehicle = None
+try:
+    from providers.models import ServiceProvider
+except Exception:
+    ServiceProvider = None
+
+CHUNK_SIZE = 2000
+TITLE_WEIGHT, BODY_WEIGHT = 10.0, 1.0
+RANK_WINDOW = 5000  # matches ranked per query (see search())
+_FLAT_Q = re.compile(r"^([A-Za-z])[-_]?0*(\d{1,3})$")
+
+
+# ───────────────────────── text ─────────────────────────
+def normalise(text):
+    """Casefolded, accent-free text, as the FTS5 unicode61 tokenizer sees it."""
+    text = unicodedata.normalize("NFKD", str(text or "")).casefold()
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def terms(q):
+    """
+    Search terms of a query: a phone number is one normalised term, a flat code
+    ('a7', 'A-07') the compact form flats are indexed under, else word tokens.
+    """
+    q = (q or "").strip()
+    m = _FLAT_Q.match(q.replace(" ", ""))
+    if m:
+        return [_flat_term(m.group(1), m.group(2))]
+    if _is_phone(q):
+        return [normalise_phone_prefix(q)]
+    return re.findall(r"[^\W_]+", normalise(q))
+
+
+def _is_phone(q):
+    return len(re.sub(r"[\s()+-]", "", q)) >= 3 and bool(re.fullmatch(r"[\d\s()+-]+", q))
+
+
+def _flat_term(unit, floor):
+    return f"{unit.lower()}{int(floor):02d}"
+
+
+def _flat_words(unit, floor):
+    return f"{unit}-{floor:02d} {_flat_term(unit, floor)}" if unit else ""
+
+
+def _phone_words(phone):
+    """A national number also under its digits without the trunk 0 ('1711...')."""
+    digits = normalise_phone(phone)
+    return f"{digits} {digits[1:]}" if digits.startswith("0") else digits
+
+
+def _plate_words(plate):
+    """'DHAKAMETRO-GA12-3456' also as 'dhakametro ga 12 3456' and its digits '123456'."""
+    runs = re.findall(r"[^\W\d_]+|\d+", plate)
+    return _join(re.sub(r"[\W_]+", "", plate), *runs, "".join(r for r in runs if r.isdigit()))
+
+
+def _join(*parts):
+    return " ".join(str(p) for p in parts if p)
+
+
+# ───────────────────────── documents per kind ─────────────────────────
+def _people(model, holding_model, person_field):
+    def build(ids):
+        flats = {}
+        rows = holding_model.objects.filter(**{f"{person_field}_id__in": ids, "end_date__isnull": True})
+        for pk, unit, floor in rows.values_list(f"{person_field}_id", "flat__unit", "flat__floor"):
+            flats.setdefault(pk, []).append((unit, floor))
+        for pk, name, phone, email, address in model.objects.filter(pk__in=ids).values_list(
+            "pk", "name", "phone", "email", "address",
+        ):
+            held = sorted(flats.get(pk, ()))
+            codes = ", ".join(f"{u}-{f:02d}" for u, f in held)
+            yield pk, name, _join(codes, phone), _join(
+                *(_flat_words(u, f) for u, f in held), _phone_words(phone), email, address,
+            )
+    return build
+
+
+def _vehicles(ids):
+    rows = Vehicle.objects.filter(pk__in=ids).values_list(
+        "pk", "plate_no", "vehicle_type", "make", "model", "color", "tag_no",
+        "owner__name", "lessee__name", "external_owner__name", "external_owner__company", "flat__unit", "flat__floor",
+    )
+    types = dict(Vehicle.V_TYPES)
+    for pk, plate, vtype, make, model, color, tag, owner, lessee, external, company, unit, floor in rows:
+        holder = owner or lessee or external
+        yield pk, plate, _join(types.get(vtype, vtype), holder), _join(
+            _plate_words(plate), make, model, color, tag, holder, company, _flat_words(unit, floor),
+        )
+
+
+def _providers(ids):
+    rows = ServiceProvider.objects.filter(pk__in=ids).values_list(
+        "pk", "full_name", "category__name", "phone", "email", "address", "notes", "nid_number",
+    )
+    for pk, name, category, phone, email, address, notes, nid in rows:
+        yield pk, name, _join(category, phone), _join(category, _phone_words(phone), email, address, nid, notes)
+
+
+def _flats(ids):
+    occupants = {}
+    for model, field in ((Ownership, "owner"), (Tenancy, "lessee")):
+        rows = model.objects.filter(flat_id__in=ids, end_date__isnull=True).values_list("flat_id", f"{field}__name")
+        for flat_id, name in rows:
+            occupants.setdefault(flat_id, []).append(name)
+    for pk, unit, floor, remarks in Flat.objects.filter(pk__in=ids).values_list("pk", "unit", "floor", "remarks"):
+        names = occupants.get(pk, [])
+        yield pk, f"{unit}-{floor:02d}", _join(", ".join(names)), _join(_flat_words(unit, floor), *names, remarks)
+
+
+KINDS = {
+    "owner": {"label": "Owner", "model": Owner, "build": _people(Owner, Ownership, "owner"),
+              "url": "people:owner_profile"},
+    "lessee": {"label": "Lessee", "model": Lessee, "build": _people(Lessee, Tenancy, "lessee"),
+               "url": "people:lessee_profile"},
+    "flat": {"label": "Flat", "model": Flat, "build": _flats, "url": "flats:occupancy"},
+}
+if Vehicle:
+    KINDS["vehicle"] = {"label": "Vehicle", "model": Vehicle, "build": _vehicles, "url": "parking:vehicle_edit"}
+if ServiceProvider:
+    KINDS["provider"] = {"label": "Provider", "model": ServiceProvider, "build": _providers, "url": "providers:edit"}
+KIND_OF_MODEL = {kind["model"]: name for name, kind in KINDS.items()}
+
+
+# ───────────────────────── keeping documents current ─────────────────────────
+def refresh(changes):
+    """
+    Rebuild the documents of {kind: ids}; ids that no longer exist lose theirs.
+    Returns the number of documents written.
+    """
+    from .models import SearchDocument
+
+    written = 0
+    for kind, ids in changes.items():
+        ids = sorted(set(ids))
+        for i in range(0, len(ids), CHUNK_SIZE):
+            chunk = ids[i:i + CHUNK_SIZE]
+            docs = [
+                SearchDocument(kind=kind, object_id=pk, title=title[:200], subtitle=subtitle[:200], body=body)
+                for pk, title, subtitle, body in KINDS[kind]["build"](chunk)
+            ]
+            with transaction.atomic():
+                SearchDocument.objects.filter(kind=kind, object_id__in=chunk).delete()
+                SearchDocument.objects.bulk_create(docs, batch_size=500)
+            written += len(docs)
+    return written
+
+
+def rebuild(kinds=None):
+    """Rebuild every document (of `kinds`). Returns {kind: documents}."""
+    from .models import SearchDocument
+
+    out = {}
+    for kind in kinds or KINDS:
+        SearchDocument.objects.filter(kind=kind).delete()
+        pks = KINDS[kind]["model"].objects.order_by("pk").values_list("pk", flat=True)
+        out[kind] = refresh({kind: list(pks.iterator(chunk_size=CHUNK_SIZE))})
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cur:
+            cur.execute("INSERT INTO core_searchdocument_fts(core_searchdocument_fts) VALUES ('optimize')")
+    return out
+
+
+# ───────────────────────── querying ─────────────────────────
+def _fts_query(q):
+    """The query in the database's full-text syntax, or None when it has no terms."""
+    words = terms(q)
+    if not words:
+        return None
+    if connection.vendor == "postgresql":
+        return " & ".join(f"{w}:*" for w in words)
+    m = _FLAT_Q.match(q.strip().replace(" ", ""))
+    if m:
+        # the code as a phrase, so it matches the "A-07" of a flat's title (ranked first) too
+        return f'"{m.group(1).lower()} {int(m.group(2)):02d}"'
+    return " ".join(f'"{w}"*' for w in words)
+
+
+def _match(q):
+    """(SQL condition on document rows `d`, params) for the query, or None when it has no terms."""
+    query = _fts_query(q)
+    if query is None:
+        return None
+    if connection.vendor == "postgresql":
+        return "to_tsvector('simple', d.title || ' ' || d.body) @@ to_tsquery('simple', %s)", [query]
+    return "d.id IN (SELECT rowid FROM core_searchdocument_fts WHERE core_searchdocument_fts MATCH %s)", [query]
+
+
+def search(q, kinds=None, limit=20, offset=0):
+    """
+    Ranked [{"kind", "label", "id", "title", "subtitle", "url"}] for `q`, and
+    whether more follow. `kinds` narrows the search to some kinds.
+
+    Ranking costs time per matching document, so only the first RANK_WINDOW
+    matches are ranked: a query as broad as "a" stays fast, and any query
+    specific enough to be useful is ranked in full.
+    """
+    kinds = [k for k in (kinds or KINDS) if k in KINDS]
+    query = _fts_query(q)
+    if query is None or not kinds:
+        return [], False
+    in_kinds = ", ".join(["%s"] * len(kinds))
+    if connection.vendor == "postgresql":
+        sql = f"""
+            SELECT d.kind, d.object_id, d.title, d.subtitle FROM (
+                SELECT id FROM core_searchdocument
+                WHERE to_tsvector('simple', title || ' ' || body) @@ to_tsquery('simple', %s) AND kind IN ({in_kinds})
+                LIMIT %s
+            ) ranked JOIN core_searchdocument d ON d.id = ranked.id
+            ORDER BY ts_rank(
+                setweight(to_tsvector('simple', d.title), 'A') || setweight(to_tsvector('simple', d.body), 'B'),
+                to_tsquery('simple', %s)
+            ) DESC, d.title
+            LIMIT %s OFFSET %s"""
+        params = [query, *kinds, RANK_WINDOW, query, limit + 1, offset]
+    else:
+        sql = f"""
+            SELECT d.kind, d.object_id, d.title, d.subtitle FROM (
+                SELECT d.id AS id, bm25(core_searchdocument_fts, {TITLE_WEIGHT}, {BODY_WEIGHT}) AS score
+                FROM core_searchdocument_fts JOIN core_searchdocument d ON d.id = core_searchdocument_fts.rowid
+                WHERE core_searchdocument_fts MATCH %s AND d.kind IN ({in_kinds})
+                LIMIT %s
+            ) ranked JOIN core_searchdocument d ON d.id = ranked.id
+            ORDER BY ranked.score, d.title
+            LIMIT %s OFFSET %s"""
+        params = [query, *kinds, RANK_WINDOW, limit + 1, offset]
+    with connection.cursor() as cur:
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+    results = [
+        {
+            "kind": kind, "label": KINDS[kind]["label"], "id": pk, "title": title, "subtitle": subtitle,
+            "url": reverse(KINDS[kind]["url"], args=[pk]),
+        }
+        for kind, pk, title, subtitle in rows[:limit]
+    ]
+    return results, len(rows) > limit
+
+
+def filter_queryset(qs, kind, q):
+    """
+    `qs` narrowed to the records of `kind` whose documents match `q` (unchanged
+    for an empty query). A phone number on a model with phone_norm is a range
+    on that indexed column instead (core.phones.phone_q).
+    """
+    q = (q or "").strip()
+    if _is_phone(q) and any(f.name == "phone_norm" for f in qs.model._meta.concrete_fields):
+        return qs.filter(phone_q(q))
+    match = _match(q)
+    if match is None:
+        return qs
+    condition, params = match
+    ids = RawSQL(f"SELECT d.object_id FROM core_searchdocument d WHERE d.kind = %s AND {condition}", [kind, *params])
+    return qs.filter(pk__in=ids)
@@ -0,0 +1,258 @@
+"""
+Keep derived data current when the models it comes from change: the
+OccupancySnapshot rows, the data versions behind core.datacache, the
+people typeahead index, image derivatives, document reference counts and
+the full-text search documents.
+"""
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+from django.db.models.signals import post_init, pre_save, post_save, pre_delete, post_delete, post_migrate
+from django.dispatch import receiver
+
+from flats.models import Flat
+from people import search_index
+from people.models import Owner, Lessee, Ownership, Tenancy
+from . import images, search, snapshot, storage
+from .datacache import bump
+from .models import OccupancySnapshot, SearchDocument
+
+try:
+    from parking.models import ParkingSpot, Vehicle, ParkingAssignment, ExternalOwner
+except Exception:
+    ParkingSpot = Vehicle = ParkingAssignment = ExternalOwner = None
+try:
+    from providers.models import ServiceProvider, ServiceCategory
+except Exception:
+    ServiceProvider = ServiceCategory = None
+
+
+def _refresh_later(flat_ids):
+    """Refresh once the surrounding transaction commits (immediately in autocommit)."""
+    flat_ids = set(flat_ids)
+    if flat_ids:
+        transaction.on_commit(lambda: snapshot.refresh_flats(flat_ids))
+
+
+@receiver(post_save, sender=Flat)
+def _flat_saved(sender, instance, **kwargs):
+    _refresh_later([instance.pk])
+
+
+@receiver(post_save, sender=Ownership)
+@receiver(post_delete, sender=Ownership)
+@receiver(post_save, sender=Tenancy)
+@receiver(post_delete, sender=Tenancy)
+def _holding_changed(sender, instance, **kwargs):
+    _refresh_later([instance.flat_id])
+
+
+@receiver(post_save, sender=Owner)
+def _owner_saved(sender, instance, created, **kwargs):
+    if not created:
+        _refresh_later(instance.ownerships.filter(end_date__isnull=True).values_list("flat_id", flat=True))
+
+
+@receiver(post_save, sender=Lessee)
+def _lessee_saved(sender, instance, created, **kwargs):
+    if not created:
+        _refresh_later(instance.tenancies.filter(end_date__isnull=True).values_list("flat_id", flat=True))
+
+
+@receiver(post_migrate)
+def _rebuild_after_migrate(sender, app_config=None, **kwargs):
+    if app_config is not None and app_config.name == "core":
+        snapshot.rebuild()
+        if not SearchDocument.objects.exists():
+            search.rebuild()  # first migrate with the search tables
+
+
+if ParkingSpot:
+    @receiver(post_save, sender=ParkingSpot)
+    @receiver(post_delete, sender=ParkingSpot)
+    def _spot_changed(sender, instance, **kwargs):
+        # the spot may have moved away from a flat, so refresh wherever it was too
+        previous = OccupancySnapshot.objects.filter(spot_pk=instance.pk).values_list("flat_id", flat=True)
+        _refresh_later([instance.flat_id, *previous])
+
+    @receiver(post_save, sender=ParkingAssignment)
+    @receiver(post_delete, sender=ParkingAssignment)
+    def _assignment_changed(sender, instance, **kwargs):
+        _refresh_later(ParkingSpot.objects.filter(pk=instance.spot_id).values_list("flat_id", flat=True))
+
+    @receiver(post_save, sender=Vehicle)
+    def _vehicle_saved(sender, instance, created, **kwargs):
+        if not created:
+            _refresh_later(
+                instance.assignments.filter(end_date__isnull=True).values_list("spot__flat_id", flat=True)
+            )
+
+
+# ───────────────────────── data versions (core.datacache) ─────────────────────────
+# Connected after the snapshot receivers so the snapshot is refreshed before
+# the version moves and nobody caches a page built from a stale snapshot.
+GROUP_MODELS = {
+    "flats": [Flat],
+    "people": [Owner, Lessee, Ownership, Tenancy],
+    "parking": [m for m in (ParkingSpot, Vehicle, ParkingAssignment, ExternalOwner) if m],
+    "providers": [m for m in (ServiceProvider, ServiceCategory) if m],
+}
+_GROUP_OF = {model: group for group, models in GROUP_MODELS.items() for model in models}
+
+
+def _bump_group(sender, **kwargs):
+    bump(_GROUP_OF[sender])
+
+
+for _model in _GROUP_OF:
+    post_save.connect(_bump_group, sender=_model, dispatch_uid=f"datacache-save-{_model._meta.label}")
+    post_delete.connect(_bump_group, sender=_model, dispatch_uid=f"datacache-delete-{_model._meta.label}")
+
+
+# ───────────────────────── people typeahead index (people.search_index) ─────────────────────────
+# Also connected after the version bump: the index records the versions it is
+# current with, so it has to refresh once the bump has landed.
+def _index_later(index, person_ids):
+    person_ids = set(person_ids)
+    transaction.on_commit(lambda: index.refresh(person_ids))
+
+
+@receiver(post_save, sender=Owner)
+@receiver(post_delete, sender=Owner)
+def _owner_indexed(sender, instance, **kwargs):
+    _index_later(search_index.owners, [instance.pk])
+
+
+@receiver(post_save, sender=Lessee)
+@receiver(post_delete, sender=Lessee)
+def _lessee_indexed(sender, instance, **kwargs):
+    _index_later(search_index.lessees, [instance.pk])
+
+
+@receiver(post_save, sender=Ownership)
+@receiver(post_delete, sender=Ownership)
+def _ownership_indexed(sender, instance, **kwargs):
+    _index_later(search_index.owners, [instance.owner_id])
+
+
+@receiver(post_save, sender=Tenancy)
+@receiver(post_delete, sender=Tenancy)
+def _tenancy_indexed(sender, instance, **kwargs):
+    _index_later(search_index.lessees, [instance.lessee_id])
+
+
+# ───────────────────────── image uploads and derivatives (core.images) ─────────────────────────
+def _images_saving(sender, instance, **kwargs):
+    # Runs before the fields' own pre_save, which is what stores a new upload.
+    # Stored images are named by content (core.storage); a new upload still
+    # has the name it was sent with and an UploadedFile behind it.
+    for field in images.IMAGE_FIELDS[sender._meta.label]:
+        value = getattr(instance, field)
+        if not value or storage.is_blob(value.name):
+            continue
+        try:
+            upload = value.file
+        except (OSError, ValueError):
+            continue  # a stored name whose file is gone: nothing to strip
+        if isinstance(upload, UploadedFile):
+            stripped = images.stripped_upload(upload)
+            if stripped is not None:
+                setattr(instance, field, stripped)
+
+
+def _images_saved(sender, instance, **kwargs):
+    names = [getattr(instance, f).name for f in images.IMAGE_FIELDS[sender._meta.label] if getattr(instance, f)]
+    if names:
+        transaction.on_commit(lambda: images.ensure_all(names))
+
+
+for _label in images.IMAGE_FIELDS:
+    pre_save.connect(_images_saving, sender=_label, dispatch_uid=f"images-upload-{_label}")
+    post_save.connect(_images_saved, sender=_label, dispatch_uid=f"images-{_label}")
+
+
+# ───────────────────────── document references (core.storage) ─────────────────────────
+# A row takes a reference to each blob it names when saved and drops the one
+# it named before; the drop (which may remove the file) waits for the commit.
+_DOCUMENT_FIELDS = storage.document_fields()
+
+
+def _document_names(sender, instance):
+    names = {}
+    for field in _DOCUMENT_FIELDS[sender]:
+        value = instance.__dict__.get(field)  # raw, so a deferred field isn't loaded
+        names[field] = getattr(value, "name", value) or ""
+    return names
+
+
+def _documents_loaded(sender, instance, **kwargs):
+    instance._document_names = _document_names(sender, instance)
+
+
+def _documents_saved(sender, instance, **kwargs):
+    before = getattr(instance, "_document_names", {})
+    after = _document_names(sender, instance)
+    for field, name in after.items():
+        old = before.get(field, "")
+        if name == old:
+            continue
+        if storage.is_blob(name):
+            storage.acquire(name)
+        if storage.is_blob(old):
+            transaction.on_commit(lambda old=old: storage.release(old))
+    instance._document_names = after
+
+
+def _documents_deleted(sender, instance, **kwargs):
+    for name in getattr(instance, "_document_names", {}).values():
+        if storage.is_blob(name):
+            transaction.on_commit(lambda name=name: storage.release(name))
+
+
+for _model in _DOCUMENT_FIELDS:
+    post_init.connect(_documents_loaded, sender=_model, dispatch_uid=f"documents-init-{_model._meta.label}")
+    post_save.connect(_documents_saved, sender=_model, dispatch_uid=f"documents-save-{_model._meta.label}")
+    post_delete.connect(_documents_deleted, sender=_model, dispatch_uid=f"documents-delete-{_model._meta.label}")
+
+
+# ───────────────────────── search documents (core.search) ─────────────────────────
+# Each sender maps to the documents its rows appear in. Deletes are collected
+# before the row goes, while the rows pointing at it can still be found.
+def _active_flats(holdings):
+    return holdings.filter(end_date__isnull=True).values_list("flat_id", flat=True)
+
+
+SEARCH_DEPENDENTS = {
+    Owner: lambda o: {"owner": [o.pk], "vehicle": o.vehicles.values_list("pk", flat=True),
+                      "flat": _active_flats(o.ownerships)},
+    Lessee: lambda o: {"lessee": [o.pk], "vehicle": o.vehicles.values_list("pk", flat=True),
+                       "flat": _active_flats(o.tenancies)},
+    Ownership: lambda h: {"owner": [h.owner_id], "flat": [h.flat_id]},
+    Tenancy: lambda h: {"lessee": [h.lessee_id], "flat": [h.flat_id]},
+    Flat: lambda f: {"flat": [f.pk]},
+}
+if Vehicle:
+    SEARCH_DEPENDENTS[Vehicle] = lambda v: {"vehicle": [v.pk]}
+    SEARCH_DEPENDENTS[ExternalOwner] = lambda e: {"vehicle": e.vehicles.values_list("pk", flat=True)}
+if ServiceProvider:
+    SEARCH_DEPENDENTS[ServiceProvider] = lambda p: {"provider": [p.pk]}
+    SEARCH_DEPENDENTS[ServiceCategory] = lambda c: {"provider": c.providers.values_list("pk", flat=True)}
+
+
+def _search_later(sender, instance):
+    changes = {kind: set(ids) - {None} for kind, ids in SEARCH_DEPENDENTS[sender](instance).items()}
+    changes = {kind: ids for kind, ids in changes.items() if ids and kind in search.KINDS}
+    if changes:
+        transaction.on_commit(lambda: search.refresh(changes))
+
+
+def _search_saved(sender, instance, **kwargs):
+    _search_later(sender, instance)
+
+
+def _search_deleting(sender, instance, **kwargs):
+    _search_later(sender, instance)
+
+
+for _model in SEARCH_DEPENDENTS:
+    post_save.connect(_search_saved, sender=_model, dispatch_uid=f"search-save-{_model._meta.label}")
+    pre_delete.connect(_search_deleting, sender=_model, dispatch_uid=f"search-delete-{_model._meta.label}")
@@ -0,0 +1,109 @@
+"""
+Maintenance of core.models.OccupancySnapshot.
+
+refresh_flats() recomputes the rows for some flats and upserts them in one
+INSERT ... SELECT, however many flats it is given; rebuild() does every flat.
+Model signals (core.signals) call refresh_flats() after ordinary saves. Bulk
+writers (importers, status sync) bypass signals, so they call refresh_flats()
+themselves.
+"""
+from django.db import connection, models, transaction
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from flats.models import Flat
+from people.models import Ownership, Tenancy
+from .models import OccupancySnapshot
+
+try:
+    from parking.models import ParkingAssignment
+except Exception:
+    ParkingAssignment = None
+
+CHUNK_SIZE = 1000
+FIELDS = ["floor", "unit", "status", "owner_name", "lessee_name", "spot_pk", "spot_code", "vehicle_plate"]
+
+
+def _source(flat_ids=None, stamp=None):
+    """Snapshot rows as (flat pk, *FIELDS[, stamp]) tuples, straight from the live tables."""
+    active_own = Ownership.objects.filter(flat=OuterRef("pk"), end_date__isnull=True).order_by("-start_date")
+    active_ten = Tenancy.objects.filter(flat=OuterRef("pk"), end_date__isnull=True).order_by("-start_date")
+    qs = Flat.objects.annotate(
+        owner_name=Coalesce(Subquery(active_own.values("owner__name")[:1]), Value("")),
+        lessee_name=Coalesce(Subquery(active_ten.values("lessee__name")[:1]), Value("")),
+    )
+    if ParkingAssignment:
+        active_pa = ParkingAssignment.objects.filter(spot__flat=OuterRef("pk"), end_date__isnull=True)
+        qs = qs.annotate(
+            spot_pk=F("parking_spot__id"),
+            spot_code=Coalesce(F("parking_spot__code"), Value("")),
+            vehicle_plate=Coalesce(Subquery(active_pa.values("vehicle__plate_no")[:1]), Value("")),
+        )
+    else:
+        qs = qs.annotate(
+            spot_pk=Value(None, output_field=models.BigIntegerField()), spot_code=Value(""), vehicle_plate=Value(""),
+        )
+    names = ["owner_name", "lessee_name", "spot_pk", "spot_code", "vehicle_plate"]
+    if stamp is not None:
+        qs = qs.annotate(stamp=Value(stamp, output_field=models.DateTimeField()))
+        names.append("stamp")
+    if flat_ids is not None:
+        qs = qs.filter(pk__in=flat_ids)
+    return qs.values_list("pk", "floor", "unit", "status_hint", *names)
+
+
+def _build(row):
+    pk, floor, unit, status, owner_name, lessee_name, spot_pk, spot_code, plate = row
+    return OccupancySnapshot(
+        flat_id=pk, floor=floor, unit=unit, status=status, owner_name=owner_name, lessee_name=lessee_name,
+        spot_pk=spot_pk, spot_code=spot_code, vehicle_plate=plate,
+    )
+
+
+def refresh_flats(flat_ids):
+    """Recompute and upsert the snapshot rows of the given flats."""
+    flat_ids = list({pk for pk in flat_ids if pk})
+    if not flat_ids:
+        return
+    if len(flat_ids) > CHUNK_SIZE:
+        flat_ids = None  # recomputing every flat is cheaper than a list this long
+    if connection.vendor not in ("sqlite", "postgresql"):
+        OccupancySnapshot.objects.bulk_create(
+            [_build(r) for r in _source(flat_ids)],
+            update_conflicts=True, unique_fields=["flat"], update_fields=FIELDS + ["updated_at"],
+        )
+        return
+    qn = connection.ops.quote_name
+    columns = [OccupancySnapshot._meta.get_field(f).column for f in ["flat", *FIELDS, "updated_at"]]
+    source, params = _source(flat_ids, stamp=timezone.now()).query.sql_with_params()
+    sql = (
+        f"INSERT INTO {qn(OccupancySnapshot._meta.db_table)} ({', '.join(map(qn, columns))}) "
+        # SQLite needs a WHERE before ON CONFLICT to parse an INSERT ... SELECT upsert
+        f"SELECT * FROM ({source}) src WHERE 1 = 1 "
+        f"ON CONFLICT ({qn(columns[0])}) DO UPDATE SET "
+        + ", ".join(f"{qn(c)} = excluded.{qn(c)}" for c in columns[1:])
+    )
+    with connection.cursor() as cur:
+        cur.execute(sql, params)
+
+
+def refresh_status(flats):
+    """Copy status_hint into the snapshot for the given Flat queryset, in one UPDATE."""
+    return (
+        OccupancySnapshot.objects.filter(flat__in=flats)
+        .exclude(status=F("flat__status_hint"))
+        .update(
+            status=Subquery(Flat.objects.filter(pk=OuterRef("flat_id")).values("status_hint")[:1]),
+            updated_at=timezone.now(),
+        )
+    )
+
+
+def rebuild():
+    """Throw the snapshot away and recompute it for every flat. Returns the row count."""
+    with transaction.atomic():
+        OccupancySnapshot.objects.all().delete()
+        rows = [_build(r) for r in _source().iterator(chunk_size=CHUNK_SIZE)]
+        OccupancySnapshot.objects.bulk_create(rows, batch_size=CHUNK_SIZE)
+    return len(rows)
@@ -0,0 +1,247 @@
+"""
+Content-addressed storage for uploaded documents (photos, NID scans, lease
+agreements).
+
+DocumentStorage ignores the upload's name except for its extension: the
+content is hashed while it is written and kept once as
+blobs/<sha[:2]>/<sha><ext>. Uploading the same scan again returns the name of
+the copy already stored, so identical files are stored once and same-named
+ones no longer collide.
+
+Uploads are never read into memory here: a file Django already spooled to disk
+(over FILE_UPLOAD_MAX_MEMORY_SIZE) is hashed in place and moved, anything else
+is streamed chunk by chunk into a temporary file next to the blobs.
+
+Every stored name has a Blob row counting the rows that reference it.
+core.signals keeps the count as rows are saved, get another file or are
+deleted; the last reference going removes the file and its derivatives, once
+the transaction that dropped it commits. Changes that bypass the signals
+(queryset.update()) are caught up by `manage.py reconcile_documents`, which
+recounts references from the tables, removes unreferenced blobs and adopts
+files stored before this backend.
+"""
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+import time
+from collections import Counter
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files import File
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import models, transaction
+from django.utils.deconstruct import deconstructible
+
+BLOB_DIR = "blobs"
+_EXT = re.compile(r"^\.[a-z0-9]{1,8}$")
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(BLOB_DIR + "/")
+
+
+def blob_digest(name):
+    """sha256 a blob was stored under, or None for other names (derivatives included)."""
+    if not is_blob(name):
+        return None
+    digest, _, ext = posixpath.basename(name).partition(".")
+    return digest if len(digest) == 64 and "." not in ext else None
+
+
+def blob_name(digest, original_name=""):
+    ext = posixpath.splitext(original_name)[1].lower()
+    return f"{BLOB_DIR}/{digest[:2]}/{digest}{ext if _EXT.match(ext) else ''}"
+
+
+@deconstructible
+class DocumentStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        return name  # _save() picks the name from the content
+
+    def _save(self, name, content):
+        from .models import Blob
+
+        tmp_dir = os.path.join(self.location, BLOB_DIR, ".tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        h = hashlib.sha256()
+        if hasattr(content, "temporary_file_path"):
+            tmp = content.temporary_file_path()
+            with open(tmp, "rb") as fh:
+                for block in iter(lambda: fh.read(1024 * 1024), b""):
+                    h.update(block)
+            own_tmp = False
+        else:
+            fd, tmp = tempfile.mkstemp(dir=tmp_dir)
+            with os.fdopen(fd, "wb") as fh:
+                for chunk in content.chunks():
+                    h.update(chunk)
+                    fh.write(chunk)
+            own_tmp = True
+
+        name = blob_name(h.hexdigest(), name)
+        path = self.path(name)
+        try:
+            with transaction.atomic():
+                # taken before the file is placed, so a concurrent release() can't remove it meanwhile
+                Blob.objects.get_or_create(name=name, defaults={"size": os.path.getsize(tmp)})
+                Blob.objects.select_for_update().filter(name=name).first()
+                if os.path.exists(path):
+                    if own_tmp:
+                        os.unlink(tmp)
+                else:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    file_move_safe(tmp, path, allow_overwrite=True)
+                    if settings.FILE_UPLOAD_PERMISSIONS is not None:
+                        os.chmod(path, settings.FILE_UPLOAD_PERMISSIONS)
+        except BaseException:
+            if own_tmp and os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        return name
+
+    def delete(self, name):
+        """Blobs go with their last reference (release()); other names are deleted as usual."""
+        if blob_digest(name) is None:
+            super().delete(name)
+
+    def etag(self, name):
+        """Strong ETag of a stored name: the content hash for blobs, else None."""
+        digest = blob_digest(name)
+        return f'"{digest}"' if digest else None
+
+
+def acquire(name, storage=None):
+    """Add a reference to the blob `name` (in the caller's transaction)."""
+    from .models import Blob
+
+    storage = storage or documents
+    if not Blob.objects.filter(name=name).update(refs=models.F("refs") + 1):
+        size = storage.size(name) if storage.exists(name) else 0
+        Blob.objects.get_or_create(name=name, defaults={"size": size, "refs": 1})
+
+
+def release(name, storage=None):
+    """Drop one reference to the blob `name`; returns True if it was removed."""
+    from . import images
+    from .models import Blob
+
+    storage = storage or documents
+    with transaction.atomic():
+        blob = Blob.objects.select_for_update().filter(name=name).first()
+        if blob is None:
+            return False  # not counted yet; reconcile_documents decides
+        if blob.refs > 1:
+            Blob.objects.filter(pk=blob.pk).update(refs=models.F("refs") - 1)
+            return False
+        blob.delete()
+        images.delete_derivatives(name, storage=storage)
+        FileSystemStorage.delete(storage, name)
+    return True
+
+
+def document_fields():
+    """{model: [FileField names]} for every field stored with DocumentStorage."""
+    out = {}
+    for model in apps.get_models():
+        for field in model._meta.get_fields():
+            if isinstance(field, models.FileField) and isinstance(field.storage, DocumentStorage):
+                out.setdefault(model, []).append(field.name)
+    return out
+
+
+documents = DocumentStorage()
+
+
+# ── maintenance (manage.py reconcile_documents) ──
+def adopt(dry_run=False):
+    """
+    Move files stored under their upload names into the blob store and repoint
+    the rows naming them. Returns (files adopted, rows repointed).
+    """
+    from . import images
+
+    moved = {}
+    rows = 0
+    for model, fields in document_fields().items():
+        for field in fields:
+            legacy = model._base_manager.exclude(**{f"{field}__startswith": BLOB_DIR + "/"}).exclude(**{field: ""})
+            for old in legacy.exclude(**{f"{field}__isnull": True}).values_list(field, flat=True).distinct():
+                if old not in moved:
+                    if not documents.exists(old):
+                        continue
+                    if dry_run:
+                        moved[old] = old
+                    else:
+                        with documents.open(old, "rb") as fh:
+                            moved[old] = documents.save(old, File(fh, name=old))
+                if not dry_run:
+                    rows += model._base_manager.filter(**{field: old}).update(**{field: moved[old]})
+    if not dry_run:
+        for old, new in moved.items():
+            images.delete_derivatives(old)
+            FileSystemStorage.delete(documents, old)
+            images.ensure_derivatives(new)
+    return len(moved), rows
+
+
+def recount():
+    """Set every Blob's refs to the number of rows naming it. Returns the number corrected."""
+    from .models import Blob
+
+    refs = Counter()
+    for model, fields in document_fields().items():
+        for field in fields:
+            names = model._base_manager.filter(**{f"{field}__startswith": BLOB_DIR + "/"}).values_list(field, flat=True)
+            refs.update(names.iterator(chunk_size=5000))
+    corrected = 0
+    with transaction.atomic():
+        for blob in Blob.objects.select_for_update().iterator(chunk_size=5000):
+            n = refs.pop(blob.name, 0)
+            if blob.refs != n:
+                Blob.objects.filter(pk=blob.pk).update(refs=n)
+                corrected += 1
+        for name, n in refs.items():
+            if documents.exists(name):
+                Blob.objects.create(name=name, size=documents.size(name), refs=n)
+                corrected += 1
+    return corrected
+
+
+def collect_garbage(grace_seconds=24 * 3600, dry_run=False):
+    """
+    Remove blobs nobody references, and leftover temporary files, older than
+    `grace_seconds` (younger ones may belong to an upload whose row isn't saved
+    yet). Returns (files removed, bytes freed).
+    """
+    from . import images
+    from .models import Blob
+
+    cutoff = time.time() - grace_seconds
+    counted = dict(Blob.objects.values_list("name", "refs"))
+    root = documents.path(BLOB_DIR)
+    removed = freed = 0
+    for dirpath, _, files in os.walk(root):
+        for filename in files:
+            path = os.path.join(dirpath, filename)
+            name = os.path.relpath(path, documents.location).replace(os.sep, "/")
+            is_temp = os.path.basename(dirpath) == ".tmp"
+            if not is_temp and (blob_digest(name) is None or counted.get(name, 0) > 0):
+                continue  # a derivative (goes with its blob), or referenced
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if st.st_mtime > cutoff:
+                continue
+            removed += 1
+            freed += st.st_size
+            if not dry_run:
+                if not is_temp:
+                    images.delete_derivatives(name)
+                    Blob.objects.filter(name=name, refs=0).delete()
+                os.unlink(path)
+    return removed, freed
@@ -0,0 +1,95 @@
+"""
+Set-based Flat.status_hint synchronisation.
+
+A flat is Rented if it has an active Tenancy, else Owner-occupied if it has an
+active Ownership, else Vacant. Instead of checking each flat, the engine runs
+one UPDATE per target status (filtered with EXISTS subqueries), optionally in
+primary-key windows so huge tables never sit in one long transaction.
+"""
+from django.db import transaction
+from django.db.models import Case, Exists, F, Max, Min, OuterRef, Value, When
+from django.utils import timezone
+
+from flats.models import Flat
+from people.models import Ownership, Tenancy
+from .snapshot import refresh_status
+from .datacache import bump
+
+
+def _has_tenant():
+    return Exists(Tenancy.objects.filter(flat=OuterRef("pk"), end_date__isnull=True))
+
+
+def _has_owner():
+    return Exists(Ownership.objects.filter(flat=OuterRef("pk"), end_date__isnull=True))
+
+
+def target_status():
+    """CASE expression giving the status a flat should have."""
+    return Case(
+        When(_has_tenant(), then=Value(Flat.RENTED)),
+        When(_has_owner(), then=Value(Flat.OWNER_OCCUPIED)),
+        default=Value(Flat.VACANT),
+    )
+
+
+def _windows(batch_size):
+    """Yield (lo, hi) primary-key bounds covering all flats, batch_size ids at a time."""
+    bounds = Flat.objects.aggregate(lo=Min("pk"), hi=Max("pk"))
+    if bounds["lo"] is None:
+        return
+    if not batch_size:
+        yield bounds["lo"], bounds["hi"] + 1
+        return
+    for lo in range(bounds["lo"], bounds["hi"] + 1, batch_size):
+        yield lo, lo + batch_size
+
+
+def sync_flat_status(dry_run=False, batch_size=None):
+    """
+    Align every flat's status_hint with its active Ownership/Tenancy.
+
+    Returns (changes, diff):
+      changes -> {status: number of flats moved to that status}
+      diff    -> [(flat_id, "A-01", old_status, new_status), ...] (dry run only; empty otherwise)
+    """
+    changes = {s: 0 for s, _ in Flat.STATUS_CHOICES}
+    diff = []
+
+    for lo, hi in _windows(batch_size):
+        window = Flat.objects.filter(pk__gte=lo, pk__lt=hi)
+        if dry_run:
+            rows = (
+                window.annotate(target=target_status())
+                .exclude(status_hint=F("target"))
+                .order_by("floor", "unit")
+                .values_list("pk", "unit", "floor", "status_hint", "target")
+            )
+            for pk, unit, floor, old, new in rows:
+                changes[new] += 1
+                diff.append((pk, f"{unit}-{floor:02d}", old, new))
+            continue
+
+        now = timezone.now()
+        with transaction.atomic():
+            changes[Flat.RENTED] += (
+                window.filter(_has_tenant())
+                .exclude(status_hint=Flat.RENTED)
+                .update(status_hint=Flat.RENTED, updated_at=now)
+            )
+            changes[Flat.OWNER_OCCUPIED] += (
+                window.filter(~_has_tenant(), _has_owner())
+                .exclude(status_hint=Flat.OWNER_OCCUPIED)
+                .update(status_hint=Flat.OWNER_OCCUPIED, updated_at=now)
+            )
+            changes[Flat.VACANT] += (
+                window.filter(~_has_tenant(), ~_has_owner())
+                .exclude(status_hint=Flat.VACANT)
+                .update(status_hint=Flat.VACANT, updated_at=now)
+            )
+            refresh_status(window)
+
+    if not dry_run and any(changes.values()):
+        bump("flats")
+
+    return changes, diff
@@ -0,0 +1,137 @@
+"""
+Synthetic building/population generator for benchmarks and query-budget checks.
+
+Everything is written with bulk inserts and driven by a seeded random.Random,
+so the same parameters always give the same dataset. The app models a single
+building, so extra buildings are stacked as further floor ranges
+(building 2 starts at floor `floors + 1`, and so on).
+"""
+import random
+import string
+from datetime import date, timedelta
+
+from flats.models import Flat
+from people.models import Owner, Lessee, Ownership, Tenancy
+from parking.models import ParkingSpot, Vehicle, ParkingAssignment
+
+try:
+    from providers.models import ServiceCategory, ServiceProvider
+except Exception:
+    ServiceCategory = ServiceProvider = None
+
+from . import search
+from .datacache import GROUPS, bump
+from .snapshot import refresh_flats
+
+BATCH_SIZE = 500
+TODAY = date(2025, 1, 1)
+
+
+def _phone(rng):
+    """phone/phone_norm kwargs; bulk_create skips save(), which normally fills phone_norm."""
+    phone = "017" + "".join(rng.choice(string.digits) for _ in range(8))
+    return {"phone": phone, "phone_norm": phone}
+
+
+def generate(floors=14, units=8, buildings=1, first_floor=1, owner_ratio=0.8, rent_ratio=0.5,
+             churn=0, vehicles=1, assignment_history=0, providers=0, seed=0):
+    """
+    Add `buildings` × `floors` × `units` flats starting at `first_floor`, with:
+      * owners: about owner_ratio per flat (so some own several flats), one active ownership each
+      * tenancies: `churn` ended tenancies per flat, plus an active one on rent_ratio of the flats
+      * one parking spot per flat, `vehicles` vehicles per flat, the first parked on the spot,
+        after `assignment_history` ended assignments
+      * `providers` service providers (if the providers app is installed)
+    Returns {model name: rows created}.
+    """
+    rng = random.Random(seed)
+    unit_letters = string.ascii_uppercase[:units]
+    last_floor = first_floor + buildings * floors - 1
+    flats = Flat.objects.bulk_create(
+        [Flat(floor=fl, unit=u) for fl in range(first_floor, last_floor + 1) for u in unit_letters],
+        batch_size=BATCH_SIZE,
+    )
+    rented = {f.pk for f in flats if rng.random() < rent_ratio}
+
+    owners = Owner.objects.bulk_create(
+        [Owner(name=f"Owner {first_floor}-{i}", **_phone(rng)) for i in range(max(1, int(len(flats) * owner_ratio)))],
+        batch_size=BATCH_SIZE,
+    )
+    owner_of = {f.pk: owners[i] if i < len(owners) else rng.choice(owners) for i, f in enumerate(flats)}
+    Ownership.objects.bulk_create(
+        [Ownership(flat=f, owner=owner_of[f.pk], start_date=TODAY - timedelta(days=rng.randint(400, 4000))) for f in flats],
+        batch_size=BATCH_SIZE,
+    )
+
+    lessees, tenancies = [], []
+    for f in flats:
+        start = TODAY
+        if f.pk in rented:
+            start = TODAY - timedelta(days=rng.randint(30, 360))
+            lessees.append(Lessee(name=f"Lessee {f}", **_phone(rng)))
+            tenancies.append(Tenancy(flat=f, start_date=start))
+        for k in range(churn):
+            end = start - timedelta(days=rng.randint(1, 30))
+            start = end - timedelta(days=rng.randint(180, 720))
+            lessees.append(Lessee(name=f"Past lessee {f} #{k + 1}", **_phone(rng)))
+            tenancies.append(Tenancy(flat=f, start_date=start, end_date=end))
+    lessees = Lessee.objects.bulk_create(lessees, batch_size=BATCH_SIZE)
+    for t, l in zip(tenancies, lessees):
+        t.lessee = l
+    Tenancy.objects.bulk_create(tenancies, batch_size=BATCH_SIZE)
+    current_lessee = {t.flat_id: t.lessee for t in tenancies if t.end_date is None}
+
+    for status in (Flat.OWNER_OCCUPIED, Flat.RENTED):
+        ids = [f.pk for f in flats if (f.pk in rented) == (status == Flat.RENTED)]
+        for i in range(0, len(ids), BATCH_SIZE):
+            Flat.objects.filter(pk__in=ids[i:i + BATCH_SIZE]).update(status_hint=status)
+
+    spots = ParkingSpot.objects.bulk_create(
+        [ParkingSpot(code=f"{f.unit}-{f.floor:03d}", level=1 + f.floor % 3, flat=f) for f in flats],
+        batch_size=BATCH_SIZE,
+    )
+    cars = []
+    for f in flats:
+        lessee = current_lessee.get(f.pk)
+        for n in range(vehicles):
+            plate = f"DHA-{f.unit}{f.floor:03d}-{n + 1}"
+            if lessee:
+                cars.append(Vehicle(plate_no=plate, owner_type=Vehicle.LESSEE, lessee=lessee, flat=f))
+            else:
+                cars.append(Vehicle(plate_no=plate, owner_type=Vehicle.OWNER, owner=owner_of[f.pk], flat=f))
+    cars = Vehicle.objects.bulk_create(cars, batch_size=BATCH_SIZE)
+
+    assignments = []
+    if vehicles:
+        for spot, i in zip(spots, range(0, len(cars), vehicles)):
+            mine = cars[i:i + vehicles]
+            start = TODAY - timedelta(days=rng.randint(10, 300))
+            assignments.append(ParkingAssignment(vehicle=mine[0], spot=spot, start_date=start))
+            for _ in range(assignment_history):
+                end = start - timedelta(days=1)
+                start = end - timedelta(days=rng.randint(30, 365))
+                assignments.append(ParkingAssignment(vehicle=rng.choice(mine), spot=spot, start_date=start, end_date=end))
+    ParkingAssignment.objects.bulk_create(assignments, batch_size=BATCH_SIZE)
+
+    made_providers = []
+    if ServiceProvider and providers:
+        categories = [ServiceCategory.objects.get_or_create(name=n)[0] for n in ("Electrician", "Plumber", "Cleaner")]
+        made_providers = ServiceProvider.objects.bulk_create(
+            [ServiceProvider(category=rng.choice(categories), full_name=f"Provider {first_floor}-{i}", **_phone(rng))
+             for i in range(providers)],
+            batch_size=BATCH_SIZE,
+        )
+
+    # bulk inserts skip model signals: refresh the snapshot, search documents and data versions by hand
+    refresh_flats(f.pk for f in flats)
+    bump(*GROUPS)
+    search.refresh({
+        "flat": [f.pk for f in flats], "owner": [o.pk for o in owners], "lessee": [p.pk for p in lessees],
+        "vehicle": [c.pk for c in cars], "provider": [p.pk for p in made_providers],
+    })
+
+    return {
+        "flats": len(flats), "owners": len(owners), "ownerships": len(flats), "lessees": len(lessees),
+        "tenancies": len(tenancies), "spots": len(spots), "vehicles": len(cars), "assignments": len(assignments),
+        "providers": len(made_providers),
+    }
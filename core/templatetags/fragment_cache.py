@@ -0,0 +1,31 @@
+from django import template
+
+from core.datacache import cached
+
+register = template.Library()
+
+
+class VersionedCacheNode(template.Node):
+    def __init__(self, nodelist, args):
+        self.nodelist = nodelist
+        self.args = args
+
+    def render(self, context):
+        name, *groups = [a.resolve(context) for a in self.args]
+        return cached(name, groups, lambda: self.nodelist.render(context))
+
+
+@register.tag("versioned_cache")
+def do_versioned_cache(parser, token):
+    """
+    {% versioned_cache "name" "group" ... %} ... {% endversioned_cache %}
+
+    Caches the rendered block until the data version of any listed group moves.
+    Don't put per-user or per-request content (csrf tokens, messages) inside.
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' needs a fragment name and at least one group.")
+    nodelist = parser.parse(("endversioned_cache",))
+    parser.delete_first_token()
+    return VersionedCacheNode(nodelist, [parser.compile_filter(b) for b in bits[1:]])
@@ -0,0 +1,11 @@
+from django import template
+
+from core.images import derivative_url
+
+register = template.Library()
+
+
+@register.filter
+def derivative(fieldfile, variant="thumb"):
+    """{{ owner.photo|derivative:"thumb" }} -> URL of the derivative, falling back to the original."""
+    return derivative_url(fieldfile, variant)
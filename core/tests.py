@@ -0,0 +1,21 @@
+from django.test import TransactionTestCase, override_settings
+
+from .querybudgets import KNOWN_N_PLUS_ONE, measure, verdict
+
+
+@override_settings(REQUEST_SLOW_MS=10 ** 9)
+class QueryBudgetTests(TransactionTestCase):
+    """
+    Every page within its query budget (core.querybudgets) at 1× and 10× the
+    synthetic building. A TransactionTestCase, so on_commit work (version
+    bumps, snapshot and search refreshes) runs as it does in production.
+    """
+
+    def test_pages_within_budget(self):
+        runs, hits = measure()
+        for name, (small, large) in runs.items():
+            if name in KNOWN_N_PLUS_ONE:
+                continue
+            ok, line, shown = verdict(name, small, large, hits.get(name, ()))
+            with self.subTest(route=name):
+                self.assertTrue(ok, "\n".join([line] + [f"    {a} → {b}×  {fp[:200]}" for fp, a, b in shown]))
@@ -1,56 +1,74 @@
-import re
+import json
+import os
+import uuid
+from collections import Counter
+
 from django.views.generic import TemplateView, FormView, View
+from django.core import signing
+from django.core.exceptions import SuspiciousFileOperation
+from django.conf import settings
+from django.http import JsonResponse, Http404
+from django.utils._os import safe_join
 from django.shortcuts import render, redirect
 from django.urls import reverse_lazy
+from django.utils.decorators import method_decorator
 from django.contrib import messages
 from django.utils import timezone
-from django.db import transaction
-from django.db.models import Count, Q
 
 from flats.models import Flat
-from people.models import Owner, Ownership, Lessee, Tenancy
-from .forms import BulkOwnersForm
-
-# Optional: if Parking app is installed, Overview can show parking + vehicle info.
-try:
-    from parking.models import ParkingSpot
-except Exception:
-    ParkingSpot = None
+from people.models import Ownership, Lessee, Tenancy
+from .forms import BulkOwnersForm, BulkLesseesForm
+from .models import OccupancySnapshot
+from .datacache import cached, versions, stats
+from .conditional import conditional_on
+from .importers import (
+    OWNERS, LESSEES, parse_owner_rows, load_snapshot, plan_changes, apply_changes, summarize_changes,
+    import_tenancies, StaleChangeSet,
+)
+from .sync import sync_flat_status
+from . import dedup, filecache, media, search
+from .storage import BLOB_DIR, documents
 
 
 # ───────────────────────── Dashboard ─────────────────────────
+DASHBOARD_GROUPS = ("flats", "people", "parking")  # what OccupancySnapshot is built from
+
+
+@method_decorator(conditional_on(*DASHBOARD_GROUPS), name="dispatch")
 class DashboardView(TemplateView):
+    """
+    KPIs and the occupancy map, both from one ordered scan of OccupancySnapshot.
+    The grid spans whatever floors and units exist instead of a fixed 14×8.
+    The result is cached per data version, so a repeat visit runs no queries.
+    """
     template_name = "core/dashboard.html"
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-
-        all_flats = Flat.objects.all()
-        ctx["flat_count"] = all_flats.count()
-
-        counts = dict(
-            all_flats.values_list("status_hint")
-            .annotate(c=Count("id"))
-            .values_list("status_hint", "c")
-        )
-        ctx["cnt_owner"]  = counts.get("owner", 0)
-        ctx["cnt_rented"] = counts.get("rented", 0)
-        ctx["cnt_vacant"] = counts.get("vacant", 0)
-
-        # Occupancy grid (floors 14..1, units A..H)
-        units = list("ABCDEFGH")
-        levels = []
-        status_by = {(f.floor, f.unit): f.status_hint for f in all_flats}
-        for floor in range(14, 0, -1):
-            row = []
-            for u in units:
-                status = status_by.get((floor, u), "vacant")
-                row.append({"unit": u, "floor": floor, "status": status})
-            levels.append({"floor": floor, "cells": row})
-        ctx["levels"] = levels
-
+        ctx.update(cached("dashboard", DASHBOARD_GROUPS, self.build))
         return ctx
 
+    @staticmethod
+    def build():
+        cells = list(OccupancySnapshot.objects.values_list("floor", "unit", "status"))
+        counts = Counter(status for _, _, status in cells)
+
+        # Occupancy grid (top floor first); positions without a flat stay blank
+        status_by = {(floor, unit): status for floor, unit, status in cells}
+        units = sorted({unit for _, unit, _ in cells})
+        floors = sorted({floor for floor, _, _ in cells}, reverse=True)
+        return {
+            "flat_count": len(cells),
+            "cnt_owner": counts.get(Flat.OWNER_OCCUPIED, 0),
+            "cnt_rented": counts.get(Flat.RENTED, 0),
+            "cnt_vacant": counts.get(Flat.VACANT, 0),
+            "units": units,
+            "levels": [
+                {"floor": floor, "cells": [{"unit": u, "floor": floor, "status": status_by.get((floor, u))} for u in units]}
+                for floor in floors
+            ],
+        }
+
 
 # ───────────────────────── Bulk owners paste tool ─────────────────────────
 class BulkOwnersView(FormView):
@@ -59,247 +77,297 @@ class BulkOwnersView(FormView):
         Flat no, Owner, Cell
         A-01, Md. Rahim, 01711123456
         E-10, Ashikur Rahman, 01711...
-    Preview via form.dry_run; can optionally vacate flats not listed.
+    Preview (form.dry_run) plans the change-set from a read-only snapshot and
+    keeps it in core.filecache under a random token, which alone goes into the
+    session (a 20k-row change-set is megabytes); "Apply" then runs exactly
+    that change-set.
+    Can optionally vacate flats not listed.
     """
     template_name = "core/bulk_owners.html"
     form_class = BulkOwnersForm
     success_url = reverse_lazy("bulk_owners")
+    session_key = "bulk_owners_changeset"
+    cache_namespace = "changesets"
+    preview_limit = 500  # rows of the change-set rendered on the page
 
-    @staticmethod
-    def _clean_flat_code(s: str):
-        if not s:
-            return None
-        s = str(s).strip().upper().replace(" ", "")
-        m = re.match(r"^([A-H])[-_]?0?(\d{1,2})$", s)
-        if not m:
-            return None
-        unit, fl = m.group(1), int(m.group(2))
-        if 1 <= fl <= 14:
-            return unit, fl
-        return None
-
-    @staticmethod
-    def _norm_phone(s: str) -> str:
-        return re.sub(r"[^0-9]", "", str(s or ""))
+    def post(self, request, *args, **kwargs):
+        if "apply" in request.POST:
+            return self.apply_preview()
+        return super().post(request, *args, **kwargs)
 
     def form_valid(self, form):
-        raw = form.cleaned_data["data"] or ""
-        lines = [ln for ln in raw.splitlines() if ln.strip()]
-
-        # remove header if present
-        if lines and ("flat" in lines[0].lower() and "owner" in lines[0].lower()):
-            lines = lines[1:]
-
-        # parse rows (comma or tab)
-        rows = []
-        for ln in lines:
-            parts = [p.strip() for p in re.split(r"[,\t]", ln) if p.strip()]
-            if len(parts) < 2:
-                continue
-            flat_no, name = parts[0], parts[1]
-            phone = parts[2] if len(parts) > 2 else ""
-            rows.append((flat_no, name, phone))
-
+        rows = parse_owner_rows(form.cleaned_data["data"])
         start_date = form.cleaned_data.get("start_date") or timezone.localdate()
         vacate_missing = bool(form.cleaned_data.get("vacate_missing"))
         dry_run = bool(form.cleaned_data.get("dry_run"))
 
-        # map all flats
-        flats = {(f.unit.upper(), int(f.floor)): f for f in Flat.objects.all()}
-        touched = set()
-
-        counters = dict(
-            owners_created=0, owners_updated=0,
-            owns_created=0, owns_ended=0,
-            status_changed=0, skipped=0
+        snapshot = load_snapshot(OWNERS, rows, all_flats=vacate_missing)
+        changes = plan_changes(OWNERS, rows, snapshot, start_date, vacate_missing=vacate_missing)
+        if not dry_run:
+            return self._apply(changes)
+
+        token = uuid.uuid4().hex
+        filecache.put(self.cache_namespace, token, json.dumps(changes, separators=(",", ":")).encode())
+        self.request.session[self.session_key] = token
+        c = summarize_changes(OWNERS, changes)
+        messages.info(
+            self.request,
+            f"Preview — would create owners: {c['owners_created']}, update owners: {c['owners_updated']}, "
+            f"create ownerships: {c['owns_created']}, end ownerships: {c['owns_ended']}, "
+            f"status changes: {c['status_changed']}, skipped: {c['skipped']}."
         )
-        would = counters.copy()
-
-        def tally(dst, **kw):
-            for k, v in kw.items():
-                if v:
-                    dst[k] += 1
-
-        @transaction.atomic
-        def _apply():
-            nonlocal counters, would
-            for flat_no, owner_name, phone in rows:
-                parsed = self._clean_flat_code(flat_no)
-                if not parsed or not owner_name:
-                    tally(would if dry_run else counters, skipped=True)
-                    continue
-
-                unit, fl = parsed
-                touched.add((unit, fl))
-                flat = flats.get((unit, fl))
-                if not flat:
-                    tally(would if dry_run else counters, skipped=True)
-                    continue
-
-                phone_norm = self._norm_phone(phone)
-
-                # upsert owner
-                owner = None
-                qs = Owner.objects.filter(name__iexact=owner_name)
-                if phone_norm:
-                    owner = qs.filter(phone__icontains=phone_norm).first()
-                if not owner:
-                    owner = qs.first()
-
-                if not owner:
-                    if dry_run:
-                        tally(would, owners_created=True)
-                    else:
-                        owner = Owner.objects.create(name=owner_name, phone=phone_norm)
-                        tally(counters, owners_created=True)
-                else:
-                    if phone_norm and owner.phone != phone_norm:
-                        if dry_run:
-                            tally(would, owners_updated=True)
-                        else:
-                            owner.phone = phone_norm
-                            owner.save(update_fields=["phone"])
-                            tally(counters, owners_updated=True)
-
-                # end existing active ownership if owner differs
-                current = Ownership.objects.filter(flat=flat, end_date__isnull=True).order_by("-start_date").first()
-
-                if current and current.owner_id != owner.id:
-                    if dry_run:
-                        tally(would, owns_ended=True)
-                        current = None
-                    else:
-                        current.end_date = start_date
-                        current.save(update_fields=["end_date"])
-                        tally(counters, owns_ended=True)
-                        current = None
-
-                if current is None:
-                    if dry_run:
-                        tally(would, owns_created=True)
-                    else:
-                        Ownership.objects.create(flat=flat, owner=owner, start_date=start_date)
-                        tally(counters, owns_created=True)
-
-                # set status to Owner-occupied
-                if flat.status_hint != Flat.OWNER_OCCUPIED:
-                    if dry_run:
-                        tally(would, status_changed=True)
-                    else:
-                        flat.status_hint = Flat.OWNER_OCCUPIED
-                        flat.save(update_fields=["status_hint"])
-                        tally(counters, status_changed=True)
-
-            # optionally vacate non-touched
-            if vacate_missing:
-                for (u, f), flat in flats.items():
-                    if (u, f) in touched:
-                        continue
-                    curr = Ownership.objects.filter(flat=flat, end_date__isnull=True).order_by("-start_date").first()
-                    if dry_run:
-                        if curr:
-                            tally(would, owns_ended=True)
-                        if flat.status_hint != Flat.VACANT:
-                            tally(would, status_changed=True)
-                    else:
-                        if curr:
-                            curr.end_date = start_date
-                            curr.save(update_fields=["end_date"])
-                            tally(counters, owns_ended=True)
-                        if flat.status_hint != Flat.VACANT:
-                            flat.status_hint = Flat.VACANT
-                            flat.save(update_fields=["status_hint"])
-                            tally(counters, status_changed=True)
-
-            if dry_run:
-                # rollback silently
-                raise transaction.TransactionManagementError("dry-run-rollback")
-
+        return self.render_to_response(self.get_context_data(
+            form=form,
+            changes=changes[:self.preview_limit],
+            change_count=len(changes),
+            token=token,
+        ))
+
+    def apply_preview(self):
+        token = self.request.session.pop(self.session_key, None)
+        changes = None
+        if isinstance(token, str):
+            path = filecache.get(self.cache_namespace, token)
+            if path is not None and token == self.request.POST.get("apply"):
+                try:
+                    with open(path, "rb") as fh:
+                        changes = json.load(fh)
+                except FileNotFoundError:
+                    pass  # evicted meanwhile
+            filecache.delete(self.cache_namespace, token)
+        if changes is None:
+            messages.error(self.request, "That preview has expired. Run the preview again.")
+            return redirect(self.get_success_url())
+        return self._apply(changes)
+
+    def _apply(self, changes):
         try:
-            _apply()
-        except transaction.TransactionManagementError:
-            pass
+            c = apply_changes(OWNERS, changes)
+        except StaleChangeSet as e:
+            messages.error(self.request, f"Nothing applied: {e} Run the preview again.")
+            return redirect(self.get_success_url())
+        messages.success(
+            self.request,
+            f"Applied — owners created: {c['owners_created']}, owners updated: {c['owners_updated']}, "
+            f"ownerships created: {c['owns_created']}, ownerships ended: {c['owns_ended']}, "
+            f"status changes: {c['status_changed']}, skipped: {c['skipped']}."
+        )
+        return redirect(self.get_success_url())
+
+
+# ───────────────────────── Bulk lessees upload tool ─────────────────────────
+class BulkLesseesView(FormView):
+    """
+    Upload a CSV/TSV of lessees and tenancies:
+        Flat no, Lessee, Cell, Start date
+        A-01, John Tenant, 01711123456, 2025-01-01
+    The file is streamed and imported in chunks (one transaction each), so
+    large files never sit in memory or in one long transaction.
+    """
+    template_name = "core/bulk_lessees.html"
+    form_class = BulkLesseesForm
+    chunk_rows = 1000
+    error_limit = 200  # per-row errors rendered on the page
+
+    def form_valid(self, form):
+        start_date = form.cleaned_data.get("start_date") or timezone.localdate()
+        dry_run = bool(form.cleaned_data.get("dry_run"))
+
+        progress, errors, last = [], [], None
+        for step in import_tenancies(form.cleaned_data["file"], start_date, self.chunk_rows, dry_run=dry_run):
+            progress.append({"rows": step["rows"], **step["counters"]})
+            if len(errors) < self.error_limit:
+                errors.extend(step["errors"][:self.error_limit - len(errors)])
+            last = step
+        c = last["counters"] if last else summarize_changes(LESSEES, [])
 
         msg = (
-            f"Preview — would create owners: {would['owners_created']}, update owners: {would['owners_updated']}, "
-            f"create ownerships: {would['owns_created']}, end ownerships: {would['owns_ended']}, "
-            f"status changes: {would['status_changed']}, skipped: {would['skipped']}."
-            if dry_run else
-            f"Applied — owners created: {counters['owners_created']}, owners updated: {counters['owners_updated']}, "
-            f"ownerships created: {counters['owns_created']}, ownerships ended: {counters['owns_ended']}, "
-            f"status changes: {counters['status_changed']}, skipped: {counters['skipped']}."
+            f"lessees created: {c['lessees_created']}, lessees updated: {c['lessees_updated']}, "
+            f"tenancies created: {c['tenancies_created']}, tenancies ended: {c['tenancies_ended']}, "
+            f"status changes: {c['status_changed']}, rows with errors: {c.get('errors', 0)}."
         )
-        (messages.info if dry_run else messages.success)(self.request, msg)
-        return super().form_valid(form)
+        if dry_run:
+            messages.info(self.request, f"Preview (each chunk checked against current data) — {msg}")
+        else:
+            messages.success(self.request, f"Imported {last['rows'] if last else 0} rows — {msg}")
+        return self.render_to_response(self.get_context_data(
+            form=form, progress=progress, errors=errors, error_count=c.get("errors", 0),
+        ))
 
 
 # ───────────────────────── Sync flat statuses ─────────────────────────
 class SyncStatusView(View):
     template_name = "core/sync_status.html"
+    batch_size = 5000
 
-    def get(self, request):
+    def _context(self, **extra):
         ctx = {
             "flat_count": Flat.objects.count(),
             "active_owners": Ownership.objects.filter(end_date__isnull=True).count(),
             "active_tenants": Tenancy.objects.filter(end_date__isnull=True).count(),
         }
-        return render(request, self.template_name, ctx)
+        ctx.update(extra)
+        return ctx
+
+    def get(self, request):
+        return render(request, self.template_name, self._context())
 
     def post(self, request):
-        changed = 0
-        for fl in Flat.objects.all():
-            has_owner = Ownership.objects.filter(flat=fl, end_date__isnull=True).exists()
-            has_tenant = Tenancy.objects.filter(flat=fl, end_date__isnull=True).exists()
-            target = Flat.VACANT
-            if has_tenant:
-                target = Flat.RENTED
-            elif has_owner:
-                target = Flat.OWNER_OCCUPIED
-            if fl.status_hint != target:
-                fl.status_hint = target
-                fl.save(update_fields=["status_hint"])
-                changed += 1
-        messages.success(request, f"Sync complete. Status updated on {changed} flats.")
+        dry_run = bool(request.POST.get("dry_run"))
+        changes, diff = sync_flat_status(dry_run=dry_run, batch_size=self.batch_size)
+        labels = dict(Flat.STATUS_CHOICES)
+        summary = ", ".join(f"{labels[s]}: {n}" for s, n in changes.items())
+
+        if dry_run:
+            messages.info(request, f"Preview — {sum(changes.values())} flats would change ({summary}).")
+            rows = [{"flat_id": pk, "flat": code, "old": labels.get(old, old), "new": labels.get(new, new)}
+                    for pk, code, old, new in diff]
+            return render(request, self.template_name, self._context(diff=rows))
+
+        messages.success(request, f"Sync complete. Status updated on {sum(changes.values())} flats ({summary}).")
         return redirect(reverse_lazy("sync_status"))
 
 
+# ───────────────────────── Duplicate people ─────────────────────────
+class DuplicatesView(View):
+    """
+    Likely duplicate owners/lessees (core.dedup), one card per cluster; the
+    reviewer picks the record to keep and the ones to fold into it.
+    """
+    template_name = "core/duplicates.html"
+    kinds = {"owners": OWNERS, "lessees": LESSEES}
+    max_clusters = 200  # rendered on the page
+
+    def _kind(self, request):
+        name = request.GET.get("kind") or request.POST.get("kind")
+        return name if name in self.kinds else "owners"
+
+    def get(self, request):
+        kind = self._kind(request)
+        clusters = dedup.find_clusters(self.kinds[kind])
+        return render(request, self.template_name, {
+            "kind": kind,
+            "clusters": clusters[:self.max_clusters],
+            "cluster_count": len(clusters),
+        })
+
+    def post(self, request):
+        kind = self._kind(request)
+        keep = request.POST.get("keep") or ""
+        merge_ids = [pk for pk in request.POST.getlist("merge") if pk.isdigit() and pk != keep]
+        if not keep.isdigit() or not merge_ids:
+            messages.error(request, "Pick the record to keep and at least one record to merge into it.")
+        else:
+            result = dedup.merge(self.kinds[kind], int(keep), merge_ids)
+            moved = ", ".join(f"{name}: {n}" for name, n in result["repointed"].items()) or "nothing to move"
+            messages.success(request, f"Merged {result['merged']} record(s) into #{keep} ({moved}).")
+        return redirect(f"{reverse_lazy('duplicates')}?kind={kind}")
+
+
+# ───────────────────────── Search ─────────────────────────
+class SearchView(View):
+    """
+    Search across owners, lessees, vehicles, providers and flats (core.search),
+    best match first. `type` narrows it to some kinds (comma separated);
+    `limit` caps the page (default 20, max 100) and `cursor` is the opaque
+    `next` of the previous page. The same results as JSON at search/api.
+    """
+    template_name = "core/search.html"
+    limit, max_limit = 20, 100
+    as_json = False
+
+    def get(self, request):
+        q = (request.GET.get("q") or "").strip()
+        kinds = [k for k in (request.GET.get("type") or "").split(",") if k in search.KINDS]
+        try:
+            limit = max(1, min(int(request.GET.get("limit") or self.limit), self.max_limit))
+        except ValueError:
+            limit = self.limit
+        try:
+            offset = signing.loads(request.GET.get("cursor") or "", salt="core.search")
+        except signing.BadSignature:
+            offset = 0
+
+        results, more = search.search(q, kinds=kinds, limit=limit, offset=offset)
+        next_cursor = signing.dumps(offset + limit, salt="core.search") if more else None
+        if self.as_json:
+            return JsonResponse({"results": results, "next": next_cursor})
+        return render(request, self.template_name, {
+            "q": q,
+            "type": ",".join(kinds),
+            "kinds": [(k, kind["label"]) for k, kind in search.KINDS.items()],
+            "results": results,
+            "next_cursor": next_cursor,
+            "offset": offset,
+        })
+
+
 # ───────────────────────── At-a-glance board ─────────────────────────
 class OverviewBoardView(TemplateView):
+    """
+    One row per flat: status, current occupant, parking spot and the vehicle
+    on its active assignment — a single scan of OccupancySnapshot. The table
+    is a versioned_cache fragment; `rows` is passed as a callable so a cache
+    hit never reads them.
+    """
     template_name = "core/overview.html"
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
+        ctx["rows"] = self.get_rows
+        return ctx
+
+    @staticmethod
+    def get_rows():
+        status_labels = dict(Flat.STATUS_CHOICES)
         rows = []
-        for f in Flat.objects.all().order_by("floor", "unit"):
+        for snap in OccupancySnapshot.objects.all():
             occ_label, occ_name = "—", "—"
-            if f.status_hint == f.RENTED and f.active_tenancy():
-                occ_label, occ_name = "Lessee", f.active_tenancy().lessee.name
-            elif f.status_hint == f.OWNER_OCCUPIED and f.active_ownership():
-                occ_label, occ_name = "Owner", f.active_ownership().owner.name
-
-            parking_code = "—"
-            vehicle = "—"
-            spot_id = None
-            if ParkingSpot:
-                try:
-                    spot = f.parking_spot
-                    parking_code = spot.code
-                    spot_id = spot.pk
-                    pa = spot.active_assignment()
-                    if pa:
-                        vehicle = pa.vehicle_no or "—"
-                except ParkingSpot.DoesNotExist:
-                    pass
+            if snap.status == Flat.RENTED and snap.lessee_name:
+                occ_label, occ_name = "Lessee", snap.lessee_name
+            elif snap.status == Flat.OWNER_OCCUPIED and snap.owner_name:
+                occ_label, occ_name = "Owner", snap.owner_name
 
             rows.append({
-                "flat": f"{f.unit}-{f.floor:02d}",
-                "status": f.get_status_hint_display(),
+                "flat": snap.code,
+                "status": status_labels.get(snap.status, snap.status),
                 "occ_label": occ_label,
                 "occ_name": occ_name,
-                "parking_code": parking_code,
-                "vehicle": vehicle,
-                "flat_id": f.pk,
-                "spot_id": spot_id,
+                "parking_code": snap.spot_code or "—",
+                "vehicle": snap.vehicle_plate or "—",
+                "flat_id": snap.flat_id,
+                "spot_id": snap.spot_pk,
             })
-        ctx["rows"] = rows
-        return ctx
+        return rows
+
+
+# ───────────────────────── Cache stats ─────────────────────────
+class CacheStatsView(View):
+    """Fragment cache hit/miss counters (of this worker) and current data versions, as JSON."""
+
+    def get(self, request):
+        return JsonResponse({"versions": versions(), "fragments": stats()})
+
+
+# ───────────────────────── Media (core.media) ─────────────────────────
+class MediaView(View):
+    """
+    Anything under MEDIA_ROOT. Blobs (core.storage) never change under their
+    name: their content hash is the ETag and browsers may keep them for good.
+    Other files (derivatives, older uploads) are revalidated.
+    """
+
+    def get(self, request, name):
+        try:
+            path = safe_join(settings.MEDIA_ROOT, name)
+            # the name as stored, so "blobs/./.tmp/x" or "blobs//.tmp/x" can't slip past the check below
+            name = os.path.relpath(path, os.path.abspath(settings.MEDIA_ROOT)).replace(os.sep, "/")
+            if (name + "/").startswith(f"{BLOB_DIR}/.tmp/"):
+                raise Http404  # uploads being written
+            etag = documents.etag(name)
+            return media.serve(
+                request, path, etag=etag,
+                cache_control="private, max-age=31536000, immutable" if etag else "private, no-cache",
+            )
+        except (SuspiciousFileOperation, FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            raise Http404
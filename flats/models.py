@@ -1,4 +1,52 @@
 ﻿from django.db import models
+from django.db.models.functions import Cast, Concat
+
+
+def flat_code_expr(prefix=""):
+    """
+    SQL for a flat's code ("A-07", like str(flat)), e.g. flat_code_expr("flat__")
+    from a model with a `flat` FK. NULL when there is no flat.
+    """
+    unit, floor = f"{prefix}unit", f"{prefix}floor"
+    floor_txt = Cast(floor, models.CharField())
+    padded = models.Case(
+        models.When(**{f"{floor}__lt": 10}, then=Concat(models.Value("0"), floor_txt)),
+        default=floor_txt,
+    )
+    return models.Case(
+        models.When(**{f"{unit}__isnull": False}, then=Concat(unit, models.Value("-"), padded)),
+        output_field=models.CharField(),
+    )
+
+
+class FlatQuerySet(models.QuerySet):
+    def with_occupancy(self):
+        """
+        Prefetch the active Ownership/Tenancy (with owner/lessee) for every flat,
+        so active_ownership(), current_owner, occupant_label etc. don't query per row.
+        """
+        from people.models import Ownership, Tenancy
+        return self.prefetch_related(
+            models.Prefetch(
+                "ownerships",
+                queryset=Ownership.objects.filter(end_date__isnull=True).select_related("owner").order_by("-start_date"),
+                to_attr="_active_ownerships",
+            ),
+            models.Prefetch(
+                "tenancies",
+                queryset=Tenancy.objects.filter(end_date__isnull=True).select_related("lessee").order_by("-start_date"),
+                to_attr="_active_tenancies",
+            ),
+        )
+
+    def held_by(self, owner_id=None, lessee_id=None):
+        """Flats the given owner (or lessee) currently holds through an active ownership (or tenancy)."""
+        if owner_id:
+            return self.filter(ownerships__owner_id=owner_id, ownerships__end_date__isnull=True)
+        if lessee_id:
+            return self.filter(tenancies__lessee_id=lessee_id, tenancies__end_date__isnull=True)
+        return self.none()
+
 
 class Flat(models.Model):
     VACANT = 'vacant'
@@ -13,6 +61,9 @@ class Flat(models.Model):
     unit = models.CharField(max_length=1)  # A–H
     remarks = models.CharField(max_length=255, blank=True)
     status_hint = models.CharField(max_length=10, choices=STATUS_CHOICES, default=VACANT)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = FlatQuerySet.as_manager()
 
     class Meta:
         unique_together = ('floor', 'unit')
@@ -22,10 +73,14 @@ class Flat(models.Model):
         return f"{self.unit}-{self.floor:02d}"
 
     def active_ownership(self):
+        if hasattr(self, "_active_ownerships"):  # Flat.objects.with_occupancy()
+            return self._active_ownerships[0] if self._active_ownerships else None
         from people.models import Ownership
         return Ownership.objects.filter(flat=self, end_date__isnull=True).order_by('-start_date').first()
 
     def active_tenancy(self):
+        if hasattr(self, "_active_tenancies"):  # Flat.objects.with_occupancy()
+            return self._active_tenancies[0] if self._active_tenancies else None
         from people.models import Tenancy
         return Tenancy.objects.filter(flat=self, end_date__isnull=True).order_by('-start_date').first()
 
@@ -41,8 +96,12 @@ class Flat(models.Model):
 
     @property
     def occupant_label(self):
-        if self.status_hint == self.OWNER_OCCUPIED and self.current_owner:
-            return f"Owner: {self.current_owner.name}"
-        if self.status_hint == self.RENTED and self.current_lessee:
-            return f"Lessee: {self.current_lessee.name}"
+        if self.status_hint == self.OWNER_OCCUPIED:
+            owner = self.current_owner
+            if owner:
+                return f"Owner: {owner.name}"
+        if self.status_hint == self.RENTED:
+            lessee = self.current_lessee
+            if lessee:
+                return f"Lessee: {lessee.name}"
         return "—"
@@ -3,24 +3,33 @@ from django.urls import reverse_lazy, reverse
 from django.views.generic import ListView, CreateView, UpdateView, TemplateView, View
 from django.shortcuts import redirect, get_object_or_404
 from django.contrib import messages
-from django.db.models import Count, Q
+from django.db.models import Count
 from django.utils import timezone
 from django.db import transaction
+from django.utils.decorators import method_decorator
 
 from .models import Flat
 from .forms import FlatForm
 from people.forms import OwnershipForm, TenancyForm
+from people import directory as people_directory
 from people.models import Ownership, Tenancy
 
 from parking.models import ParkingSpot, ParkingAssignment
+from core import search
+from core.datacache import cached
+from core.conditional import conditional_on
+from core.pagination import KeysetPaginationMixin
 
-class FlatListView(ListView):
+@method_decorator(conditional_on('flats', 'people'), name='dispatch')
+class FlatListView(KeysetPaginationMixin, ListView):
     model = Flat
     template_name = 'flats/flat_list.html'
     paginate_by = 40
+    keyset = ('floor', 'unit')
+    count_groups = ('flats',)
 
     def get_queryset(self):
-        qs = Flat.objects.all().order_by('floor', 'unit')
+        qs = Flat.objects.with_occupancy()
 
         q = (self.request.GET.get('q') or '').strip()
         status = (self.request.GET.get('status') or '').strip()
@@ -38,7 +47,7 @@ class FlatListView(ListView):
             elif len(s) == 1 and s in 'ABCDEFGH':
                 qs = qs.filter(unit__iexact=s)
             else:
-                qs = qs.filter(Q(remarks__icontains=q))
+                qs = search.filter_queryset(qs, "flat", q)
 
         if status in dict(Flat.STATUS_CHOICES):
             qs = qs.filter(status_hint=status)
@@ -52,11 +61,11 @@ class FlatListView(ListView):
         ctx['q'] = (self.request.GET.get('q') or '').strip()
         ctx['status'] = (self.request.GET.get('status') or '').strip()
         ctx['floor'] = (self.request.GET.get('floor') or '').strip()
-        counts = dict(
+        counts = cached('flats:counts', ('flats',), lambda: dict(
             Flat.objects.values_list('status_hint')
             .annotate(c=Count('id'))
             .values_list('status_hint', 'c')
-        )
+        ))
         ctx['cnt_owner'] = counts.get('owner', 0)
         ctx['cnt_rented'] = counts.get('rented', 0)
         ctx['cnt_vacant'] = counts.get('vacant', 0)
@@ -99,6 +108,7 @@ class FlatOccupancyView(TemplateView):
         ctx["active_lessee"] = flat.active_tenancy()
         ctx["ownership_form"] = OwnershipForm()
         ctx["tenancy_form"] = TenancyForm()
+        ctx["people_directory_url"] = people_directory.url()
         return ctx
 
 class AssignOwnerView(View):
@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from django.db import transaction
+from django.db.models import Prefetch
 from flats.models import Flat
 from parking.models import ParkingSpot, ParkingAssignment
 
@@ -20,27 +21,40 @@ class Command(BaseCommand):
         @transaction.atomic
         def run():
             nonlocal changed, total
-            for f in Flat.objects.all().order_by("floor", "unit"):
+            flats = (
+                Flat.objects.with_occupancy()
+                .select_related("parking_spot")
+                .prefetch_related(Prefetch(
+                    "parking_spot__assignments",
+                    queryset=ParkingAssignment.objects.filter(end_date__isnull=True),
+                    to_attr="active_assignments",
+                ))
+                .order_by("floor", "unit")
+            )
+            for f in flats:
                 total += 1
-                start = None
-                if f.status_hint == f.RENTED and f.active_tenancy():
-                    start = f.active_tenancy().start_date
-                elif f.status_hint == f.OWNER_OCCUPIED and f.active_ownership():
-                    start = f.active_ownership().start_date
-                if not start:
+                occ = None
+                if f.status_hint == f.RENTED:
+                    occ = f.active_tenancy()
+                elif f.status_hint == f.OWNER_OCCUPIED:
+                    occ = f.active_ownership()
+                if not occ:
                     continue
-                spot, _ = ParkingSpot.objects.get_or_create(flat=f)
-                cur = spot.active_assignment()
+                start = occ.start_date
+                try:
+                    spot = f.parking_spot
+                    cur = spot.active_assignments[0] if spot.active_assignments else None
+                except ParkingSpot.DoesNotExist:
+                    spot, cur = ParkingSpot.objects.create(flat=f), None
                 if cur and cur.end_date is None and cur.start_date != start:
                     cur.end_date = start
                     if not dry:
                         cur.save(update_fields=["end_date"])
                     changed += 1
-                if not spot.active_assignment():
+                    cur = None
+                if cur is None:
                     if not dry:
-                        ParkingAssignment.objects.create(
-                            spot=spot, start_date=start, vehicle_no="", note="Auto-assign"
-                        )
+                        ParkingAssignment.objects.create(spot=spot, start_date=start, remarks="Auto-assign")
                     changed += 1
             if dry:
                 raise transaction.TransactionManagementError("dry run")
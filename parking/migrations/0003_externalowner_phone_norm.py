@@ -0,0 +1,51 @@
+# Generated by Django 5.2.7 on 2026-10-17 01:48
+
+import re
+
+from django.db import migrations, models
+
+
+# Frozen copies of core.phones.normalise_phone() and of the batched backfill
+# as they were when this migration was written; later edits to the app code
+# must not change what it does.
+def normalise_phone(value):
+    digits = re.sub(r"\D", "", str(value or ""))
+    if digits.startswith("00"):
+        digits = digits[2:]
+    if digits.startswith("880") and len(digits) == 13:
+        digits = "0" + digits[3:]
+    elif len(digits) == 10 and digits.startswith("1"):
+        digits = "0" + digits
+    return digits
+
+
+def backfill(model, batch_size=1000):
+    last = 0
+    while True:
+        rows = list(model.objects.filter(pk__gt=last).order_by("pk").only("pk", "phone")[:batch_size])
+        if not rows:
+            return
+        for row in rows:
+            row.phone_norm = normalise_phone(row.phone)
+        model.objects.bulk_update(rows, ["phone_norm"], batch_size=100)
+        last = rows[-1].pk
+
+
+def fill_phone_norm(apps, schema_editor):
+    backfill(apps.get_model("parking", "ExternalOwner"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0002_parkingassignment_driver_name_alter_parkingspot_code'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='externalowner',
+            name='phone_norm',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=40),
+        ),
+        migrations.RunPython(fill_phone_norm, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,12 @@
 ﻿from django.db import models
 from django.core.exceptions import ValidationError
 
-from flats.models import Flat
-from people.models import Owner, Lessee
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from core.phones import normalise_phone
+from flats.models import Flat, flat_code_expr
+from people.models import Owner, Lessee, Ownership, Tenancy
 
 
 class ExternalOwner(models.Model):
@@ -16,12 +20,17 @@ class ExternalOwner(models.Model):
     kind = models.CharField(max_length=20, choices=KIND_CHOICES)
     name = models.CharField(max_length=120)
     phone = models.CharField(max_length=40, blank=True)
+    phone_norm = models.CharField(max_length=40, blank=True, db_index=True, editable=False)
     company = models.CharField(max_length=120, blank=True)
 
     def __str__(self):
         label = dict(self.KIND_CHOICES).get(self.kind, self.kind.title())
         return f"{self.name} ({label}{', ' + self.company if self.company else ''})"
 
+    def save(self, *args, **kwargs):
+        self.phone_norm = normalise_phone(self.phone)
+        super().save(*args, **kwargs)
+
 
 class ParkingSpot(models.Model):
     code = models.CharField(max_length=10, unique=True, help_text="e.g., E-10")
@@ -75,6 +84,31 @@ class ParkingSpot(models.Model):
         return a.driver_name if a else ""
 
 
+class VehicleQuerySet(models.QuerySet):
+    def with_locations(self):
+        """
+        Annotate the flat code (owner's active ownership, else lessee's active
+        tenancy, else the manual flat) and the spot code and start date of the
+        active parking assignment, so a list of vehicles doesn't query per row
+        for them (flat_code reads the annotation; templates read active_spot_code
+        and active_since directly).
+        """
+        def first_held(holdings):
+            held = holdings.filter(end_date__isnull=True).order_by("flat__floor", "flat__unit")
+            return Subquery(held.annotate(code=flat_code_expr("flat__")).values("code")[:1])
+
+        active = ParkingAssignment.objects.filter(vehicle=OuterRef("pk"), end_date__isnull=True)
+        return self.annotate(
+            active_flat_code=Coalesce(
+                first_held(Ownership.objects.filter(owner=OuterRef("owner_id"))),
+                first_held(Tenancy.objects.filter(lessee=OuterRef("lessee_id"))),
+                flat_code_expr("flat__"),
+            ),
+            active_spot_code=Subquery(active.values("spot__code")[:1]),
+            active_since=Subquery(active.values("start_date")[:1]),
+        )
+
+
 class Vehicle(models.Model):
     CAR = "CAR"; BIKE = "BIKE"; MICROBUS = "MICROBUS"; TRUCK = "TRUCK"; OTHER = "OTHER"
     V_TYPES = [(CAR, "Car"), (BIKE, "Bike"), (MICROBUS, "Microbus"), (TRUCK, "Truck"), (OTHER, "Other")]
@@ -109,6 +143,8 @@ class Vehicle(models.Model):
     notes = models.CharField(max_length=255, blank=True, default="")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = VehicleQuerySet.as_manager()
+
     class Meta:
         ordering = ["plate_no"]
 
@@ -143,15 +179,15 @@ class Vehicle(models.Model):
 
     @property
     def flat_code(self):
+        if hasattr(self, "active_flat_code"):  # Vehicle.objects.with_locations()
+            return self.active_flat_code
         try:
             if self.owner_id:
-                from people.models import Ownership
-                o = Ownership.objects.filter(owner_id=self.owner_id, end_date__isnull=True).select_related("flat").first()
-                if o: return f"{o.flat.unit}-{o.flat.floor:02d}"
+                fl = Flat.objects.held_by(owner_id=self.owner_id).first()
+                if fl: return f"{fl.unit}-{fl.floor:02d}"
             if self.lessee_id:
-                from people.models import Tenancy
-                t = Tenancy.objects.filter(lessee_id=self.lessee_id, end_date__isnull=True).select_related("flat").first()
-                if t: return f"{t.flat.unit}-{t.flat.floor:02d}"
+                fl = Flat.objects.held_by(lessee_id=self.lessee_id).first()
+                if fl: return f"{fl.unit}-{fl.floor:02d}"
         except Exception:
             pass
         if self.flat_id and self.flat: return f"{self.flat.unit}-{self.flat.floor:02d}"
@@ -1,24 +1,30 @@
-from urllib.parse import urlencode
-
 from django.contrib import messages
 from django.db import transaction
-from django.db.models import Q, Exists, OuterRef
+from django.db.models import Exists, OuterRef, Subquery
 from django.shortcuts import redirect
 from django.urls import reverse_lazy
 from django.utils import timezone
+from django.utils.decorators import method_decorator
 from django.views import View
 from django.views.generic import ListView, CreateView, UpdateView, DetailView
 
-from flats.models import Flat
+from flats.models import Flat, flat_code_expr
+from core import search
+from core.datacache import bump, cached
+from core.conditional import conditional_on
+from core.snapshot import refresh_flats
+from core.pagination import KeysetPaginationMixin
 from .models import Vehicle, ParkingSpot, ParkingAssignment
 from .forms import VehicleForm, ParkingSpotForm
 
 
 # ───────── Vehicles ─────────
-class VehicleListView(ListView):
+class VehicleListView(KeysetPaginationMixin, ListView):
     model = Vehicle
     template_name = "parking/vehicle_list.html"
     paginate_by = 30  # override with ?per_page=...
+    keyset = ("plate_no",)
+    count_groups = ("parking", "people", "flats")  # ?q= matches owner, lessee and flat text
 
     def get_paginate_by(self, queryset):
         per = (self.request.GET.get("per_page") or "").strip().lower()
@@ -31,26 +37,17 @@ class VehicleListView(ListView):
             return self.paginate_by
 
     def get_queryset(self):
-        qs = Vehicle.objects.select_related("owner", "lessee", "external_owner").order_by("plate_no")
+        qs = Vehicle.objects.with_locations().select_related("owner", "lessee", "external_owner").order_by("plate_no")
         q = (self.request.GET.get("q") or "").strip()
         kind = (self.request.GET.get("owner_type") or "").strip()
         if q:
-            qs = qs.filter(
-                Q(plate_no__icontains=q) |
-                Q(owner__name__icontains=q) |
-                Q(lessee__name__icontains=q) |
-                Q(external_owner__name__icontains=q)
-            )
+            qs = search.filter_queryset(qs, "vehicle", q)
         if kind and kind in dict(Vehicle.OWNER_TYPES):
             qs = qs.filter(owner_type=kind)
         return qs
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-        params = self.request.GET.copy()
-        params.pop("page", None); params.pop("per_page", None)
-        base_qs = urlencode(params, doseq=True)
-        ctx["base_qs"] = ("&" + base_qs) if base_qs else ""
         ctx["per_page"] = (self.request.GET.get("per_page") or str(self.paginate_by)).lower()
         ctx["per_page_options"] = ["25", "50", "100", "200", "all"]
         ctx["q"] = (self.request.GET.get("q") or "").strip()
@@ -112,10 +109,13 @@ class VehicleUpdateView(UpdateView):
 
 
 # ───────── Spots ─────────
-class SpotListView(ListView):
+@method_decorator(conditional_on("flats", "parking"), name="dispatch")
+class SpotListView(KeysetPaginationMixin, ListView):
     model = ParkingSpot
     template_name = "parking/spot_list.html"
     paginate_by = None  # show ALL by default
+    keyset = ("code",)
+    count_groups = ("parking", "flats")  # unit/floor filters go through the spot's flat
 
     def get_paginate_by(self, queryset):
         per = (self.request.GET.get("per_page") or "").strip().lower()
@@ -153,11 +153,11 @@ class SpotListView(ListView):
 
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
-        params = self.request.GET.copy()
-        params.pop("page", None); params.pop("per_page", None)
-        base_qs = urlencode(params, doseq=True)
-        ctx["base_qs"] = ("&" + base_qs) if base_qs else ""
-        total_flats = Flat.objects.count()
+        if not ctx["is_paginated"] and ctx["page_obj"] is None:
+            # the full list: cached per data version and filter set, so a hit runs no queries
+            rows = cached("parking:spots", ("flats", "parking"), lambda: list(self.object_list), self._filter_key())
+            ctx["object_list"] = rows
+        total_flats = cached("flats:total", ("flats",), Flat.objects.count)
         ctx["total_flats"] = total_flats
         ctx["per_page"] = (self.request.GET.get("per_page") or "all").lower()
         opts = ["25", "50", "100"]
@@ -241,25 +241,46 @@ class SpotDetailView(DetailView):
 
 
 class SpotSeedAllView(View):
+    """
+    Give every flat a spot coded after it (A-01, ...); existing spots are renamed
+    to their flat's code when that code is free. Works in memory against one
+    read of flats+spots and one of the taken codes, then renames in one UPDATE
+    and creates in bulk.
+    """
     def post(self, request):
-        created = 0
+        flats = Flat.objects.select_related("parking_spot").order_by("floor", "unit")
+        # codes only ever get added here, so the bulk rename can't collide with itself
+        taken = set(ParkingSpot.objects.values_list("code", flat=True))
+        renamed, new_spots = [], []
         updated = 0
-        for flat in Flat.objects.all().order_by("floor", "unit"):
+        for flat in flats:
             code = f"{flat.unit}-{flat.floor:02d}"
             spot = getattr(flat, "parking_spot", None)
             if spot:
-                if spot.code != code and not ParkingSpot.objects.filter(code=code).exclude(pk=spot.pk).exists():
+                if spot.code != code and code not in taken:
                     spot.code = code
-                    spot.save(update_fields=["code"])
+                    renamed.append(spot)
+                    taken.add(code)
                 updated += 1
                 continue
             code_to_use = code
-            if ParkingSpot.objects.filter(code=code_to_use).exists():
+            if code_to_use in taken:
                 n = 2
-                while ParkingSpot.objects.filter(code=f"{code}-{n}").exists():
+                while f"{code}-{n}" in taken:
                     n += 1
                 code_to_use = f"{code}-{n}"
-            ParkingSpot.objects.create(code=code_to_use, level=1, is_reserved=True, flat=flat)
-            created += 1
+            new_spots.append(ParkingSpot(code=code_to_use, level=1, is_reserved=True, flat=flat))
+            taken.add(code_to_use)
+
+        with transaction.atomic():
+            if renamed:
+                # one UPDATE: each renamed spot takes its flat's code
+                flat_code = Flat.objects.filter(pk=OuterRef("flat_id")).annotate(code=flat_code_expr()).values("code")
+                ParkingSpot.objects.filter(pk__in=[s.pk for s in renamed]).update(code=Subquery(flat_code[:1]))
+            ParkingSpot.objects.bulk_create(new_spots, batch_size=500)
+            # bulk writes skip model signals
+            refresh_flats([s.flat_id for s in renamed] + [s.flat_id for s in new_spots])
+            bump("parking")
+        created = len(new_spots)
         messages.success(request, f"Parking spots synced from flats. Created {created}, updated {updated}.")
         return redirect("parking:spot_list")
@@ -0,0 +1,42 @@
+"""
+The people directory bundle: every owner and lessee with phone digits and flat
+code, as one compact JSON document the occupancy page loads once and filters
+locally.
+
+The bundle is built from the typeahead index (people.search_index), cached per
+people/flats data version, and served under its content hash so the URL itself
+can be cached forever; a data change gives the page a new URL.
+"""
+import hashlib
+import json
+
+from django.urls import reverse
+
+from core.datacache import cached
+
+from . import search_index
+
+GROUPS = ("people", "flats")
+
+
+def _build():
+    owners, owner_flats = search_index.owners.export()
+    lessees, lessee_flats = search_index.lessees.export()
+    body = json.dumps(
+        {
+            "fields": ["id", "name", "phone", "code"],
+            "owners": owners, "owner_flats": owner_flats,
+            "lessees": lessees, "lessee_flats": lessee_flats,
+        },
+        separators=(",", ":"), ensure_ascii=False,
+    ).encode()
+    return {"digest": hashlib.sha256(body).hexdigest()[:20], "body": body}
+
+
+def bundle():
+    """{"digest": ..., "body": bytes} for the current data versions."""
+    return cached("people:directory", GROUPS, _build)
+
+
+def url():
+    return reverse("people:directory", args=[bundle()["digest"]])
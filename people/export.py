@@ -0,0 +1,104 @@
+"""
+Bulk profile export: every owner and/or lessee profile PDF in one ZIP.
+
+Specs are built in the calling process (a few queries per 500 people). PDFs
+already in core.filecache are read from disk; the rest are drawn by the
+server's shared pool of PROFILE_EXPORT_WORKERS processes, at most
+`workers * 2` at a time per export. The ZIP is written to a non-seekable sink
+and handed on chunk by chunk as each PDF completes, so neither the archive nor
+the PDFs pile up in memory. When the download is dropped, the response closes
+the stream and the PDFs it still had queued are cancelled.
+"""
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.db.models import Prefetch
+
+from core import procpool
+
+from . import profile_pdf
+
+BATCH_SIZE = 500
+POOL = "profile-export"
+
+
+def specs(kinds):
+    """Profile specs for every person of the given kinds, in name order."""
+    for kind in kinds:
+        conf = profile_pdf.KINDS[kind]
+        Holding = conf["model"]._meta.get_field(conf["holdings"]).related_model
+        holdings = Prefetch(conf["holdings"], queryset=Holding.objects.select_related("flat").order_by("-start_date"))
+        qs = conf["model"].objects.order_by("name", "pk").prefetch_related(holdings)
+        for obj in qs.iterator(chunk_size=BATCH_SIZE):
+            yield profile_pdf.build_spec(obj, getattr(obj, conf["holdings"]).all())
+
+
+def member_name(spec):
+    """'owners/E-10 ashikur-rahman-12.pdf'; the pk keeps namesakes apart."""
+    flat = spec["current_flat"] or "no-flat"
+    return f"{spec['kind']}/{flat} {profile_pdf.filename(spec)[:-4]}-{spec['pk']}.pdf"
+
+
+class _Sink:
+    """Write-only, non-seekable file for ZipFile that collects what was written."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+def _rendered(spec_iter, workers):
+    """Yield (spec, pdf bytes) as they become available: cache hits at once, the rest from the pool."""
+    pending = {}
+    pool = procpool.shared_pool(POOL, workers)
+    try:
+        for spec in spec_iter:
+            path = profile_pdf.cached_path(spec)
+            if path:
+                try:
+                    with open(path, "rb") as fh:
+                        yield spec, fh.read()
+                    continue
+                except OSError:
+                    pass  # evicted meanwhile; render it
+            pending[pool.submit(profile_pdf.render_and_store, spec)] = spec
+            while len(pending) >= workers * 2:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
+        for future in list(pending):
+            yield pending.pop(future), future.result()
+    except BrokenProcessPool:
+        procpool.discard(POOL, pool)
+        raise
+    finally:
+        for future in pending:
+            future.cancel()  # the download was dropped (or failed): drop what has not started
+
+
+def stream_zip(kinds, workers=None):
+    """Yield the bytes of a ZIP holding the profile PDFs of `kinds` ("owners", "lessees")."""
+    workers = workers or settings.PROFILE_EXPORT_WORKERS
+    sink = _Sink()
+    rendered = _rendered(specs(kinds), workers)
+    try:
+        # PDFs are already compressed; storing them keeps the export CPU-bound on rendering only
+        with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as zf:
+            for spec, data in rendered:
+                zf.writestr(member_name(spec), data)
+                yield sink.drain()
+        yield sink.drain()
+    finally:
+        rendered.close()
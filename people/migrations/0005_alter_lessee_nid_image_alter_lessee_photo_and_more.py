@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-17 01:58
+
+import core.storage
+import people.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('people', '0004_lessee_phone_norm_owner_phone_norm'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='lessee',
+            name='nid_image',
+            field=models.ImageField(blank=True, null=True, storage=core.storage.DocumentStorage(), upload_to=people.models.upload_to),
+        ),
+        migrations.AlterField(
+            model_name='lessee',
+            name='photo',
+            field=models.ImageField(blank=True, null=True, storage=core.storage.DocumentStorage(), upload_to=people.models.upload_to),
+        ),
+        migrations.AlterField(
+            model_name='owner',
+            name='nid_image',
+            field=models.ImageField(blank=True, null=True, storage=core.storage.DocumentStorage(), upload_to=people.models.upload_to),
+        ),
+        migrations.AlterField(
+            model_name='owner',
+            name='photo',
+            field=models.ImageField(blank=True, null=True, storage=core.storage.DocumentStorage(), upload_to=people.models.upload_to),
+        ),
+        migrations.AlterField(
+            model_name='tenancy',
+            name='agreement_file',
+            field=models.FileField(blank=True, null=True, storage=core.storage.DocumentStorage(), upload_to=people.models.upload_to),
+        ),
+    ]
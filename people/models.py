@@ -1,5 +1,7 @@
 ﻿from django.db import models
 from django.db.models import Q
+from core.phones import normalise_phone
+from core.storage import documents
 from flats.models import Flat
 
 
@@ -11,32 +13,45 @@ def upload_to(instance, filename):
 class Owner(models.Model):
     name = models.CharField(max_length=120)
     phone = models.CharField(max_length=40, blank=True)
+    phone_norm = models.CharField(max_length=40, blank=True, db_index=True, editable=False)
     email = models.EmailField(blank=True)
-    photo = models.ImageField(upload_to=upload_to, blank=True, null=True)
-    nid_image = models.ImageField(upload_to=upload_to, blank=True, null=True)
+    photo = models.ImageField(upload_to=upload_to, storage=documents, blank=True, null=True)
+    nid_image = models.ImageField(upload_to=upload_to, storage=documents, blank=True, null=True)
     address = models.CharField(max_length=255, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.phone_norm = normalise_phone(self.phone)
+        super().save(*args, **kwargs)
+
 
 class Lessee(models.Model):
     name = models.CharField(max_length=120)
     phone = models.CharField(max_length=40, blank=True)
+    phone_norm = models.CharField(max_length=40, blank=True, db_index=True, editable=False)
     email = models.EmailField(blank=True)
-    photo = models.ImageField(upload_to=upload_to, blank=True, null=True)
-    nid_image = models.ImageField(upload_to=upload_to, blank=True, null=True)
+    photo = models.ImageField(upload_to=upload_to, storage=documents, blank=True, null=True)
+    nid_image = models.ImageField(upload_to=upload_to, storage=documents, blank=True, null=True)
     address = models.CharField(max_length=255, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.phone_norm = normalise_phone(self.phone)
+        super().save(*args, **kwargs)
+
 
 class Ownership(models.Model):
     flat = models.ForeignKey(Flat, on_delete=models.CASCADE, related_name="ownerships")
     owner = models.ForeignKey(Owner, on_delete=models.CASCADE, related_name="ownerships")
     start_date = models.DateField()
     end_date = models.DateField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ['-start_date']
@@ -67,7 +82,8 @@ class Tenancy(models.Model):
     lessee = models.ForeignKey(Lessee, on_delete=models.CASCADE, related_name="tenancies")
     start_date = models.DateField()
     end_date = models.DateField(blank=True, null=True)
-    agreement_file = models.FileField(upload_to=upload_to, blank=True, null=True)
+    agreement_file = models.FileField(upload_to=upload_to, storage=documents, blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         ordering = ['-start_date']
@@ -0,0 +1,116 @@
+"""
+Owner/lessee profiles: who the person is, the flats they hold now (with the
+flat's parking spot and the other party: the lessee renting an owner's flat,
+the owner of a lessee's), their whole ownership/tenancy history and their
+vehicles with the spot each one is parked in.
+
+build() assembles all of it with one query per relation (the person, the
+history with flats and spots, the other parties, the vehicles, their active
+assignments), so a profile costs five queries however long the history is.
+The result is plain, JSON-ready data, cached per people/flats/parking data
+version: the page and the JSON endpoint share it, and a repeat visit is
+answered from the cache (or 304 by core.conditional) until something changes.
+"""
+from django.db.models import Prefetch
+from django.urls import reverse
+
+from core.datacache import cached
+from core.images import derivative_url
+from parking.models import Vehicle, ParkingAssignment
+
+from .models import Owner, Lessee, Ownership, Tenancy
+
+GROUPS = ("people", "flats", "parking")
+
+KINDS = {
+    "owner": {
+        "model": Owner, "holding": Ownership, "holdings": "ownerships", "label": "Owner",
+        # the other party on a held flat: its active tenancy's lessee
+        "other": ("flat__tenancies", Tenancy, "lessee", "Lessee"),
+        "edit": "people:owner_edit", "pdf": "people:owner_pdf", "page": "people:owner_profile",
+    },
+    "lessee": {
+        "model": Lessee, "holding": Tenancy, "holdings": "tenancies", "label": "Lessee",
+        "other": ("flat__ownerships", Ownership, "owner", "Owner"),
+        "edit": "people:lessee_edit", "pdf": "people:lessee_pdf", "page": "people:lessee_profile",
+    },
+}
+
+
+def _date(d):
+    return d.isoformat() if d else None
+
+
+def _queryset(kind):
+    spec = KINDS[kind]
+    other_rel, other_model, other_field, _ = spec["other"]
+    history = spec["holding"].objects.select_related("flat", "flat__parking_spot").order_by("-start_date", "-id")
+    history = history.prefetch_related(Prefetch(
+        other_rel,
+        queryset=other_model.objects.filter(end_date__isnull=True).select_related(other_field),
+        to_attr="active_others",
+    ))
+    vehicles = Vehicle.objects.order_by("plate_no").prefetch_related(Prefetch(
+        "assignments",
+        queryset=ParkingAssignment.objects.filter(end_date__isnull=True).select_related("spot"),
+        to_attr="active_assignments",
+    ))
+    return spec["model"].objects.prefetch_related(
+        Prefetch(spec["holdings"], queryset=history, to_attr="history"),
+        Prefetch("vehicles", queryset=vehicles, to_attr="vehicle_list"),
+    )
+
+
+def _build(kind, pk):
+    spec = KINDS[kind]
+    person = _queryset(kind).filter(pk=pk).first()
+    if person is None:
+        return None
+    _, _, other_field, other_label = spec["other"]  # other_field is also the other party's kind
+
+    current = []
+    for h in person.history:
+        if h.end_date is not None:
+            continue
+        spot = getattr(h.flat, "parking_spot", None)
+        others = [getattr(o, other_field) for o in h.flat.active_others]
+        current.append({
+            "flat_id": h.flat_id, "code": str(h.flat), "since": _date(h.start_date),
+            "parking_spot": spot.code if spot else None,
+            "others": [
+                {"id": o.pk, "name": o.name, "phone": o.phone, "url": reverse(KINDS[other_field]["page"], args=[o.pk])}
+                for o in others
+            ],
+        })
+
+    vehicles = []
+    for v in person.vehicle_list:
+        pa = v.active_assignments[0] if v.active_assignments else None
+        vehicles.append({
+            "id": v.pk, "plate_no": v.plate_no, "type": v.get_vehicle_type_display(),
+            "make": v.make, "model": v.model, "color": v.color, "is_active": v.is_active,
+            "spot": pa.spot.code if pa else None, "parked_since": _date(pa.start_date) if pa else None,
+            "url": reverse("parking:vehicle_edit", args=[v.pk]),
+        })
+
+    return {
+        "kind": kind, "label": spec["label"], "other_label": other_label, "id": person.pk,
+        "name": person.name, "phone": person.phone, "email": person.email, "address": person.address,
+        "photo": derivative_url(person.photo, "thumb"),
+        "links": {
+            "edit": reverse(spec["edit"], args=[pk]), "pdf": reverse(spec["pdf"], args=[pk]),
+            "json": reverse(f"{spec['page']}_json", args=[pk]),
+        },
+        "current_flats": current,
+        "history": [
+            {"flat_id": h.flat_id, "code": str(h.flat), "start_date": _date(h.start_date),
+             "end_date": _date(h.end_date), "active": h.end_date is None}
+            for h in person.history
+        ],
+        "vehicles": vehicles,
+    }
+
+
+def build(kind, pk):
+    """The profile of the `kind` ("owner"/"lessee") with this pk as plain data, or None if there is none."""
+    return cached("people:profile", GROUPS, lambda: _build(kind, pk), kind, pk)
@@ -0,0 +1,131 @@
+"""
+Owner/lessee profile PDFs: what goes on them, how they are drawn, and where
+rendered copies are kept.
+
+A profile is first reduced to a plain, picklable spec (build_spec) holding
+every field drawn plus the cache key derived from it, so the same spec can be
+rendered here or in a worker process (people.export). Rendered PDFs are kept
+in core.filecache under that key: any relevant change yields a new key, so
+nothing ever has to be invalidated.
+"""
+from django.utils import timezone
+from django.utils.text import slugify
+
+from core import filecache
+from core.images import derivative_path
+
+from .models import Owner, Lessee
+
+# Bump when the layout changes, so cached copies aren't reused.
+PROFILE_PDF_LAYOUT = 2
+
+KINDS = {
+    "owners": {
+        "model": Owner, "holdings": "ownerships", "title": "OWNER PROFILE",
+        "history_title": "Ownership history", "empty_text": "(no ownership records)",
+    },
+    "lessees": {
+        "model": Lessee, "holdings": "tenancies", "title": "LESSEE PROFILE",
+        "history_title": "Tenancy history", "empty_text": "(no tenancy records)",
+    },
+}
+KIND_OF_MODEL = {kind["model"]: name for name, kind in KINDS.items()}
+
+
+def _safe(txt) -> str:
+    """ReportLab-safe (latin-1) text to avoid Unicode crashes without a TTF."""
+    return (str(txt or "")).encode("latin-1", "replace").decode("latin-1")
+
+
+def _file_path(instance, attr_name: str):
+    """
+    Local path of the print-size derivative of an Image/FileField (core.images),
+    else of the upload itself; None when empty or not on local storage.
+    """
+    f = getattr(instance, attr_name, None)
+    if not f:
+        return None
+    try:
+        return derivative_path(f, "print")
+    except Exception:
+        return None
+
+
+def build_spec(obj, holdings):
+    """
+    Everything the profile of `obj` (an Owner or Lessee) shows, as plain data.
+    `holdings` are its Ownership/Tenancy rows, newest first, with flats loaded.
+    """
+    kind = KIND_OF_MODEL[type(obj)]
+    spec = {
+        "kind": kind,
+        "pk": obj.pk,
+        "name": obj.name, "phone": obj.phone, "email": obj.email, "address": obj.address,
+        "photo_path": _file_path(obj, "photo"),
+        "nid_path": _file_path(obj, "nid_image"),
+        "history": [f"{h.flat} | {h.start_date} → {h.end_date or 'present'}" for h in holdings],
+        "current_flat": next((str(h.flat) for h in holdings if h.end_date is None), ""),
+        # the last change to the person or their holdings: a stamp that only moves with the key
+        "updated": timezone.localtime(max([obj.updated_at, *(h.updated_at for h in holdings)])).strftime("%d-%b-%Y %H:%M"),
+    }
+    spec["key"] = filecache.key(
+        PROFILE_PDF_LAYOUT, kind, obj.pk, obj.name, obj.phone, obj.email, obj.address, spec["updated"],
+        filecache.file_digest(spec["photo_path"]), filecache.file_digest(spec["nid_path"]), spec["history"],
+    )
+    return spec
+
+
+def filename(spec):
+    fallback = f"{spec['kind'][:-1]}-{spec['pk']}"
+    return f"{slugify(spec['name']) or fallback}.pdf"
+
+
+def render(spec) -> bytes:
+    """Draw the profile PDF for a spec."""
+    from io import BytesIO
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import mm
+
+    kind = KINDS[spec["kind"]]
+    buf = BytesIO()
+    c = canvas.Canvas(buf, pagesize=A4)
+    W, H = A4; margin = 18 * mm; x = margin; y = H - margin
+
+    c.setFont("Helvetica-Bold", 16); c.drawString(x, y, kind["title"])
+    c.setFont("Helvetica", 9); c.drawRightString(W - margin, y, f"Updated {spec['updated']}")
+    y -= 14 * mm
+
+    photo_path, nid_path = spec["photo_path"], spec["nid_path"]
+    right_w = 38 * mm; right_x = W - margin - right_w
+    if photo_path: c.drawImage(photo_path, right_x, y - 40 * mm, width=right_w, height=40 * mm, preserveAspectRatio=True)
+    if nid_path:   c.drawImage(nid_path,   right_x, y - 88 * mm, width=right_w, height=40 * mm, preserveAspectRatio=True)
+
+    line = 8 * mm
+    c.setFont("Helvetica-Bold", 11); c.drawString(x, y, "Details"); y -= 6 * mm; c.setFont("Helvetica", 10)
+    c.drawString(x, y, _safe(f"Name: {spec['name']}")); y -= line
+    c.drawString(x, y, _safe(f"Phone: {spec['phone']}")); y -= line
+    c.drawString(x, y, _safe(f"Email: {spec['email']}")); y -= line
+    c.drawString(x, y, _safe(f"Address: {spec['address']}")); y -= line
+
+    y -= 6 * mm; c.setFont("Helvetica-Bold", 11); c.drawString(x, y, kind["history_title"])
+    y -= 6 * mm; c.setFont("Helvetica", 10)
+    if not spec["history"]:
+        c.drawString(x, y, kind["empty_text"])
+    for text in spec["history"]:
+        c.drawString(x, y, _safe(text)); y -= line
+        if y < margin + 20 * mm: c.showPage(); y = H - margin; c.setFont("Helvetica", 10)
+
+    c.showPage(); c.save()
+    return buf.getvalue()
+
+
+def render_and_store(spec) -> bytes:
+    data = render(spec)
+    filecache.put("pdf", spec["key"], data)
+    return data
+
+
+def cached_path(spec):
+    """Path of the stored PDF for this spec, or None."""
+    return filecache.get("pdf", spec["key"])
@@ -0,0 +1,335 @@
+"""
+In-process search index behind the owner/lessee typeahead.
+
+One PeopleIndex per kind keeps every person's normalised name tokens, phone
+digits and flat code (active holding, else latest) in posting lists sorted by
+name. A query walks only as far into those lists as the page it returns, so
+its cost follows `limit`, not the number of people or of matches.
+
+Freshness: core.signals updates the index in place when this process saves or
+deletes an Owner/Lessee/Ownership/Tenancy. Every query also compares the
+people/flats data versions (core.datacache) with the ones the index is current
+with; when they moved (a write by another process or a bulk tool) the index
+catches up on just the people, holdings and flats whose updated_at is past its
+high-water mark. Deletes leave no such trace, so each catch-up also checks the
+people and holding row counts against the last ones plus the rows added since
+(ids only grow); a shortfall means something was deleted and forces a full
+reload, as does a first query.
+"""
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from datetime import timedelta
+from heapq import merge
+
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from core.datacache import versions
+from core.phones import normalise_phone_prefix
+from flats.models import Flat
+
+from .models import Owner, Lessee, Ownership, Tenancy
+
+_FLAT_Q = re.compile(r"^([A-Za-z])[-_]?0*(\d{1,3})$")
+GROUPS = ("people", "flats")
+# Rows are stamped when written but seen once committed, so the mark trails
+# the clock by longer than any write transaction (an import). Rows inside the
+# lag are read again on the next catch-up, which is harmless.
+MARK_LAG = timedelta(minutes=5)
+CATCH_UP_MAX = 5000  # people re-read in place at most; more changed than that and the index reloads
+
+
+def normalise(text):
+    """Casefolded, accent-free text."""
+    text = unicodedata.normalize("NFKD", str(text or "")).casefold()
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def tokens(text):
+    return re.findall(r"\w+", normalise(text))
+
+
+def _grams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _flat_key(unit, floor):
+    return f"{unit.upper()}{int(floor)}"
+
+
+class _Person:
+    __slots__ = ("name", "key", "tokens", "compact", "phone")
+
+    def __init__(self, pk, name, phone):
+        self.name = name or ""
+        self.key = (normalise(self.name), pk)  # position in every posting list
+        self.tokens = tokens(self.name)
+        self.compact = "".join(self.tokens)
+        self.phone = phone or ""  # phone_norm
+
+    def postings(self):
+        """(list name, term) pairs this person is filed under."""
+        for i, tok in enumerate(self.tokens):
+            yield ("first" if i == 0 else "rest"), tok
+        for g in _grams(self.compact):
+            yield "grams", g
+        for g in _grams(self.phone):
+            yield "grams", "#" + g
+
+
+class PeopleIndex:
+    def __init__(self, person_model, holding_model, person_field):
+        self.person_model = person_model
+        self.holding_model = holding_model
+        self.person_field = person_field
+        self._lock = threading.RLock()
+        self._built_at = None
+        self._mark = None    # updated_at past which rows are re-read on the next catch-up
+        self._tallies = {}   # model -> (rows, highest pk) when last caught up
+        self._clear()
+
+    def _clear(self):
+        self.people = {}    # pk -> _Person
+        self.codes = {}     # pk -> 'E-10' for an active holding
+        self.holders = {}   # 'E10' -> pk of the active holder, else the latest one
+        self.by_name = []   # sorted _Person.key
+        self.vocab = []     # sorted distinct name tokens, for prefix ranges
+        self.lists = {"first": {}, "rest": {}, "grams": {}}
+
+    # ── building ──
+    def _holdings(self, **filters):
+        return self.holding_model.objects.filter(**filters).order_by("start_date", "id").values_list(
+            f"{self.person_field}_id", "flat__unit", "flat__floor", "end_date",
+        )
+
+    def _apply_holdings(self, rows):
+        """Rows in start order: the last one per flat wins unless an active one came first."""
+        active = set()
+        for pk, unit, floor, end in rows:
+            key = _flat_key(unit, floor)
+            if end is None:
+                self.codes[pk] = f"{unit}-{floor:02d}"
+                active.add(key)
+            if end is None or key not in active:
+                self.holders[key] = pk
+
+    def _tally(self):
+        """
+        {model: (rows, highest pk, rows past the last highest pk)} for people and
+        holdings, taken before reading them so a delete meanwhile is noticed later.
+        """
+        out = {}
+        for model in (self.person_model, self.holding_model):
+            _, top = self._tallies.get(model, (0, 0))
+            t = model.objects.aggregate(n=Count("pk"), top=Max("pk"), new=Count("pk", filter=Q(pk__gt=top)))
+            out[model] = (t["n"], t["top"] or 0, t["new"])
+        return out
+
+    def _stamp(self, started, tallies):
+        self._mark = started - MARK_LAG
+        self._tallies = {model: (n, top) for model, (n, top, _) in tallies.items()}
+
+    def _load(self):
+        started, tallies = timezone.now(), self._tally()
+        self._clear()
+        rows = self.person_model.objects.values_list("pk", "name", "phone_norm")
+        for pk, name, phone in rows.iterator(chunk_size=5000):
+            person = self.people[pk] = _Person(pk, name, phone)
+            self.by_name.append(person.key)
+            for kind, term in person.postings():
+                self.lists[kind].setdefault(term, []).append(person.key)
+        self.by_name.sort()
+        for postings in self.lists.values():
+            for keys in postings.values():
+                keys.sort()
+        self.vocab = sorted(set(self.lists["first"]) | set(self.lists["rest"]))
+        self._apply_holdings(self._holdings().iterator(chunk_size=5000))
+        self._stamp(started, tallies)
+
+    def _catch_up(self):
+        """Apply the rows changed since the mark; False if a delete means a full reload is needed."""
+        started, tallies = timezone.now(), self._tally()
+        if any(n != self._tallies[model][0] + new for model, (n, _, new) in tallies.items()):
+            return False
+        since = {"updated_at__gte": self._mark}
+        ids = set(self.person_model.objects.filter(**since).values_list("pk", flat=True))
+        ids.update(self.holding_model.objects.filter(**since).values_list(f"{self.person_field}_id", flat=True))
+        ids.update(self.holding_model.objects.filter(flat__in=Flat.objects.filter(**since)).values_list(
+            f"{self.person_field}_id", flat=True,
+        ))
+        if not self._refresh(ids):
+            return False
+        self._stamp(started, tallies)
+        return True
+
+    def _add(self, person):
+        self.people[person.key[1]] = person
+        insort(self.by_name, person.key)
+        for kind, term in person.postings():
+            keys = self.lists[kind].setdefault(term, [])
+            if kind != "grams" and not keys and term not in self.lists["first" if kind == "rest" else "rest"]:
+                insort(self.vocab, term)
+            insort(keys, person.key)
+
+    def _remove(self, pk):
+        person = self.people.pop(pk)
+        self.codes.pop(pk, None)
+        _discard(self.by_name, person.key)
+        for kind, term in person.postings():
+            keys = self.lists[kind].get(term)
+            if keys is None:
+                continue  # filed twice under the same term
+            _discard(keys, person.key)
+            if not keys:
+                del self.lists[kind][term]
+                if kind != "grams" and term not in self.lists["first"] and term not in self.lists["rest"]:
+                    _discard(self.vocab, term)
+
+    def ensure_fresh(self):
+        current = versions(*GROUPS)
+        if current != self._built_at:
+            with self._lock:
+                if current != self._built_at:
+                    if self._built_at is None or not self._catch_up():
+                        self._load()
+                    self._built_at = current
+
+    def reset(self):
+        """Forget everything; the next query loads from scratch."""
+        with self._lock:
+            self._built_at, self._mark, self._tallies = None, None, {}
+            self._clear()
+
+    def refresh(self, person_ids):
+        """In-place update after this process wrote some people or holdings (on commit)."""
+        with self._lock:
+            if self._built_at is None:
+                return  # not loaded yet; the first query loads everything
+            if not self._refresh(set(person_ids)):
+                self._built_at = None
+
+    def _refresh(self, ids):
+        """Re-read the given people and the holders of the flats they hold or held; False if one is gone."""
+        if not ids:
+            return True
+        if len(ids) > CATCH_UP_MAX:
+            return False  # a load is cheaper than lookups this large
+        rows = self.person_model.objects.filter(pk__in=ids).values_list("pk", "name", "phone_norm")
+        fetched = {pk: _Person(pk, name, phone) for pk, name, phone in rows}
+        if len(fetched) < len(ids):
+            # someone was deleted along with their holdings; the flats they held
+            # need their earlier holders back, which only a full load knows
+            return False
+        for pk, person in fetched.items():
+            if pk in self.people:
+                self._remove(pk)
+            self._add(person)
+        for key, pk in list(self.holders.items()):
+            if pk in ids:
+                del self.holders[key]
+        flats = self.holding_model.objects.filter(**{f"{self.person_field}_id__in": ids}).values("flat_id")
+        self._apply_holdings(self._holdings(flat_id__in=flats))
+        return True
+
+    # ── querying ──
+    def search(self, q, limit=20, offset=0):
+        """
+        Ranked [(pk, label)] for `q`, and whether more follow. Tiers, each in
+        name order: flat code, first-name prefix, any-name prefix, phone digits,
+        name substring. Empty q lists everyone by name.
+        """
+        self.ensure_fresh()
+        with self._lock:
+            want = offset + limit
+            q = (q or "").strip()
+            found, forced = [], None
+            if not q:
+                found = [key[1] for key in self.by_name[offset:want + 1]]
+                return self._page(found, 0, limit, None)
+
+            seen = set()
+
+            def collect(keys, accept=lambda person: True):
+                for _, pk in keys:
+                    if len(found) > want:
+                        return
+                    if pk not in seen and accept(self.people[pk]):
+                        seen.add(pk)
+                        found.append(pk)
+
+            m = _FLAT_Q.match(q.replace(" ", ""))
+            if m:
+                pk = self.holders.get(_flat_key(m.group(1), m.group(2)))
+                if pk in self.people:
+                    forced = (pk, f"{m.group(1).upper()}-{int(m.group(2)):02d}")
+                    collect([(None, pk)])
+
+            q_tokens = tokens(q)
+            if q_tokens:
+                def has_all(needed):
+                    return lambda p: all(any(t.startswith(n) for t in p.tokens) for n in needed)
+
+                collect(self._prefixed("first", q_tokens[0]), has_all(q_tokens[1:]))
+                # drive the any-token tier from the rarest query token
+                driver = min(q_tokens, key=self._prefix_size)
+                collect(merge(self._prefixed("first", driver), self._prefixed("rest", driver)), has_all(q_tokens))
+
+            q_digits = normalise_phone_prefix(q)
+            if len(q_digits) >= 3:
+                collect(self._grammed(q_digits, "#"), lambda p: q_digits in p.phone)
+
+            compact = "".join(q_tokens)
+            if len(compact) >= 3:
+                collect(self._grammed(compact, ""), lambda p: compact in p.compact)
+
+            return self._page(found, offset, limit, forced)
+
+    def export(self):
+        """
+        Everyone as [id, name, phone digits, active flat code or ""] in name
+        order, plus {"A-07": id} for each flat's active (else latest) holder.
+        """
+        self.ensure_fresh()
+        with self._lock:
+            people = [
+                [pk, self.people[pk].name, self.people[pk].phone, self.codes.get(pk, "")]
+                for _, pk in self.by_name
+            ]
+            flats = {f"{key[0]}-{int(key[1:]):02d}": pk for key, pk in self.holders.items()}
+        return people, flats
+
+    def _terms(self, prefix):
+        lo = bisect_left(self.vocab, prefix)
+        hi = bisect_left(self.vocab, prefix + "\uffff", lo)
+        return self.vocab[lo:hi]
+
+    def _prefixed(self, kind, prefix):
+        postings = self.lists[kind]
+        return merge(*(postings[t] for t in self._terms(prefix) if t in postings))
+
+    def _prefix_size(self, prefix):
+        return sum(len(self.lists[k].get(t, ())) for t in self._terms(prefix) for k in ("first", "rest"))
+
+    def _grammed(self, text, marker):
+        """Keys of the rarest trigram's list; the caller checks the full substring."""
+        lists = [self.lists["grams"].get(marker + g, []) for g in _grams(text)]
+        return min(lists, key=len)
+
+    def _page(self, found, offset, limit, forced):
+        out = []
+        for pk in found[offset:offset + limit]:
+            code = forced[1] if forced and forced[0] == pk else self.codes.get(pk)
+            out.append((pk, f"{code or '—'} - {self.people[pk].name}"))
+        return out, len(found) > offset + limit
+
+
+def _discard(keys, item):
+    i = bisect_left(keys, item)
+    if i < len(keys) and keys[i] == item:
+        del keys[i]
+
+
+owners = PeopleIndex(Owner, Ownership, "owner")
+lessees = PeopleIndex(Lessee, Tenancy, "lessee")
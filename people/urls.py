@@ -3,9 +3,13 @@ from django.urls import path
 from .views import (
     # HTML views
     OwnerListView, OwnerCreateView, OwnerUpdateView, OwnerDeleteView, owner_pdf,
+    owner_profile, owner_profile_json,
     LesseeListView, LesseeCreateView, LesseeUpdateView, LesseeDeleteView, lessee_pdf,
+    lessee_profile, lessee_profile_json,
     # Type-ahead APIs for Occupancy page
-    owners_search, lessees_search,
+    owners_search, lessees_search, people_directory,
+    # Bulk export
+    profiles_export,
 )
 
 app_name = "people"
@@ -17,6 +21,8 @@ urlpatterns = [
     path("owners/<int:pk>/edit/",   OwnerUpdateView.as_view(), name="owner_edit"),
     path("owners/<int:pk>/delete/", OwnerDeleteView.as_view(), name="owner_delete"),
     path("owners/<int:pk>/pdf/",    owner_pdf,                 name="owner_pdf"),
+    path("owners/<int:pk>/",        owner_profile,             name="owner_profile"),
+    path("owners/<int:pk>/profile.json", owner_profile_json,   name="owner_profile_json"),
 
     # Lessees
     path("lessees/",                 LesseeListView.as_view(),   name="lessees"),
@@ -24,8 +30,14 @@ urlpatterns = [
     path("lessees/<int:pk>/edit/",   LesseeUpdateView.as_view(), name="lessee_edit"),
     path("lessees/<int:pk>/delete/", LesseeDeleteView.as_view(), name="lessee_delete"),
     path("lessees/<int:pk>/pdf/",    lessee_pdf,                 name="lessee_pdf"),
+    path("lessees/<int:pk>/",        lessee_profile,             name="lessee_profile"),
+    path("lessees/<int:pk>/profile.json", lessee_profile_json,   name="lessee_profile_json"),
+
+    # All profile PDFs as one ZIP
+    path("export.zip", profiles_export, name="profiles_export"),
 
     # Type-ahead search APIs (used by /flats/<id>/occupancy/)
     path("api/owners",  owners_search,  name="owners_search"),
     path("api/lessees", lessees_search, name="lessees_search"),
+    path("api/directory/<str:digest>.json", people_directory, name="directory"),
 ]
@@ -1,50 +1,72 @@
-import re
 from urllib.parse import quote
 
 from django.contrib import messages
-from django.db.models import Q
-from django.http import JsonResponse, HttpResponse, HttpRequest
-from django.shortcuts import get_object_or_404
+from django.core import signing
+from django.conf import settings
+from django.http import Http404, JsonResponse, HttpResponse, HttpRequest, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse_lazy
 from django.utils import timezone
-from django.utils.text import slugify
+from django.views.decorators.gzip import gzip_page
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView
 
+from core import media, search
+from core.conditional import conditional_on
+from core.pagination import KeysetPaginationMixin
+from . import directory, export, profile, profile_pdf, search_index
 from .models import Owner, Lessee, Ownership, Tenancy
 from .forms import OwnerForm, LesseeForm
 
 # ───────────────────────── helpers ─────────────────────────
 
-def _safe(txt) -> str:
-    """ReportLab-safe (latin-1) text to avoid Unicode crashes without a TTF."""
-    return (str(txt or "")).encode("latin-1", "replace").decode("latin-1")
-
-def _file_path(instance, attr_name: str):
+def _profile_pdf(request, obj, holdings):
     """
-    Return a safe .path for Image/FileField (or None), avoiding ValueError when empty.
+    Serve a person's profile PDF (people.profile_pdf) from the file cache,
+    rendering it on a miss. Download with ?dl=1; inline otherwise.
     """
-    f = getattr(instance, attr_name, None)
-    if not f:
-        return None
-    try:
-        if getattr(f, "name", None):
-            return f.path
-    except Exception:
-        return None
-    return None
+    dl = (request.GET.get("dl") or request.GET.get("download") or "").lower()
+    spec = profile_pdf.build_spec(obj, holdings)
+    options = {
+        "etag": f'"{spec["key"][:32]}"', "content_type": "application/pdf",
+        "filename": profile_pdf.filename(spec), "as_attachment": dl in ("1", "true", "yes", "download"),
+    }
+    data = None
+    path = profile_pdf.cached_path(spec)
+    if path is None:
+        data = profile_pdf.render_and_store(spec)
+        path = profile_pdf.cached_path(spec)
+    if path is not None:
+        try:
+            return media.serve(request, path, **options)
+        except FileNotFoundError:
+            pass  # evicted before it could be served
+    resp = HttpResponse(data or profile_pdf.render(spec), content_type="application/pdf")
+    disp = "attachment" if options["as_attachment"] else "inline"
+    resp["Content-Disposition"] = f"{disp}; filename*=UTF-8''{quote(options['filename'])}"
+    resp["ETag"] = options["etag"]
+    return resp
+
+
+def _profile(kind, pk):
+    data = profile.build(kind, pk)
+    if data is None:
+        raise Http404(f"No {kind} {pk}")
+    return data
 
 # ───────────────────────── Owners (HTML) ─────────────────────────
 
-class OwnerListView(ListView):
+class OwnerListView(KeysetPaginationMixin, ListView):
     model = Owner
     template_name = "people/owner_list.html"
     paginate_by = 30
+    keyset = ("name",)
+    count_groups = ("people",)
 
     def get_queryset(self):
-        qs = Owner.objects.all().order_by("name")
+        qs = Owner.objects.all()
         q = (self.request.GET.get("q") or "").strip()
         if q:
-            qs = qs.filter(Q(name__icontains=q) | Q(phone__icontains=q) | Q(email__icontains=q))
+            qs = search.filter_queryset(qs, "owner", q)
         return qs
 
     def get_context_data(self, **kwargs):
@@ -82,68 +104,46 @@ class OwnerDeleteView(DeleteView):
         messages.success(request, f"Deleted owner '{nm}'. Removed {cnt} ownership record(s).")
         return resp
 
+@conditional_on(*profile.GROUPS)
+def owner_profile(request: HttpRequest, pk: int) -> HttpResponse:
+    """Everything about an owner on one page (people.profile)."""
+    return render(request, "people/profile.html", {"p": _profile("owner", pk)})
+
+@conditional_on(*profile.GROUPS)
+def owner_profile_json(request: HttpRequest, pk: int) -> JsonResponse:
+    return JsonResponse(_profile("owner", pk))
+
 def owner_pdf(request: HttpRequest, pk: int) -> HttpResponse:
     """Owner profile PDF (download with ?dl=1; inline otherwise)."""
-    from reportlab.pdfgen import canvas
-    from reportlab.lib.pagesizes import A4
-    from reportlab.lib.units import mm
-
     obj = get_object_or_404(Owner, pk=pk)
-
-    dl = (request.GET.get("dl") or request.GET.get("download") or "").lower()
-    disp = "attachment" if dl in ("1", "true", "yes", "download") else "inline"
-    fname = f"{slugify(obj.name) or f'owner-{obj.pk}'}.pdf"
-
-    resp = HttpResponse(content_type="application/pdf")
-    resp["Content-Disposition"] = f"{disp}; filename*=UTF-8''{quote(fname)}"
-
-    c = canvas.Canvas(resp, pagesize=A4)
-    W, H = A4
-    margin = 18 * mm
-    x = margin
-    y = H - margin
-
-    c.setFont("Helvetica-Bold", 16); c.drawString(x, y, "OWNER PROFILE")
-    c.setFont("Helvetica", 9); c.drawRightString(W - margin, y, timezone.now().strftime("%d-%b-%Y %H:%M"))
-    y -= 14 * mm
-
-    photo_path = _file_path(obj, "photo")
-    nid_path   = _file_path(obj, "nid_image")
-    right_w = 38 * mm; right_x = W - margin - right_w
-    if photo_path: c.drawImage(photo_path, right_x, y - 40 * mm, width=right_w, height=40 * mm, preserveAspectRatio=True)
-    if nid_path:   c.drawImage(nid_path,   right_x, y - 88 * mm, width=right_w, height=40 * mm, preserveAspectRatio=True)
-
-    line = 8 * mm
-    c.setFont("Helvetica-Bold", 11); c.drawString(x, y, "Details"); y -= 6 * mm; c.setFont("Helvetica", 10)
-    c.drawString(x, y, _safe(f"Name: {obj.name}")); y -= line
-    c.drawString(x, y, _safe(f"Phone: {obj.phone}")); y -= line
-    c.drawString(x, y, _safe(f"Email: {obj.email}")); y -= line
-    c.drawString(x, y, _safe(f"Address: {obj.address}")); y -= line
-
-    y -= 6 * mm; c.setFont("Helvetica-Bold", 11); c.drawString(x, y, "Ownership history")
-    y -= 6 * mm; c.setFont("Helvetica", 10)
     rows = Ownership.objects.filter(owner=obj).select_related("flat").order_by("-start_date")
-    if not rows:
-        c.drawString(x, y, "(no ownership records)")
-    for o in rows:
-        c.drawString(x, y, _safe(f"{o.flat} | {o.start_date} → {o.end_date or 'present'}")); y -= line
-        if y < margin + 20 * mm: c.showPage(); y = H - margin; c.setFont("Helvetica", 10)
-
-    c.showPage(); c.save()
+    return _profile_pdf(request, obj, rows)
+
+def profiles_export(request: HttpRequest) -> StreamingHttpResponse:
+    """All owner and/or lessee profile PDFs as one ZIP (?kind=owners|lessees|all), streamed as it is built."""
+    kind = request.GET.get("kind") or "all"
+    kinds = [kind] if kind in profile_pdf.KINDS else list(profile_pdf.KINDS)
+    name = f"profiles-{kind if kind in profile_pdf.KINDS else 'all'}-{timezone.localdate():%Y%m%d}.zip"
+    resp = StreamingHttpResponse(
+        export.stream_zip(kinds, workers=settings.PROFILE_EXPORT_WORKERS), content_type="application/zip",
+    )
+    resp["Content-Disposition"] = f"attachment; filename={name}"
     return resp
 
 # ───────────────────────── Lessees (HTML) ─────────────────────────
 
-class LesseeListView(ListView):
+class LesseeListView(KeysetPaginationMixin, ListView):
     model = Lessee
     template_name = "people/lessee_list.html"
     paginate_by = 30
+    keyset = ("name",)
+    count_groups = ("people",)
 
     def get_queryset(self):
-        qs = Lessee.objects.all().order_by("name")
+        qs = Lessee.objects.all()
         q = (self.request.GET.get("q") or "").strip()
         if q:
-            qs = qs.filter(Q(name__icontains=q) | Q(phone__icontains=q) | Q(email__icontains=q))
+            qs = search.filter_queryset(qs, "lessee", q)
         return qs
 
     def get_context_data(self, **kwargs):
@@ -181,183 +181,88 @@ class LesseeDeleteView(DeleteView):
         messages.success(request, f"Deleted lessee '{nm}'. Removed {cnt} tenancy record(s).")
         return resp
 
+@conditional_on(*profile.GROUPS)
+def lessee_profile(request: HttpRequest, pk: int) -> HttpResponse:
+    """Everything about a lessee on one page (people.profile)."""
+    return render(request, "people/profile.html", {"p": _profile("lessee", pk)})
+
+@conditional_on(*profile.GROUPS)
+def lessee_profile_json(request: HttpRequest, pk: int) -> JsonResponse:
+    return JsonResponse(_profile("lessee", pk))
+
 def lessee_pdf(request: HttpRequest, pk: int) -> HttpResponse:
     """Lessee profile PDF (download with ?dl=1; inline otherwise)."""
-    from reportlab.pdfgen import canvas
-    from reportlab.lib.pagesizes import A4
-    from reportlab.lib.units import mm
-
     obj = get_object_or_404(Lessee, pk=pk)
-
-    dl = (request.GET.get("dl") or request.GET.get("download") or "").lower()
-    disp = "attachment" if dl in ("1", "true", "yes", "download") else "inline"
-    fname = f"{slugify(obj.name) or f'lessee-{obj.pk}'}.pdf"
-
-    resp = HttpResponse(content_type="application/pdf")
-    resp["Content-Disposition"] = f"{disp}; filename*=UTF-8''{quote(fname)}"
-
-    c = canvas.Canvas(resp, pagesize=A4)
-    W, H = A4; margin = 18 * mm; x = margin; y = H - margin
-
-    c.setFont("Helvetica-Bold", 16); c.drawString(x, y, "LESSEE PROFILE")
-    c.setFont("Helvetica", 9); c.drawRightString(W - margin, y, timezone.now().strftime("%d-%b-%Y %H:%M"))
-    y -= 14 * mm
-
-    photo_path = _file_path(obj, "photo")
-    nid_path   = _file_path(obj, "nid_image")
-    right_w = 38 * mm; right_x = W - margin - right_w
-    if photo_path: c.drawImage(photo_path, right_x, y - 40 * mm, width=right_w, height=40 * mm, preserveAspectRatio=True)
-    if nid_path:   c.drawImage(nid_path,   right_x, y - 88 * mm, width=right_w, height=40 * mm, preserveAspectRatio=True)
-
-    line = 8 * mm
-    c.setFont("Helvetica-Bold", 11); c.drawString(x, y, "Details"); y -= 6 * mm; c.setFont("Helvetica", 10)
-    c.drawString(x, y, _safe(f"Name: {obj.name}")); y -= line
-    c.drawString(x, y, _safe(f"Phone: {obj.phone}")); y -= line
-    c.drawString(x, y, _safe(f"Email: {obj.email}")); y -= line
-    c.drawString(x, y, _safe(f"Address: {obj.address}")); y -= line
-
-    y -= 6 * mm; c.setFont("Helvetica-Bold", 11); c.drawString(x, y, "Tenancy history")
-    y -= 6 * mm; c.setFont("Helvetica", 10)
     rows = Tenancy.objects.filter(lessee=obj).select_related("flat").order_by("-start_date")
-    if not rows:
-        c.drawString(x, y, "(no tenancy records)")
-    for t in rows:
-        c.drawString(x, y, _safe(f"{t.flat} | {t.start_date} → {t.end_date or 'present'}")); y -= line
-        if y < margin + 20 * mm: c.showPage(); y = H - margin; c.setFont("Helvetica", 10)
-
-    c.showPage(); c.save()
-    return resp
+    return _profile_pdf(request, obj, rows)
 
 # ───────────────────────── Search APIs for Occupancy type-ahead ─────────────────────────
 
-_FLAT_RE = re.compile(r"^([A-Ha-h])[-_\s]?0?(\d{1,2})$")
+_SEARCH_LIMIT = 50
+_SEARCH_MAX = 500
+
+
+def _typeahead(request, index):
+    """
+    Ranked matches from the in-process index: flat code, then name prefixes,
+    then phone digits, then name substrings. `limit` caps the page (default
+    50, max 500); `cursor` is the opaque `next` of the previous page.
+    """
+    q = (request.GET.get("q") or "").strip()
+    try:
+        limit = max(1, min(int(request.GET.get("limit") or _SEARCH_LIMIT), _SEARCH_MAX))
+    except ValueError:
+        limit = _SEARCH_LIMIT
+    try:
+        offset = signing.loads(request.GET.get("cursor") or "", salt="people.search")
+    except signing.BadSignature:
+        offset = 0
 
-def _active_code_for_owners(owner_ids):
-    code = {oid: None for oid in owner_ids}
-    qs = Ownership.objects.filter(owner_id__in=owner_ids, end_date__isnull=True).select_related("flat")
-    for row in qs:
-        code[row.owner_id] = f"{row.flat.unit}-{row.flat.floor:02d}"
-    return code
+    hits, more = index.search(q, limit=limit, offset=offset)
+    next_cursor = signing.dumps(offset + limit, salt="people.search") if more else None
+    return JsonResponse({
+        "results": [{"id": pk, "label": label} for pk, label in hits],
+        "next": next_cursor,
+    })
 
-def _active_code_for_lessees(lessee_ids):
-    code = {lid: None for lid in lessee_ids}
-    qs = Tenancy.objects.filter(lessee_id__in=lessee_ids, end_date__isnull=True).select_related("flat")
-    for row in qs:
-        code[row.lessee_id] = f"{row.flat.unit}-{row.flat.floor:02d}"
-    return code
 
+@conditional_on("people", "flats")
 def owners_search(request: HttpRequest) -> JsonResponse:
     """
-    Return up to 500 owners.
-    * Empty q  -> all owners
-    * Name q   -> filter by name/phone
-    * Flat q   -> active owner on that flat; if none, include the latest owner on that flat.
-                  If still none, fall back to ALL owners.
+    Owners for the occupancy type-ahead.
+    * Empty q  -> everyone, by name
+    * Name q   -> name prefix/substring or phone digits
+    * Flat q   -> active owner on that flat, else its latest owner (listed first)
     Labels: 'E-10 - Ashikur Rahman' or '— - Name'
     """
-    q = (request.GET.get("q") or "").strip()
-    base = Owner.objects.all()
+    return _typeahead(request, search_index.owners)
 
-    if not q:
-        qs = base.order_by("name")[:500]
-    else:
-        name_qs = base.filter(Q(name__icontains=q) | Q(phone__icontains=q))
-
-        ids_by_flat_active = []
-        ids_by_flat_latest = []
-        m = _FLAT_RE.match(q.replace(" ", ""))
-        if m:
-            unit, fl = m.group(1).upper(), int(m.group(2))
-            # active owner
-            ids_by_flat_active = list(
-                Ownership.objects.filter(end_date__isnull=True, flat__unit=unit, flat__floor=fl)
-                .values_list("owner_id", flat=True)
-            )
-            if not ids_by_flat_active:
-                # latest historical owner
-                latest = (
-                    Ownership.objects.filter(flat__unit=unit, flat__floor=fl)
-                    .order_by("-start_date", "-id")
-                    .values_list("owner_id", flat=True)[:1]
-                )
-                ids_by_flat_latest = list(latest)
-
-        owner_ids_from_flat = set(ids_by_flat_active) | set(ids_by_flat_latest)
-        qs = (name_qs | base.filter(id__in=owner_ids_from_flat)).order_by("name").distinct()
-        if not qs.exists():
-            qs = base.order_by("name")
-
-    ids = list(qs.values_list("id", flat=True))
-    codes = _active_code_for_owners(ids)
-
-    results = []
-    forced_code = None
-    m2 = _FLAT_RE.match(q.replace(" ", "")) if q else None
-    if m2:
-        forced_code = f"{m2.group(1).upper()}-{int(m2.group(2)):02d}"
-
-    for oid, name in qs.values_list("id", "name")[:500]:
-        label_code = codes.get(oid) or "—"
-        if forced_code:
-            if 'owner_ids_from_flat' in locals() and oid in owner_ids_from_flat:
-                label_code = forced_code
-        results.append({"id": oid, "label": f"{label_code} - {name}"})
-
-    return JsonResponse({"results": results})
 
+@conditional_on("people", "flats")
 def lessees_search(request: HttpRequest) -> JsonResponse:
     """
-    Return up to 500 lessees.
-    * Empty q  -> all lessees
-    * Name q   -> filter by name/phone
-    * Flat q   -> active lessee on that flat; if none, include the latest lessee on that flat.
-                  If still none, fall back to ALL lessees.
+    Lessees for the occupancy type-ahead; same rules as owners_search.
     Labels: 'E-10 - John Tenant' or '— - Name'
     """
-    q = (request.GET.get("q") or "").strip()
-    base = Lessee.objects.all()
+    return _typeahead(request, search_index.lessees)
+
 
-    if not q:
-        qs = base.order_by("name")[:500]
+@gzip_page
+def people_directory(request: HttpRequest, digest: str) -> HttpResponse:
+    """
+    The people directory bundle (people.directory) under its content hash.
+    A current URL is immutable; an outdated one redirects to the current one.
+    """
+    current = directory.bundle()
+    if digest != current["digest"]:
+        resp = redirect("people:directory", current["digest"])
+        resp["Cache-Control"] = "private, no-cache"
+        return resp
+    etag = f'"{digest}"'
+    if etag in request.headers.get("If-None-Match", ""):
+        resp = HttpResponse(status=304)
     else:
-        name_qs = base.filter(Q(name__icontains=q) | Q(phone__icontains=q))
-
-        ids_by_flat_active = []
-        ids_by_flat_latest = []
-        m = _FLAT_RE.match(q.replace(" ", ""))
-        if m:
-            unit, fl = m.group(1).upper(), int(m.group(2))
-            ids_by_flat_active = list(
-                Tenancy.objects.filter(end_date__isnull=True, flat__unit=unit, flat__floor=fl)
-                .values_list("lessee_id", flat=True)
-            )
-            if not ids_by_flat_active:
-                latest = (
-                    Tenancy.objects.filter(flat__unit=unit, flat__floor=fl)
-                    .order_by("-start_date", "-id")
-                    .values_list("lessee_id", flat=True)[:1]
-                )
-                ids_by_flat_latest = list(latest)
-
-        lessee_ids_from_flat = set(ids_by_flat_active) | set(ids_by_flat_latest)
-        qs = (name_qs | base.filter(id__in=lessee_ids_from_flat)).order_by("name").distinct()
-        if not qs.exists():
-            qs = base.order_by("name")
-
-    ids = list(qs.values_list("id", flat=True))
-    codes = _active_code_for_lessees(ids)
-
-    results = []
-    forced_code = None
-    m2 = _FLAT_RE.match(q.replace(" ", "")) if q else None
-    if m2:
-        forced_code = f"{m2.group(1).upper()}-{int(m2.group(2)):02d}"
-
-    for lid, name in qs.values_list("id", "name")[:500]:
-        label_code = codes.get(lid) or "—"
-        if forced_code:
-            if 'lessee_ids_from_flat' in locals() and lid in lessee_ids_from_flat:
-                label_code = forced_code
-        results.append({"id": lid, "label": f"{label_code} - {name}"})
-
-    return JsonResponse({"results": results})
+        resp = HttpResponse(current["body"], content_type="application/json; charset=utf-8")
+    resp["ETag"] = etag
+    resp["Cache-Control"] = "private, max-age=31536000, immutable"
+    return resp
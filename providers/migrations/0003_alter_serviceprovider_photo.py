@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-17 01:58
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('providers', '0002_serviceprovider_phone_norm'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='serviceprovider',
+            name='photo',
+            field=models.ImageField(blank=True, null=True, storage=core.storage.DocumentStorage(), upload_to='docs/service_provider/'),
+        ),
+    ]
@@ -1,5 +1,8 @@
 from django.db import models
 
+from core.phones import normalise_phone
+from core.storage import documents
+
 class ServiceCategory(models.Model):
     name = models.CharField(max_length=80, unique=True)
     is_active = models.BooleanField(default=True)
@@ -17,6 +20,7 @@ class ServiceProvider(models.Model):
     category = models.ForeignKey(ServiceCategory, on_delete=models.PROTECT, related_name="providers")
     full_name = models.CharField(max_length=120)
     phone = models.CharField(max_length=40, blank=True)
+    phone_norm = models.CharField(max_length=40, blank=True, db_index=True, editable=False)
     email = models.EmailField(blank=True)
     address = models.CharField(max_length=255, blank=True)
 
@@ -24,7 +28,7 @@ class ServiceProvider(models.Model):
     experience_years = models.PositiveIntegerField(blank=True, null=True)
     notes = models.TextField(blank=True)
 
-    photo = models.ImageField(upload_to="docs/service_provider/", blank=True, null=True)
+    photo = models.ImageField(upload_to="docs/service_provider/", storage=documents, blank=True, null=True)
 
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -34,3 +38,7 @@ class ServiceProvider(models.Model):
 
     def __str__(self):
         return f"{self.full_name} ({self.category.name})"
+
+    def save(self, *args, **kwargs):
+        self.phone_norm = normalise_phone(self.phone)
+        super().save(*args, **kwargs)
@@ -1,12 +1,13 @@
-from django.db.models import Q
 from django.urls import reverse_lazy
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView
 
+from core.pagination import KeysetPaginationMixin
+from core import search
 from .models import ServiceProvider, ServiceCategory
 from .forms import ServiceProviderForm
 
 
-class ProviderListView(ListView):
+class ProviderListView(KeysetPaginationMixin, ListView):
     """
     List providers with filters:
       - q: name/phone/email/address/notes search
@@ -17,27 +18,18 @@ class ProviderListView(ListView):
     model = ServiceProvider
     template_name = "providers/provider_list.html"
     paginate_by = 30
+    keyset = ("category__name", "full_name")
+    count_groups = ("providers",)
 
     def get_queryset(self):
-        qs = (
-            ServiceProvider.objects
-            .select_related("category")
-            .all()
-            .order_by("category__name", "full_name")
-        )
+        qs = ServiceProvider.objects.select_related("category").all()
 
         q = (self.request.GET.get("q") or "").strip()
         cat = (self.request.GET.get("category") or "").strip()
         active = (self.request.GET.get("active") or "").strip()
 
         if q:
-            qs = qs.filter(
-                Q(full_name__icontains=q) |
-                Q(phone__icontains=q) |
-                Q(email__icontains=q) |
-                Q(address__icontains=q) |
-                Q(notes__icontains=q)
-            )
+            qs = search.filter_queryset(qs, "provider", q)
 
         if cat.isdigit():
             qs = qs.filter(category_id=int(cat))